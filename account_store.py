@@ -0,0 +1,291 @@
+"""
+PyBranch - Modern SMTP Email Client
+Copyright (C) 2025 Nagusame CS
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import os
+import threading
+import uuid
+
+from cryptography.fernet import Fernet, InvalidToken
+
+from credentials_manager import CredentialStoreError, atomic_write, ensure_key, file_lock
+
+# Stored in plain text in the index so accounts can be listed and looked
+# up without decrypting anything, every other field goes in the record
+INDEX_FIELDS = ('email', 'server', 'port')
+
+
+class AccountStore:
+    """Many sender accounts, each encrypted in its own record file
+
+    accounts/index.json maps account ids to their non-secret fields and
+    record file, accounts/<record>.enc holds the Fernet-encrypted secrets
+    (the password) of one account. Reading a password decrypts only that
+    account's record and changing it rewrites only that record; the index
+    is rewritten only when an account is added, removed or its index
+    fields change. Files are replaced atomically under the same fcntl
+    lock scheme as CredentialsManager, and the decrypted records are
+    cached until their file changes.
+
+    get_credential/save_credential/save_many/delete_credential mirror
+    CredentialsManager with the account id as the service, so either
+    store can be handed to the Outbox.
+    """
+
+    def __init__(self, directory="accounts", key_file="secret.key"):
+        self.directory = directory
+        self.key_file = key_file
+        self.index_file = os.path.join(directory, "index.json")
+        self.lock_file = os.path.join(directory, "index.lock")
+        os.makedirs(directory, exist_ok=True)
+        ensure_key(self.key_file)
+        with open(self.key_file, "rb") as f:
+            self.fernet = Fernet(f.read())
+        self._lock = threading.RLock()
+        self._index = None
+        self._index_stamp = None
+        self._records = {}      # account id -> (stamp, decrypted secrets)
+
+    @staticmethod
+    def _stamp(path):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _record_path(self, entry):
+        return os.path.join(self.directory, f"{entry['record']}.enc")
+
+    def _read_index(self):
+        """The account index, re-read only when another process replaced it"""
+        stamp = self._stamp(self.index_file)
+        if self._index is not None and stamp == self._index_stamp:
+            return self._index
+        index = {}
+        if stamp is not None:
+            try:
+                with open(self.index_file, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+            except ValueError as e:
+                raise CredentialStoreError(f"{self.index_file} is not valid JSON: {e}") from None
+        self._index, self._index_stamp = index, stamp
+        return index
+
+    def _write_index(self, index):
+        atomic_write(self.index_file, json.dumps(index, indent=1, sort_keys=True).encode())
+        self._index, self._index_stamp = index, self._stamp(self.index_file)
+
+    def _read_record(self, account_id, entry):
+        """Decrypted secrets of one account, cached until its file changes"""
+        path = self._record_path(entry)
+        stamp = self._stamp(path)
+        cached = self._records.get(account_id)
+        if cached and cached[0] == stamp:
+            return cached[1]
+        secrets = {}
+        if stamp is not None:
+            with open(path, "rb") as f:
+                encrypted_data = f.read()
+            try:
+                secrets = json.loads(self.fernet.decrypt(encrypted_data))
+            except (InvalidToken, ValueError) as e:
+                raise CredentialStoreError(
+                    f"account {account_id} could not be decrypted: {e.__class__.__name__}") from None
+        self._records[account_id] = (stamp, secrets)
+        return secrets
+
+    def _write_record(self, account_id, entry, secrets):
+        path = self._record_path(entry)
+        atomic_write(path, self.fernet.encrypt(json.dumps(secrets).encode()))
+        self._records[account_id] = (self._stamp(path), secrets)
+
+    def accounts(self):
+        """{account id: index fields} of every account, nothing is decrypted"""
+        with self._lock:
+            return {account_id: {k: entry.get(k) for k in INDEX_FIELDS}
+                    for account_id, entry in self._read_index().items()}
+
+    def find(self, email):
+        """Id of the account sending as email, or None"""
+        email = email.strip().lower()
+        with self._lock:
+            for account_id, entry in self._read_index().items():
+                if (entry.get('email') or '').lower() == email:
+                    return account_id
+        return None
+
+    def get_account(self, account_id):
+        """Every field of one account, decrypting only its record"""
+        with self._lock:
+            entry = self._read_index().get(account_id)
+            if entry is None:
+                return None
+            account = {k: entry.get(k) for k in INDEX_FIELDS}
+            account.update(self._read_record(account_id, entry))
+            return account
+
+    def save_account(self, account_id, fields):
+        """Create or update an account, only the parts that changed are written"""
+        with self._lock, file_lock(self.lock_file):
+            index = self._read_index()
+            entry = index.get(account_id)
+            new_entry = dict(entry) if entry else {'record': uuid.uuid4().hex}
+            secrets = dict(self._read_record(account_id, entry)) if entry else {}
+            for key, value in fields.items():
+                if key in INDEX_FIELDS:
+                    new_entry[key] = value
+                else:
+                    secrets[key] = value
+
+            if entry is None or secrets != self._read_record(account_id, entry):
+                self._write_record(account_id, new_entry, secrets)
+            if new_entry != entry:
+                # Record first, so the index never points at a missing file
+                self._write_index({**index, account_id: new_entry})
+
+    def delete_account(self, account_id):
+        with self._lock, file_lock(self.lock_file):
+            index = self._read_index()
+            entry = index.get(account_id)
+            if entry is None:
+                return False
+            self._write_index({k: v for k, v in index.items() if k != account_id})
+            self._records.pop(account_id, None)
+            try:
+                os.remove(self._record_path(entry))
+            except FileNotFoundError:
+                pass
+            return True
+
+    def import_credentials(self, creds_manager, overwrite=False):
+        """Copy every service of a CredentialsManager store in as an account
+
+        The service name becomes the account id. Returns the imported ids.
+        """
+        imported = []
+        for service, values in creds_manager.services().items():
+            if not isinstance(values, dict):
+                continue
+            if not overwrite and service in self._read_index():
+                continue
+            self.save_account(service, values)
+            imported.append(service)
+        return imported
+
+    # CredentialsManager-compatible access, service is the account id
+
+    def get_credential(self, service, key):
+        try:
+            with self._lock:
+                entry = self._read_index().get(service)
+                if entry is None:
+                    return None
+                if key in INDEX_FIELDS:
+                    return entry.get(key)
+                return self._read_record(service, entry).get(key)
+        except CredentialStoreError as e:
+            print(f"Error reading credentials: {e}")
+            return None
+
+    def save_credential(self, service, key, value):
+        self.save_account(service, {key: value})
+
+    def save_many(self, service, values):
+        self.save_account(service, values)
+
+    def delete_credential(self, service, key):
+        """Delete one field, the account goes once it has none left"""
+        try:
+            with self._lock:
+                account = self.get_account(service)
+                if account is None or account.get(key) is None:
+                    return True
+                account.pop(key)
+                if not any(v is not None for v in account.values()):
+                    self.delete_account(service)
+                elif key in INDEX_FIELDS:
+                    self.save_account(service, {key: None})
+                else:
+                    with file_lock(self.lock_file):
+                        entry = self._read_index()[service]
+                        secrets = dict(self._read_record(service, entry))
+                        secrets.pop(key, None)
+                        self._write_record(service, entry, secrets)
+            return True
+        except Exception as e:
+            print(f"Error deleting credential: {e}")
+            return False
+
+    def clear_all_credentials(self, service):
+        """Remove an account and its record"""
+        try:
+            self.delete_account(service)
+            return True
+        except Exception as e:
+            print(f"Error clearing credentials: {e}")
+            return False
+
+    def close(self):
+        """Drop decrypted records, the next lookup decrypts again"""
+        with self._lock:
+            for _, secrets in self._records.values():
+                secrets.clear()
+            self._records.clear()
+
+
+def _has_fields(account, values):
+    return account is not None and all(account.get(k) == v for k, v in values.items())
+
+
+def open_account_store(directory="accounts"):
+    """AccountStore that imports the old credentials.enc store on first use
+
+    The import only happens while the index doesn't exist yet, so accounts
+    removed later are not brought back from the old file. Once every account
+    reads back the same from the new store, the old file is renamed to
+    credentials.enc.bak rather than deleted. secret.key stays, the new store
+    encrypts with it too.
+    """
+    store = AccountStore(directory)
+    if os.path.exists(store.index_file):
+        return store
+    from credentials_manager import CredentialsManager
+    legacy = CredentialsManager()
+    if os.path.exists(legacy.creds_file):
+        try:
+            store.import_credentials(legacy)
+            migrated = all(_has_fields(store.get_account(service), values)
+                           for service, values in legacy.services().items()
+                           if isinstance(values, dict))
+        except CredentialStoreError as e:
+            print(f"Error importing credentials: {e}")
+        else:
+            if migrated:
+                try:
+                    os.replace(legacy.creds_file, legacy.creds_file + ".bak")
+                except OSError as e:
+                    print(f"Error renaming {legacy.creds_file}: {e}")
+            else:
+                print(f"Accounts in {legacy.creds_file} did not import cleanly, keeping it")
+        finally:
+            legacy.close()
+    with store._lock, file_lock(store.lock_file):
+        if not os.path.exists(store.index_file):
+            store._write_index(store._read_index())
+    return store
@@ -0,0 +1,236 @@
+"""
+PyBranch - Modern SMTP Email Client
+Copyright (C) 2025 Nagusame CS
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Headless batch mode, never imports tkinter, tkinterdnd2 or the splash
+# screen so it runs on servers without a display:
+#
+#   python batch_send.py jobs.jsonl
+#   cat job.json | python batch_send.py --provider Gmail --account me@gmail.com
+#
+# A job is a JSON object:
+#   {"to": "a@x.com, {cc}{b@y.com}", "subject": "...", "body": "...",
+#    "attachments": ["report.pdf"]}
+# "to" uses the same syntax as the compose field (or is a list), "body" is
+# processed like the editor text ({link}, {img}, ...), "html" is sent as is.
+# Input may be one object, an array of objects or one object per line.
+# One JSON result line is printed per job.
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import mail_core
+from message_builder import build_message_file, unique_attachments
+from smtp_pool import SMTPConnectionPool
+from smtp_presets import SMTP_SERVERS
+
+PASSWORD_ENV = "PYBRANCH_SMTP_PASSWORD"
+
+
+class JobError(ValueError):
+    """A job that cannot be sent as written"""
+
+
+def iter_jobs(stream):
+    """Yield job dicts from one JSON document or from JSON lines
+
+    JSON lines are read one at a time, so large batches are not loaded
+    into memory up front.
+    """
+    first = ''
+    for first in stream:
+        if first.strip():
+            break
+    if not first.strip():
+        return
+    try:
+        job = json.loads(first)
+    except ValueError:
+        # Not a complete document on one line, parse the whole input
+        data = json.loads(first + stream.read())
+        yield from data if isinstance(data, list) else [data]
+        return
+    yield from job if isinstance(job, list) else [job]
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def job_recipients(job):
+    """to/cc/bcc dict from a job's "to" string or lists"""
+    to = job.get('to', '')
+    if isinstance(to, str):
+        recipients = mail_core.parse_recipients(to)
+    else:
+        recipients = {'to': [str(a).strip() for a in to], 'cc': [], 'bcc': []}
+    for field in ('cc', 'bcc'):
+        recipients[field] += [str(a).strip() for a in job.get(field, [])]
+
+    addresses = recipients['to'] + recipients['cc'] + recipients['bcc']
+    if not addresses:
+        raise JobError("no recipients")
+    invalid = [a for a in addresses if not mail_core.is_valid_email(a)]
+    if invalid:
+        raise JobError(f"invalid recipients: {', '.join(invalid)}")
+    return recipients
+
+
+def prepare_job(job):
+    """Validate a job and return (recipients, subject, html, attachments)"""
+    if not isinstance(job, dict):
+        raise JobError("job must be a JSON object")
+    recipients = job_recipients(job)
+    attachments = []
+    for path in job.get('attachments', []):
+        if not os.path.isfile(path):
+            raise JobError(f"attachment not found: {path}")
+        attachments.append((path, None))
+    if 'html' in job:
+        html = job['html']
+    else:
+        html = mail_core.process_message_body(job.get('body', ''), attachments)
+    return recipients, job.get('subject', ''), html, attachments
+
+
+def load_account(args):
+    """SMTP settings from the command line, the environment or the stored login"""
+    preset = SMTP_SERVERS.get(args.provider, {}) if args.provider else {}
+    account = {
+        'server': args.server or preset.get('server'),
+        'port': args.port or preset.get('port'),
+        'email': args.account,
+        'password': os.environ.get(PASSWORD_ENV),
+    }
+    missing = [key for key, value in account.items() if not value]
+    if missing and not args.no_stored_credentials:
+        # Only needed when something wasn't given, keeps startup fast otherwise
+        from account_store import open_account_store
+        store = open_account_store()
+        account_id = (store.find(args.account) if args.account else None) or args.service
+        for key in missing:
+            account[key] = store.get_credential(account_id, key)
+        missing = [key for key, value in account.items() if not value]
+    if missing:
+        raise SystemExit(f"batch_send: missing SMTP settings: {', '.join(missing)} "
+                         f"(password is read from ${PASSWORD_ENV})")
+    return account
+
+
+def open_inputs(paths):
+    if not paths or paths == ['-']:
+        yield '-', sys.stdin
+        return
+    for path in paths:
+        if path == '-':
+            yield path, sys.stdin
+            continue
+        with open(path, 'r', encoding='utf-8') as f:
+            yield path, f
+
+
+def result_line(source, index, report=None, error=None):
+    result = {'source': source, 'job': index}
+    if error is not None:
+        result.update(status='failed', error=str(error))
+        return result
+    if report.ok:
+        status = 'sent'
+    elif report.error or not report.delivered:
+        status = 'failed'
+    else:
+        status = 'partial'
+    result.update(status=status, **report.to_dict())
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Send PyBranch jobs without the GUI")
+    parser.add_argument("files", nargs="*", help="job files, '-' or nothing reads stdin")
+    parser.add_argument("--provider", choices=sorted(SMTP_SERVERS), help="use a preset server")
+    parser.add_argument("--server")
+    parser.add_argument("--port", type=int)
+    parser.add_argument("--account", help="sender address / SMTP login")
+    parser.add_argument("--service", default="smtp_client",
+                        help="stored account used for missing settings when --account "
+                             "doesn't match one")
+    parser.add_argument("--no-stored-credentials", action="store_true")
+    parser.add_argument("--sessions", type=int, default=2, help="parallel SMTP sessions")
+    parser.add_argument("--optimize-images", action="store_true")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="validate jobs and build messages without sending")
+    args = parser.parse_args(argv)
+    for path in args.files:
+        if path != '-' and not os.path.isfile(path):
+            parser.error(f"job file not found: {path}")
+
+    account = {} if args.dry_run else load_account(args)
+    pool = SMTPConnectionPool(max_idle=args.sessions)
+    image_optimizer = None
+    if args.optimize_images:
+        from image_optimizer import ImageOptimizer
+        image_optimizer = ImageOptimizer()
+
+    def run_job(source, index, job):
+        try:
+            recipients, subject, html, attachments = prepare_job(job)
+            if args.dry_run:
+                message_file, size = build_message_file(
+                    args.account or "dry-run@localhost", recipients, subject, html,
+                    unique_attachments(attachments))
+                message_file.close()
+                return {'source': source, 'job': index, 'status': 'ok', 'size': size}
+            report = mail_core.send_message(
+                pool, account['server'], account['port'], account['email'],
+                account['password'], recipients, subject, html, attachments,
+                image_optimizer=image_optimizer)
+            return result_line(source, index, report)
+        except (JobError, OSError) as e:
+            return result_line(source, index, error=e)
+
+    failed = 0
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.sessions)) as executor:
+            for source, stream in open_inputs(args.files):
+                # Bounded window of in-flight jobs keeps memory flat
+                futures = []
+                try:
+                    for index, job in enumerate(iter_jobs(stream)):
+                        futures.append(executor.submit(run_job, source, index, job))
+                        if len(futures) >= args.sessions * 4:
+                            failed += _emit(futures.pop(0).result())
+                except ValueError as e:
+                    failed += _emit({'source': source, 'status': 'failed',
+                                     'error': f"invalid job input: {e}"})
+                for future in futures:
+                    failed += _emit(future.result())
+    finally:
+        pool.close_all()
+        if image_optimizer:
+            image_optimizer.shutdown()
+    return 1 if failed else 0
+
+
+def _emit(result):
+    print(json.dumps(result), flush=True)
+    return result['status'] == 'failed'
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -18,78 +18,238 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import json
 import os
-from cryptography.fernet import Fernet
+import tempfile
+import threading
+from contextlib import contextmanager
+from cryptography.fernet import Fernet, InvalidToken
 from base64 import b64encode
 import hashlib
 
+try:
+    import fcntl
+except ImportError:  # Windows, fall back to in-process locking only
+    fcntl = None
+
+
+class CredentialStoreError(Exception):
+    """credentials.enc exists but can't be decrypted or parsed"""
+
+
+def atomic_write(path, data):
+    """Write bytes to a temp file next to path and rename it into place"""
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, tmp_path = tempfile.mkstemp(
+        dir=directory, prefix=f".{os.path.basename(path).split('.')[0]}.", suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def ensure_key(key_file):
+    """Create the Fernet key file unless it exists"""
+    if os.path.exists(key_file):
+        return
+    # Publish the key with link() so two processes starting at once
+    # can't each create a different key
+    directory = os.path.dirname(os.path.abspath(key_file))
+    handle, tmp_path = tempfile.mkstemp(dir=directory, prefix=".secret.", suffix=".tmp")
+    try:
+        with os.fdopen(handle, "wb") as f:
+            f.write(Fernet.generate_key())
+            f.flush()
+            os.fsync(f.fileno())
+        try:
+            os.link(tmp_path, key_file)
+        except FileExistsError:
+            pass
+    finally:
+        os.remove(tmp_path)
+
+
+@contextmanager
+def file_lock(lock_path):
+    """Exclusive advisory lock shared with other processes using the same store"""
+    if fcntl is None:
+        yield
+        return
+    with open(lock_path, "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
 class CredentialsManager:
+    """Fernet-encrypted credential file with a decrypted in-memory cache
+
+    The decrypted data is kept until credentials.enc changes on disk (by
+    mtime, size and inode), so lookups don't decrypt the file every time.
+    Changes made inside transaction() are written once when it ends.
+
+    Several processes can share the store: writes go to a temp file that
+    is renamed over credentials.enc, so readers always see a complete
+    file, and read-modify-write cycles hold an exclusive fcntl lock on
+    credentials.enc.lock so concurrent writers don't lose each other's
+    changes. Readers need no lock, they only notice the rename through
+    the stat check.
+    """
+
     def __init__(self):
         self.key_file = "secret.key"
         self.creds_file = "credentials.enc"
+        self.lock_file = self.creds_file + ".lock"
         self._ensure_key()
         self.fernet = Fernet(self._load_key())
+        self._lock = threading.RLock()
+        self._cache = None          # decrypted {service: {key: value}}
+        self._cache_stamp = None    # file stat the cache was read from
+        self._pending = None        # working copy while a transaction is open
+        self._depth = 0
+        self._dirty = False
 
     def _ensure_key(self):
-        if not os.path.exists(self.key_file):
-            key = Fernet.generate_key()
-            with open(self.key_file, "wb") as f:
-                f.write(key)
+        ensure_key(self.key_file)
 
     def _load_key(self):
         with open(self.key_file, "rb") as f:
             return f.read()
 
-    def save_credential(self, service, key, value):
-        data = {}
-        if os.path.exists(self.creds_file):
-            with open(self.creds_file, "rb") as f:
+    @staticmethod
+    def _stamp(st):
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    def _file_stamp(self):
+        try:
+            return self._stamp(os.stat(self.creds_file))
+        except FileNotFoundError:
+            return None
+
+    def changed(self):
+        """True when another process replaced the file since it was last read"""
+        return self._cache is None or self._file_stamp() != self._cache_stamp
+
+    def _read(self):
+        """Decrypted data, re-read only when the file changed since last time"""
+        if not self.changed():
+            return self._cache
+        data, stamp = {}, None
+        try:
+            f = open(self.creds_file, "rb")
+        except FileNotFoundError:
+            pass
+        else:
+            with f:
+                # Stamp the file actually opened, it may be renamed over meanwhile
+                stamp = self._stamp(os.fstat(f.fileno()))
+                encrypted_data = f.read()
+            try:
+                data = json.loads(self.fernet.decrypt(encrypted_data))
+            except (InvalidToken, ValueError) as e:
+                raise CredentialStoreError(
+                    f"{self.creds_file} could not be decrypted: {e.__class__.__name__}") from None
+        self._wipe(self._cache)
+        self._cache, self._cache_stamp = data, stamp
+        return data
+
+    def _write(self, data):
+        """Replace credentials.enc atomically with the encrypted data"""
+        atomic_write(self.creds_file, self.fernet.encrypt(json.dumps(data).encode()))
+        if data is not self._cache:
+            self._wipe(self._cache)
+        self._cache, self._cache_stamp = data, self._file_stamp()
+
+    def _current(self):
+        """The data changes apply to, the open transaction's copy if any"""
+        if self._pending is not None:
+            return self._pending
+        return self._read()
+
+    @staticmethod
+    def _wipe(data):
+        # Python strings can't be zeroed in place, dropping every reference
+        # is the best we can do to let the secrets be freed
+        if data:
+            for values in data.values():
+                if isinstance(values, dict):
+                    values.clear()
+            data.clear()
+
+    @contextmanager
+    def transaction(self):
+        """Group saves and deletes into a single encrypt-and-write
+
+        Nested transactions join the outer one. If the block raises, none
+        of its changes are written.
+        """
+        with self._lock:
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield self
+                finally:
+                    self._depth -= 1
+                return
+            with file_lock(self.lock_file):
+                # Re-read under the lock so changes made by other processes
+                # since the last lookup are kept
+                self._pending = {s: dict(v) for s, v in self._read().items()}
+                self._dirty = False
+                self._depth = 1
                 try:
-                    encrypted_data = f.read()
-                    decrypted_data = self.fernet.decrypt(encrypted_data)
-                    data = json.loads(decrypted_data)
-                except:
-                    data = {}
+                    yield self
+                    if self._dirty:
+                        self._write(self._pending)
+                        self._pending = None
+                finally:
+                    self._depth = 0
+                    self._wipe(self._pending)
+                    self._pending = None
 
-        if service not in data:
-            data[service] = {}
-        data[service][key] = value
+    def save_credential(self, service, key, value):
+        self.save_many(service, {key: value})
 
-        encrypted_data = self.fernet.encrypt(json.dumps(data).encode())
-        with open(self.creds_file, "wb") as f:
-            f.write(encrypted_data)
+    def save_many(self, service, values):
+        """Store several keys of one service with a single write"""
+        with self.transaction():
+            data = self._current()
+            if service not in data:
+                data[service] = {}
+            data[service].update(values)
+            self._dirty = True
 
-    def get_credential(self, service, key):
-        if not os.path.exists(self.creds_file):
-            return None
+    def services(self):
+        """Copy of every stored service and its keys"""
+        with self._lock:
+            return {service: dict(values) for service, values in self._read().items()}
 
-        with open(self.creds_file, "rb") as f:
+    def get_credential(self, service, key):
+        with self._lock:
             try:
-                encrypted_data = f.read()
-                decrypted_data = self.fernet.decrypt(encrypted_data)
-                data = json.loads(decrypted_data)
-                return data.get(service, {}).get(key)
-            except:
+                return self._current().get(service, {}).get(key)
+            except CredentialStoreError as e:
+                print(f"Error reading credentials: {e}")
                 return None
 
     def delete_credential(self, service, key):
         """Delete a stored credential"""
         try:
-            data = {}
-            if os.path.exists(self.creds_file):
-                with open(self.creds_file, "rb") as f:
-                    encrypted_data = f.read()
-                    decrypted_data = self.fernet.decrypt(encrypted_data)
-                    data = json.loads(decrypted_data)
-            
-            if service in data and key in data[service]:
-                del data[service][key]
-                if not data[service]:  # Remove service if empty
-                    del data[service]
-                    
-                # Save updated data
-                encrypted_data = self.fernet.encrypt(json.dumps(data).encode())
-                with open(self.creds_file, "wb") as f:
-                    f.write(encrypted_data)
+            with self.transaction():
+                data = self._current()
+                if service in data and key in data[service]:
+                    del data[service][key]
+                    if not data[service]:  # Remove service if empty
+                        del data[service]
+                    self._dirty = True
             return True
         except Exception as e:
             print(f"Error deleting credential: {e}")
@@ -99,9 +259,16 @@ class CredentialsManager:
         """Clear all credentials for a service"""
         try:
             keys = ["email", "password", "server", "port"]
-            for key in keys:
-                self.delete_credential(service, key)
+            with self.transaction():
+                for key in keys:
+                    self.delete_credential(service, key)
             return True
         except Exception as e:
             print(f"Error clearing credentials: {e}")
             return False
+
+    def close(self):
+        """Drop the decrypted cache, the next lookup reads the file again"""
+        with self._lock:
+            self._wipe(self._cache)
+            self._cache = self._cache_stamp = None
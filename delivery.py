@@ -0,0 +1,155 @@
+"""
+PyBranch - Modern SMTP Email Client
+Copyright (C) 2025 Nagusame CS
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import random
+import smtplib
+import time
+
+from envelope_planner import plan_envelopes
+
+
+def _text(resp):
+    if isinstance(resp, bytes):
+        return resp.decode('utf-8', 'replace')
+    return str(resp)
+
+
+def is_transient(code):
+    """4xx replies and dropped connections (no code) are worth retrying"""
+    return code is None or 400 <= code < 500
+
+
+class DeliveryReport:
+    """Per-recipient outcome of one message
+
+    delivered is a list of addresses, deferred and rejected map each address
+    to its last (code, message) reply. Deferred recipients got a transient
+    failure and can be retried, rejected ones got a permanent one.
+    """
+
+    def __init__(self, delivered=None, deferred=None, rejected=None, attempts=0, error=None):
+        self.delivered = list(delivered or [])
+        self.deferred = dict(deferred or {})
+        self.rejected = dict(rejected or {})
+        self.attempts = attempts
+        self.error = error          # set when the message could not be built at all
+
+    @property
+    def ok(self):
+        return self.error is None and not self.deferred and not self.rejected
+
+    def record(self, attempted, refused):
+        """Fold one attempt's refused dict into the report"""
+        for address in attempted:
+            if address in refused:
+                code, resp = refused[address]
+                if is_transient(code):
+                    self.deferred[address] = (code, _text(resp))
+                else:
+                    self.deferred.pop(address, None)
+                    self.rejected[address] = (code, _text(resp))
+            else:
+                self.deferred.pop(address, None)
+                self.delivered.append(address)
+
+    def summary(self):
+        if self.error:
+            return f"Failed to send email: {self.error}"
+        if self.ok:
+            return "Email sent successfully!"
+        lines = [f"Delivered: {len(self.delivered)}, deferred: {len(self.deferred)}, "
+                 f"rejected: {len(self.rejected)}"]
+        for label, failures in (("Rejected", self.rejected), ("Deferred", self.deferred)):
+            for address, (code, message) in list(failures.items())[:5]:
+                lines.append(f"{label} {address}: {code or ''} {message}".rstrip())
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {
+            'delivered': self.delivered,
+            'deferred': {a: list(r) for a, r in self.deferred.items()},
+            'rejected': {a: list(r) for a, r in self.rejected.items()},
+            'attempts': self.attempts,
+            'error': self.error,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data.get('delivered'),
+            {a: tuple(r) for a, r in (data.get('deferred') or {}).items()},
+            {a: tuple(r) for a, r in (data.get('rejected') or {}).items()},
+            data.get('attempts', 0),
+            data.get('error'),
+        )
+
+
+def backoff_delay(attempt, base_delay, max_delay):
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def _attempt(send_attempt, addresses):
+    """Run one transaction, turning SMTP errors into a refused dict"""
+    try:
+        return send_attempt(addresses)
+    except smtplib.SMTPRecipientsRefused as e:
+        # DATA never went out, so nobody got the message. Addresses the
+        # server didn't answer for (e.g. after a 421 mid-envelope) are deferred.
+        refused = {address: (421, "transaction aborted before DATA") for address in addresses}
+        refused.update(e.recipients)
+        return refused
+    except smtplib.SMTPResponseException as e:
+        # Sender, DATA or connection-level reply applies to the whole envelope
+        return {address: (e.smtp_code, e.smtp_error) for address in addresses}
+    except smtplib.SMTPServerDisconnected as e:
+        return {address: (None, str(e)) for address in addresses}
+    except smtplib.SMTPException:
+        # No reply code, e.g. no STARTTLS on offer: a setup problem that
+        # retrying won't fix, so the whole send fails
+        raise
+    except OSError as e:
+        # Socket errors, SMTPException subclasses OSError so it's caught above
+        return {address: (None, str(e)) for address in addresses}
+
+
+def deliver(send_attempt, recipients, report=None, max_recipients=None, max_attempts=3,
+            base_delay=1.0, max_delay=30.0, sleep=time.sleep):
+    """Send to recipients, retrying only the ones that failed transiently
+
+    send_attempt(addresses) performs one SMTP transaction for the given
+    envelope and returns the refused-recipients dict, like sendmail(). With
+    max_recipients set, each attempt is split into envelopes planned by
+    plan_envelopes() and a failing batch doesn't affect the others.
+    Returns a DeliveryReport, recipients still deferred after max_attempts
+    are left in report.deferred for a later resume.
+    """
+    report = report or DeliveryReport()
+    pending = list(recipients)
+    for attempt in range(max_attempts):
+        if attempt:
+            sleep(backoff_delay(attempt - 1, base_delay, max_delay))
+        report.attempts += 1
+        batches = plan_envelopes(pending, max_recipients) if max_recipients else [pending]
+        for batch in batches:
+            report.record(batch, _attempt(send_attempt, batch))
+        pending = [address for batch in batches for address in batch
+                   if address in report.deferred]
+        if not pending:
+            break
+    return report
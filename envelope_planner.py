@@ -0,0 +1,76 @@
+"""
+PyBranch - Modern SMTP Email Client
+Copyright (C) 2025 Nagusame CS
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import bisect
+
+from smtp_presets import SMTP_SERVERS, DEFAULT_MAX_RECIPIENTS
+
+
+def max_recipients_for(server):
+    """RCPT limit for an SMTP host, from SMTP_SERVERS or the default"""
+    host = (server or "").strip().lower()
+    for preset in SMTP_SERVERS.values():
+        if preset["server"] == host:
+            return preset.get("max_recipients", DEFAULT_MAX_RECIPIENTS)
+    return DEFAULT_MAX_RECIPIENTS
+
+
+def _domain(address):
+    return address.rpartition('@')[2].lower()
+
+
+def plan_envelopes(addresses, max_recipients):
+    """Split addresses into envelopes of at most max_recipients RCPTs
+
+    Duplicates are dropped (case-insensitively), and addresses are grouped
+    by destination domain so the relay can hand each batch to as few remote
+    hosts as possible. Large domains fill whole batches first, the rest of
+    each domain then goes into the open batch with the least room that
+    still fits it, found by bisecting the batches sorted by room left.
+    """
+    max_recipients = max(1, int(max_recipients))
+    groups = {}
+    seen = set()
+    for address in addresses:
+        key = address.strip().lower()
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        groups.setdefault(_domain(key), []).append(address.strip())
+
+    batches = []
+    rooms = []      # sorted (room left, batch index) of batches not yet full
+    for group in sorted(groups.values(), key=len, reverse=True):
+        # Full batches of a single domain
+        full = len(group) - len(group) % max_recipients
+        for start in range(0, full, max_recipients):
+            batches.append(group[start:start + max_recipients])
+        group = group[full:]
+        if not group:
+            continue
+        # Keep the remainder of a domain together
+        i = bisect.bisect_left(rooms, (len(group), -1))
+        if i < len(rooms):
+            room, index = rooms.pop(i)
+            batches[index].extend(group)
+        else:
+            room, index = max_recipients, len(batches)
+            batches.append(list(group))
+        if room > len(group):
+            bisect.insort(rooms, (room - len(group), index))
+    return batches
@@ -0,0 +1,125 @@
+"""
+PyBranch - Modern SMTP Email Client
+Copyright (C) 2025 Nagusame CS
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import shutil
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from part_cache import PART_CACHE
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optimization is skipped without Pillow
+    Image = None
+
+# Formats worth recompressing, GIFs are left alone to keep animations intact
+OPTIMIZABLE_EXTENSIONS = ('.png', '.jpg', '.jpeg')
+
+
+def optimize_image(src_path, dest_path, max_dimension, quality):
+    """Downscale and recompress one image, runs inside a worker process
+
+    Falls back to a plain copy when the result would not be smaller.
+    """
+    tmp_path = f"{dest_path}.{os.getpid()}.tmp"
+    with Image.open(src_path) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+        if src_path.lower().endswith('.png'):
+            image.save(tmp_path, format='PNG', optimize=True)
+        else:
+            if image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            image.save(tmp_path, format='JPEG', quality=quality,
+                       optimize=True, progressive=True)
+    if os.path.getsize(tmp_path) >= os.path.getsize(src_path):
+        shutil.copyfile(src_path, tmp_path)
+    os.replace(tmp_path, dest_path)
+    return dest_path
+
+
+class ImageOptimizer:
+    """Optional send stage that shrinks inline images before encoding
+
+    Work is spread over a process pool so several images are handled in
+    parallel. Results are cached on disk by source hash and settings, and
+    keep the original file name so attachment names don't change.
+    """
+
+    def __init__(self, cache_dir="image_cache", max_dimension=1600, quality=82,
+                 workers=None):
+        self.cache_dir = cache_dir
+        self.max_dimension = max_dimension
+        self.quality = quality
+        self.workers = workers
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def available(self):
+        return Image is not None
+
+    def _executor_instance(self):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            return self._executor
+
+    def _cached_path(self, file_path):
+        digest = PART_CACHE.digest(file_path)
+        folder = os.path.join(self.cache_dir,
+                              f"{digest}_{self.max_dimension}_{self.quality}")
+        return os.path.join(folder, os.path.basename(file_path))
+
+    def optimize_attachments(self, attachments):
+        """Swap inline images for optimized copies, other entries pass through"""
+        if not self.available:
+            return list(attachments)
+
+        results = list(attachments)
+        futures = {}
+        for index, (file_path, content_id) in enumerate(results):
+            if not content_id or not file_path.lower().endswith(OPTIMIZABLE_EXTENSIONS):
+                continue
+            try:
+                dest_path = self._cached_path(file_path)
+            except OSError as e:
+                print(f"Error optimizing image {file_path}: {e}")
+                continue
+            if os.path.exists(dest_path):
+                results[index] = (dest_path, content_id)
+                continue
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            future = self._executor_instance().submit(
+                optimize_image, file_path, dest_path, self.max_dimension, self.quality)
+            futures[index] = (future, content_id)
+
+        for index, (future, content_id) in futures.items():
+            try:
+                results[index] = (future.result(), content_id)
+            except Exception as e:
+                # Send the original image rather than failing the message
+                print(f"Error optimizing image {results[index][0]}: {e}")
+        return results
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
@@ -0,0 +1,194 @@
+"""
+PyBranch - Modern SMTP Email Client
+Copyright (C) 2025 Nagusame CS
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Push notification with IMAP IDLE (RFC 2177): a listener keeps its own
+# connection per watched folder waiting in IDLE and reports EXISTS /
+# EXPUNGE / FETCH / VANISHED updates, the sync itself runs on another
+# connection. Servers without IDLE are polled instead.
+
+import socket
+import threading
+import time
+
+from imap_sync import ImapSyncError, quote_mailbox, refresh_capabilities
+
+# Seconds in one IDLE command, well inside the 29 minutes RFC 2177 allows,
+# renewing also finds dead connections and keeps NAT mappings open
+IDLE_RENEW = 10 * 60
+# Seconds to wait for a reply from the server
+REPLY_TIMEOUT = 30
+# Seconds between syncs when the server has no IDLE
+POLL_INTERVAL = 5 * 60
+# Seconds before reconnecting after an error, doubled up to RECONNECT_MAX
+RECONNECT_DELAY = 5
+RECONNECT_MAX = 5 * 60
+# Untagged responses that mean the folder changed
+CHANGE_RESPONSES = {b'EXISTS', b'EXPUNGE', b'FETCH', b'VANISHED'}
+
+
+def is_change(line):
+    """True for untagged responses such as '* 12 EXISTS' or '* VANISHED 4'"""
+    words = line.split(None, 3)
+    return (len(words) > 1 and words[0] == b'*'
+            and (words[1].upper() in CHANGE_RESPONSES
+                 or len(words) > 2 and words[2].upper() in CHANGE_RESPONSES))
+
+
+class IdleListener(threading.Thread):
+    """Watches one folder over its own connection from connect()
+
+    on_change(folder) is called from this thread as soon as the server
+    reports new, removed or changed messages, and after every (re)connect
+    since updates may have been missed meanwhile. Between updates the
+    thread sleeps in recv(), it only wakes to renew IDLE. While idling,
+    lines are read from the socket directly: a timeout on imaplib's
+    buffered file would break it for good.
+    """
+
+    def __init__(self, connect, folder, on_change):
+        super().__init__(daemon=True, name=f"IDLE {folder}")
+        self.connect = connect
+        self.folder = folder
+        self.on_change = on_change
+        self.conn = None
+        self._stopping = threading.Event()
+        self._lines = []
+        self._partial = b''
+
+    def run(self):
+        delay = RECONNECT_DELAY
+        while not self._stopping.is_set():
+            try:
+                idle = self._open()
+                delay = RECONNECT_DELAY
+                self.on_change(self.folder)
+                if idle:
+                    while not self._stopping.is_set():
+                        self._idle()
+                else:
+                    while not self._stopping.wait(POLL_INTERVAL):
+                        self.conn.noop()
+                        self.on_change(self.folder)
+            except Exception as e:
+                if self._stopping.is_set():
+                    break
+                print(f"IDLE error on {self.folder}: {e}")
+            finally:
+                self._close()
+            self._stopping.wait(delay)
+            delay = min(delay * 2, RECONNECT_MAX)
+
+    def stop(self):
+        """End the listener, a blocked read is woken by closing the socket"""
+        self._stopping.set()
+        conn = self.conn
+        if conn is not None:
+            try:
+                conn.sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _open(self):
+        """Connect and EXAMINE the folder, returns whether IDLE is available"""
+        self.conn = self.connect()
+        if self._stopping.is_set():
+            raise ImapSyncError("stopped")
+        idle = 'IDLE' in refresh_capabilities(self.conn)
+        typ, data = self.conn.select(quote_mailbox(self.folder), readonly=True)
+        if typ != 'OK':
+            raise ImapSyncError(f"can't open {self.folder}: {data}")
+        self._lines = []
+        self._partial = b''
+        return idle
+
+    def _close(self):
+        conn, self.conn = self.conn, None
+        if conn is not None:
+            try:
+                conn.shutdown()
+            except OSError:
+                pass
+
+    def _idle(self):
+        """One IDLE command, ended with DONE when it's due for renewal"""
+        tag = self.conn._new_tag()
+        done = tag + b' '
+        self.conn.send(tag + b' IDLE\r\n')
+        deadline = time.monotonic() + REPLY_TIMEOUT
+        changed = False
+        while True:
+            line = self._read_line(deadline)
+            if line.startswith(b'+'):
+                break
+            if line.startswith(done):
+                raise ImapSyncError(f"IDLE refused: {line.decode('ascii', 'replace')}")
+            changed = self._check(line) or changed
+        if changed:
+            self.on_change(self.folder)
+        renew_at = time.monotonic() + IDLE_RENEW
+        while not self._stopping.is_set():
+            remaining = renew_at - time.monotonic()
+            if remaining <= 0:
+                break
+            lines = self._receive(remaining)
+            # One callback per burst of updates
+            if any([self._check(line) for line in lines if not line.startswith(done)]):
+                self.on_change(self.folder)
+            if any(line.startswith(done) for line in lines):
+                return  # the server ended it, e.g. its own timeout
+        self.conn.send(b'DONE\r\n')
+        deadline = time.monotonic() + REPLY_TIMEOUT
+        changed = False
+        while True:
+            line = self._read_line(deadline)
+            if line.startswith(done):
+                break
+            changed = self._check(line) or changed
+        if changed:
+            self.on_change(self.folder)
+
+    @staticmethod
+    def _check(line):
+        """True if line reports a change, raises if the server is leaving"""
+        if line.upper().startswith(b'* BYE'):
+            raise ImapSyncError(f"server closed the connection: {line.decode('ascii', 'replace')}")
+        return is_change(line)
+
+    def _read_line(self, deadline):
+        while not self._lines:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise ImapSyncError("server stopped answering")
+            self._lines = self._receive(remaining)
+        return self._lines.pop(0)
+
+    def _receive(self, timeout):
+        """Lines that arrive within timeout, waiting in recv(), [] if none did"""
+        if self._lines:
+            lines, self._lines = self._lines, []
+            return lines
+        sock = self.conn.sock
+        sock.settimeout(timeout)
+        try:
+            data = sock.recv(65536)
+        except socket.timeout:
+            return []
+        if not data:
+            raise ImapSyncError("connection closed")
+        *lines, self._partial = (self._partial + data).split(b'\r\n')
+        return lines
@@ -0,0 +1,576 @@
+"""
+PyBranch - Modern SMTP Email Client
+Copyright (C) 2025 Nagusame CS
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Incremental IMAP sync into a MailCache: only UIDs above the cached
+# highest UID are fetched, flag changes and expunges come from CONDSTORE /
+# QRESYNC (RFC 7162) when the server has them. New messages are fetched
+# headers-first, bodies and attachments only when a message is opened.
+
+import base64
+import email
+import html
+import imaplib
+import itertools
+import json
+import queue
+import quopri
+import re
+import threading
+from collections import deque, namedtuple
+from datetime import datetime
+from email.header import decode_header, make_header
+from email import policy
+from email.parser import BytesHeaderParser
+
+from smtp_presets import SMTP_SERVERS
+
+# UIDs per UID FETCH command
+FETCH_CHUNK = 500
+# UID FETCH commands sent before waiting for the first one to complete
+PIPELINE_DEPTH = 4
+LIST_HEADERS = 'DATE FROM TO CC SUBJECT MESSAGE-ID'
+NEW_MESSAGE_ITEMS = (f'(UID FLAGS RFC822.SIZE INTERNALDATE BODYSTRUCTURE '
+                     f'BODY.PEEK[HEADER.FIELDS ({LIST_HEADERS})])')
+
+SyncResult = namedtuple('SyncResult', 'folder new changed removed')
+
+_TOKEN = re.compile(
+    rb'[ \r\n]*(?:(\()|(\))|"((?:[^"\\]|\\.)*)"|\{(\d+)\}'
+    rb'|([^ \r\n()"{\[\]]*(?:\[[^\]]*\](?:<[\d.]+>)?)?))')
+_QUOTED_ESCAPE = re.compile(r'\\(.)')
+
+
+class ImapSyncError(Exception):
+    """A folder couldn't be selected or fetched"""
+
+
+class _Reader:
+    """Reads IMAP values (atoms, strings, literals, lists) from a response"""
+
+    def __init__(self, text, literals):
+        self.text = text
+        self.position = 0
+        self.literals = iter(literals)
+
+    def at_end(self):
+        return not self.text[self.position:].strip()
+
+    def read(self):
+        """Next value: str, bytes for literals, None for NIL or a list"""
+        match = _TOKEN.match(self.text, self.position)
+        if match is None or match.end() == self.position:
+            raise ImapSyncError(f"unparsable response near {self.text[self.position:][:40]!r}")
+        self.position = match.end()
+        opening, closing, quoted, literal, atom = match.groups()
+        if opening:
+            values = []
+            while True:
+                value = self.read()
+                if value is _Reader.CLOSE:
+                    return values
+                values.append(value)
+        if closing:
+            return _Reader.CLOSE
+        if quoted is not None:
+            return _QUOTED_ESCAPE.sub(r'\1', quoted.decode('utf-8', 'replace'))
+        if literal is not None:
+            return next(self.literals)
+        atom = atom.decode('utf-8', 'replace')
+        return None if atom.upper() == 'NIL' else atom
+
+    CLOSE = object()
+
+
+def parse_fetch(data):
+    """One dict per message in the data of a FETCH response
+
+    Item names are upper-cased keys, UID and RFC822.SIZE are ints, FLAGS
+    a list and BODY[...] sections bytes (or None).
+    """
+    texts, literals = [], []
+    for item in data:
+        if isinstance(item, tuple):
+            texts.append(item[0])
+            literals.append(item[1])
+        elif item:
+            texts.append(item)
+    reader = _Reader(b' '.join(texts), literals)
+    messages = []
+    while not reader.at_end():
+        reader.read()   # message sequence number
+        values = reader.read()
+        if not isinstance(values, list):
+            continue
+        message = {}
+        for name, value in zip(values[::2], values[1::2]):
+            name = name.upper()
+            if name in ('UID', 'RFC822.SIZE'):
+                value = int(value)
+            elif name == 'MODSEQ':
+                value = int(value[0])
+            elif isinstance(value, str) and name.startswith('BODY['):
+                value = value.encode('utf-8')
+            message[name] = value
+        messages.append(message)
+    return messages
+
+
+def uid_ranges(uids):
+    """Compact IMAP sequence set for ascending UIDs, e.g. '1:3,7,9:12'"""
+    ranges = []
+    start = previous = None
+    for uid in uids:
+        if previous is not None and uid == previous + 1:
+            previous = uid
+            continue
+        if start is not None:
+            ranges.append(f"{start}:{previous}" if previous != start else str(start))
+        start = previous = uid
+    if start is not None:
+        ranges.append(f"{start}:{previous}" if previous != start else str(start))
+    return ",".join(ranges)
+
+
+def parse_uid_set(text):
+    """UIDs of an IMAP sequence set such as '41,43:116'"""
+    uids = []
+    for part in text.split(','):
+        first, _, last = part.partition(':')
+        if first:
+            first = int(first)
+            uids.extend(range(first, int(last) + 1) if last else (first,))
+    return uids
+
+
+def quote_mailbox(folder):
+    return '"' + folder.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def decode_text(value):
+    """Unicode text of a header value that may hold RFC 2047 encoded words"""
+    if not value:
+        return ''
+    if isinstance(value, bytes):
+        value = value.decode('utf-8', 'replace')
+    try:
+        return str(make_header(decode_header(value)))
+    except (LookupError, UnicodeError, ValueError):
+        return value
+
+
+def _plain(value):
+    """BODYSTRUCTURE with literals turned into str, so it can go into JSON"""
+    if isinstance(value, list):
+        return [_plain(item) for item in value]
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return value
+
+
+def internal_date(value):
+    """Epoch seconds of an INTERNALDATE such as '17-Jul-1996 02:44:25 -0700'"""
+    try:
+        return datetime.strptime(value, "%d-%b-%Y %H:%M:%S %z").timestamp()
+    except (TypeError, ValueError):
+        return 0
+
+
+_header_parser = BytesHeaderParser()
+
+
+def message_row(message):
+    """MailCache columns for a message fetched with NEW_MESSAGE_ITEMS"""
+    header_bytes = next((value for name, value in message.items()
+                         if name.startswith('BODY[HEADER')), None) or b''
+    headers = _header_parser.parsebytes(header_bytes)
+    return {
+        'uid': message['UID'],
+        'flags': ' '.join(message.get('FLAGS', ())),
+        'size': message.get('RFC822.SIZE', 0),
+        'date': internal_date(message.get('INTERNALDATE')),
+        'subject': decode_text(headers['Subject']),
+        'sender': decode_text(headers['From']),
+        'recipients': ", ".join(filter(None, (decode_text(headers['To']),
+                                              decode_text(headers['Cc'])))),
+        'message_id': (headers['Message-ID'] or '').strip() or None,
+        'structure': json.dumps(_plain(message.get('BODYSTRUCTURE'))),
+    }
+
+
+def structure_parts(structure, prefix=''):
+    """(section, part) for every leaf part of a BODYSTRUCTURE"""
+    if structure and isinstance(structure[0], list):
+        # Child parts come first, then the multipart subtype and extensions
+        children = itertools.takewhile(lambda part: isinstance(part, list), structure)
+        for index, child in enumerate(children, 1):
+            yield from structure_parts(child, f"{prefix}{index}.")
+    elif structure:
+        yield prefix.rstrip('.') or '1', structure
+
+
+def _pairs(values):
+    values = values if isinstance(values, list) else []
+    return {str(key).lower(): value for key, value in zip(values[::2], values[1::2])}
+
+
+def part_info(part):
+    """Content type, encoding, size and file name of a BODYSTRUCTURE leaf"""
+    content_type = f"{part[0]}/{part[1]}".lower()
+    params = _pairs(part[2])
+    # Extension data starts after the line count of text parts
+    extension = part[8 if content_type.startswith('text/') else 7:]
+    disposition = extension[1] if len(extension) > 1 and isinstance(extension[1], list) else None
+    filename = None
+    if disposition:
+        filename = _pairs(disposition[1] if len(disposition) > 1 else None).get('filename')
+    filename = filename or params.get('name')
+    return {
+        'type': content_type,
+        'charset': params.get('charset'),
+        'encoding': (part[5] or '7bit').lower(),
+        'size': int(part[6] or 0),
+        'filename': decode_text(filename) if filename else None,
+        'attachment': bool(filename or disposition and str(disposition[0]).lower() == 'attachment'),
+    }
+
+
+def text_section(structure):
+    """(section, info) of the part to show as the message text
+
+    The first inline text/plain part wins, then text/html.
+    """
+    best = None
+    for section, part in structure_parts(structure):
+        info = part_info(part)
+        if info['attachment']:
+            continue
+        if info['type'] == 'text/plain':
+            return section, info
+        if info['type'] == 'text/html' and best is None:
+            best = section, info
+    return best
+
+
+def attachment_parts(structure):
+    """(section, info) of every part that is a file attachment"""
+    return [(section, info) for section, info in
+            ((section, part_info(part)) for section, part in structure_parts(structure))
+            if info['attachment']]
+
+
+def html_text(markup):
+    """Readable text of an HTML part, good enough for a preview pane"""
+    markup = re.sub(r'(?is)<(script|style)\b.*?</\1>', '', markup)
+    markup = re.sub(r'(?i)<br\s*/?>|</p>|</div>|</tr>', '\n', markup)
+    return html.unescape(re.sub(r'<[^>]+>', '', markup))
+
+
+def decode_part(data, encoding, charset=None):
+    """Bytes of a part with its transfer encoding undone, text if charset is given"""
+    if encoding == 'base64':
+        data = base64.b64decode(data)
+    elif encoding == 'quoted-printable':
+        data = quopri.decodestring(data)
+    if charset is None:
+        return data
+    try:
+        return data.decode(charset, 'replace')
+    except LookupError:
+        return data.decode('utf-8', 'replace')
+
+
+def imap_settings_for(server):
+    """(IMAP host, port) for an SMTP host, from SMTP_SERVERS or by name"""
+    host = (server or "").strip().lower()
+    for preset in SMTP_SERVERS.values():
+        if preset["server"] == host and preset.get("imap_server"):
+            return preset["imap_server"], preset.get("imap_port", 993)
+    if host.startswith("smtp."):
+        host = "imap." + host[len("smtp."):]
+    return host, 993
+
+
+def connect(server, port, account, password):
+    """Logged-in IMAP connection, implicit TLS on 993, STARTTLS otherwise"""
+    port = int(port)
+    if port == 993:
+        conn = imaplib.IMAP4_SSL(server, port)
+    else:
+        conn = imaplib.IMAP4(server, port)
+        conn.starttls()
+    conn.login(account, password)
+    return conn
+
+
+def refresh_capabilities(conn):
+    """conn's capabilities as a set, asked again since servers often
+    announce more once logged in"""
+    typ, data = conn.capability()
+    if typ == 'OK' and data and data[-1]:
+        conn.capabilities = tuple(data[-1].decode('ascii', 'replace').upper().split())
+    return set(conn.capabilities)
+
+
+class _ChunkDecoder(threading.Thread):
+    """Worker thread that turns raw FETCH data into cache rows"""
+
+    def __init__(self, cache, folder, total, progress=None):
+        super().__init__(daemon=True)
+        self.cache = cache
+        self.folder = folder
+        self.total = total
+        self.progress = progress
+        self.done = 0
+        self.error = None
+        self._queue = queue.Queue(maxsize=PIPELINE_DEPTH)
+
+    def run(self):
+        while True:
+            data = self._queue.get()
+            if data is None:
+                return
+            if self.error is not None:
+                continue
+            try:
+                rows = [message_row(message) for message in parse_fetch(data)
+                        if 'UID' in message]
+                self.cache.add_messages(self.folder, rows)
+                self.done += len(rows)
+                if self.progress:
+                    self.progress(self.done, self.total)
+            except Exception as e:
+                self.error = e
+
+    def put(self, data):
+        if self.error is not None:
+            raise ImapSyncError(f"couldn't decode messages: {self.error}") from self.error
+        self._queue.put(data)
+
+    def finish(self):
+        """Wait until every chunk is stored"""
+        self._queue.put(None)
+        self.join()
+        if self.error is not None:
+            raise ImapSyncError(f"couldn't decode messages: {self.error}") from self.error
+
+
+class ImapSync:
+    """Brings MailCache folders up to date over one IMAP connection
+
+    The first sync of a folder fetches everything. After that only UIDs
+    above the cached highest UID are fetched. Flag changes come from
+    CHANGEDSINCE and expunges from VANISHED when the server supports
+    CONDSTORE/QRESYNC, and an unchanged HIGHESTMODSEQ skips the folder
+    entirely. Without them every flag is re-read and expunges are found
+    by comparing message counts. A changed UIDVALIDITY drops the cached
+    folder.
+
+    New messages are fetched headers-first (NEW_MESSAGE_ITEMS), body parts
+    are downloaded by fetch_part()/open_message() and kept in the cache.
+    The connection is used by one call at a time.
+    """
+
+    def __init__(self, conn, cache):
+        self.conn = conn
+        self.cache = cache
+        self.selected = None
+        self._lock = threading.RLock()
+        capabilities = refresh_capabilities(conn)
+        self.qresync = 'QRESYNC' in capabilities
+        self.condstore = self.qresync or 'CONDSTORE' in capabilities
+        if 'ENABLE' in capabilities and self.condstore:
+            try:
+                conn.enable('QRESYNC' if self.qresync else 'CONDSTORE')
+            except imaplib.IMAP4.error:
+                self.qresync = False
+
+    def _command(self, *args):
+        typ, data = self.conn.uid(*args)
+        if typ != 'OK':
+            raise ImapSyncError(f"UID {args[0]} failed: {data}")
+        return data
+
+    def _select(self, folder):
+        """EXAMINE the folder, returns (exists, uidvalidity, highestmodseq)"""
+        self.selected = None
+        typ, data = self.conn.select(quote_mailbox(folder), readonly=True)
+        if typ != 'OK':
+            raise ImapSyncError(f"can't open {folder}: {data}")
+        self.selected = folder
+        responses = self.conn.untagged_responses
+        uidvalidity = int(responses['UIDVALIDITY'][-1])
+        modseq = responses.get('HIGHESTMODSEQ')
+        modseq = int(modseq[-1]) if modseq and 'NOMODSEQ' not in responses else 0
+        return int(data[-1] or 0), uidvalidity, modseq
+
+    def sync_folder(self, folder, progress=None):
+        """Fetch what changed since the last sync, returns a SyncResult
+
+        progress(done, total) is called while new messages are fetched,
+        from a worker thread.
+        """
+        with self._lock:
+            return self._sync_folder(folder, progress)
+
+    def _sync_folder(self, folder, progress):
+        exists, uidvalidity, modseq = self._select(folder)
+        state = self.cache.folder_state(folder)
+        if state is None or state.uidvalidity != uidvalidity:
+            state = self.cache.reset_folder(folder, uidvalidity)
+        elif state.highest_modseq and state.highest_modseq == modseq:
+            return SyncResult(folder, 0, 0, 0)   # nothing happened since last time
+
+        changed = removed = 0
+        if state.highest_uid:
+            changed, removed = self._sync_known(folder, state)
+        highest, new = self._fetch_new(folder, state.highest_uid, progress)
+        if not self.qresync and self.cache.count(folder) != exists:
+            removed += self._remove_expunged(folder)
+        self.cache.set_folder_state(folder, highest, modseq)
+        return SyncResult(folder, new, changed, removed)
+
+    def _sync_known(self, folder, state):
+        """Refresh flags of cached messages and drop vanished ones"""
+        known = f"1:{state.highest_uid}"
+        if self.condstore and state.highest_modseq:
+            modifier = f"(CHANGEDSINCE {state.highest_modseq}{' VANISHED' if self.qresync else ''})"
+            data = self._command('FETCH', known, '(UID FLAGS)', modifier)
+        else:
+            data = self._command('FETCH', known, '(UID FLAGS)')
+        changes = [(message['UID'], ' '.join(message.get('FLAGS', ())))
+                   for message in parse_fetch(data) if 'UID' in message]
+        changed = self.cache.update_flags(folder, changes)
+
+        removed = []
+        for line in self.conn.untagged_responses.pop('VANISHED', ()):
+            line = line.decode('ascii', 'replace') if isinstance(line, bytes) else str(line)
+            removed.extend(parse_uid_set(line.split()[-1]))
+        self.cache.remove_messages(folder, removed)
+        return changed, len(removed)
+
+    def _fetch_new(self, folder, highest_uid, progress=None):
+        """Fetch headers of every message above highest_uid, returns (new highest, count)
+
+        Chunks are pipelined: up to PIPELINE_DEPTH UID FETCH commands are on
+        the wire at once, and a worker thread decodes every finished chunk
+        into the cache while the next ones download. imaplib has no public
+        API for this, its _command()/_command_complete() pair is what its
+        own methods use to send a command and wait for its tagged reply.
+        """
+        data = self._command('SEARCH', f"UID {highest_uid + 1}:*")
+        # n:* always matches the last message, even when its UID is lower
+        uids = sorted(uid for uid in map(int, b' '.join(filter(None, data)).split())
+                      if uid > highest_uid)
+        decoder = _ChunkDecoder(self.cache, folder, len(uids), progress)
+        decoder.start()
+        pending = deque()
+        try:
+            for start in range(0, len(uids), FETCH_CHUNK):
+                chunk = uid_ranges(uids[start:start + FETCH_CHUNK])
+                pending.append(self.conn._command('UID', 'FETCH', chunk, NEW_MESSAGE_ITEMS))
+                if len(pending) >= PIPELINE_DEPTH:
+                    decoder.put(self._complete_fetch(pending.popleft()))
+            while pending:
+                decoder.put(self._complete_fetch(pending.popleft()))
+        finally:
+            decoder.finish()
+        return (uids[-1] if uids else highest_uid), len(uids)
+
+    def _complete_fetch(self, tag):
+        typ, data = self.conn._command_complete('UID', tag)
+        if typ != 'OK':
+            raise ImapSyncError(f"UID FETCH failed: {data}")
+        return self.conn.untagged_responses.pop('FETCH', [])
+
+    def _remove_expunged(self, folder):
+        """Without QRESYNC expunges are found by listing all UIDs"""
+        data = self._command('SEARCH', 'ALL')
+        on_server = set(map(int, b' '.join(filter(None, data)).split()))
+        gone = [uid for uid in self.cache.uids(folder) if uid not in on_server]
+        self.cache.remove_messages(folder, gone)
+        return len(gone)
+
+    def sync(self, folders=("INBOX",), progress=None):
+        return [self.sync_folder(folder, progress) for folder in folders]
+
+    def search(self, folder, criteria):
+        """UIDs the server finds for IMAP SEARCH criteria, e.g. ['BODY', '"budget"']"""
+        with self._lock:
+            if self.selected != folder:
+                self._select(folder)
+            data = self._command('SEARCH', *criteria)
+        return [int(uid) for line in data if line for uid in line.split()]
+
+    def fetch_part(self, folder, uid, section=''):
+        """Raw (still transfer-encoded) body part, downloaded on first use
+
+        section is an IMAP part number such as '1' or '2.1', '' is the
+        whole message.
+        """
+        data = self.cache.part(folder, uid, section)
+        if data is not None:
+            return data
+        with self._lock:
+            if self.selected != folder:
+                self._select(folder)
+            fetched = self._command('FETCH', str(uid), f'(UID BODY.PEEK[{section}])')
+        for message in parse_fetch(fetched):
+            if message.get('UID') == uid:
+                data = next((value for name, value in message.items()
+                             if name.startswith('BODY[')), None)
+        if data is None:
+            raise ImapSyncError(f"message {uid} is no longer in {folder}")
+        self.cache.save_part(folder, uid, section, data)
+        return data
+
+    def open_message(self, folder, uid):
+        """(cached row, body text, attachments) for showing a message
+
+        Only the text part is downloaded, attachments are listed as
+        (section, info) from the BODYSTRUCTURE and fetched on request.
+        Call from a worker thread, this may wait for the network.
+        """
+        row = self.cache.message(folder, uid)
+        if row is None:
+            raise ImapSyncError(f"message {uid} is not in the {folder} cache")
+        structure = json.loads(row['structure']) if row['structure'] else None
+        if not structure:
+            # No BODYSTRUCTURE stored, parse the whole message instead
+            message = email.message_from_bytes(self.fetch_part(folder, uid), policy=policy.default)
+            body = message.get_body(('plain', 'html'))
+            text = body.get_content() if body is not None else ''
+            if body is not None and body.get_content_subtype() == 'html':
+                text = html_text(text)
+            attachments = []
+        else:
+            found = text_section(structure)
+            text = ''
+            if found:
+                section, info = found
+                text = decode_part(self.fetch_part(folder, uid, section), info['encoding'],
+                                   info['charset'] or 'utf-8')
+                if info['type'] == 'text/html':
+                    text = html_text(text)
+            attachments = attachment_parts(structure)
+        # Downloaded text becomes searchable locally
+        self.cache.index_body(folder, uid, text)
+        return row, text, attachments
+
+    def fetch_attachment(self, folder, uid, section, encoding):
+        """Decoded bytes of one attachment part"""
+        return decode_part(self.fetch_part(folder, uid, section), encoding)
@@ -0,0 +1,194 @@
+"""
+PyBranch - Modern SMTP Email Client
+Copyright (C) 2025 Nagusame CS
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import itertools
+import os
+import smtplib
+import ssl
+import tempfile
+import threading
+import time
+
+from message_builder import build_message_file
+from smtp_pool import SMTPConnectionPool
+from smtp_sink import SMTPSink, SinkConfig
+from smtp_transport import send_message_file
+
+PHASES = ('connect', 'build', 'send', 'total')
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * len(sorted_values))) - 1))
+    return sorted_values[index]
+
+
+class LoadTestResult:
+    def __init__(self):
+        self.timings = {phase: [] for phase in PHASES}
+        self.sent = 0
+        self.failed = 0
+        self.refused = 0
+        self.bytes = 0
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, timings, size, ok, refused=0):
+        with self._lock:
+            self.refused += refused
+            for phase, value in timings.items():
+                self.timings[phase].append(value)
+            if ok:
+                self.sent += 1
+                self.bytes += size
+            else:
+                self.failed += 1
+
+    def report(self):
+        elapsed = self.elapsed or 1e-9
+        lines = [
+            f"messages: {self.sent} sent, {self.failed} failed, "
+            f"{self.refused} recipients refused in {self.elapsed:.2f}s",
+            f"throughput: {self.sent / elapsed:.1f} msg/s, {self.bytes / elapsed / 1024:.1f} KiB/s",
+            f"{'phase':<8} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}",
+        ]
+        for phase in PHASES:
+            values = sorted(self.timings[phase])
+            lines.append(
+                f"{phase:<8} {len(values):>6} "
+                f"{percentile(values, 0.50) * 1000:>9.2f} "
+                f"{percentile(values, 0.95) * 1000:>9.2f} "
+                f"{percentile(values, 0.99) * 1000:>9.2f}"
+            )
+        return "\n".join(lines)
+
+
+def run_load_test(host, port, account, password, messages=200, concurrency=4,
+                  recipients_per_message=1, attachment_size=0, reuse_sessions=True,
+                  ssl_context=None):
+    """Drive the real send path (pool, streaming builder, transport)
+
+    The connect phase is the pool handing out a session, which includes
+    connect, STARTTLS and AUTH whenever no warm session is available. With
+    reuse_sessions=False every message pays that handshake, as send_email()
+    did before sessions were pooled.
+    """
+    # Without --tls the local sink offers no STARTTLS, allow plain AUTH there
+    pool = SMTPConnectionPool(max_idle=concurrency, ssl_context=ssl_context,
+                              require_tls=ssl_context is not None)
+    result = LoadTestResult()
+    counter = itertools.count()
+    attachments = []
+    if attachment_size:
+        handle, attachment_path = tempfile.mkstemp(suffix=".bin", prefix="pybranch-load-")
+        with os.fdopen(handle, "wb") as f:
+            f.write(os.urandom(attachment_size))
+        attachments.append((attachment_path, None))
+
+    def worker():
+        while True:
+            index = next(counter)
+            if index >= messages:
+                return
+            to_addrs = [f"user{index}-{n}@example.com" for n in range(recipients_per_message)]
+            timings = {}
+            start = time.perf_counter()
+            message_file, size = build_message_file(
+                account, {'to': to_addrs}, f"Load test {index}",
+                f"<p>Message {index}</p>", attachments)
+            timings['build'] = time.perf_counter() - start
+            ok = False
+            refused = {}
+            try:
+                mark = time.perf_counter()
+                key, session = pool.acquire(host, port, account, password)
+                timings['connect'] = time.perf_counter() - mark
+                mark = time.perf_counter()
+                try:
+                    refused = send_message_file(session.smtp, account, to_addrs, message_file, size)
+                    ok = True
+                except smtplib.SMTPRecipientsRefused as e:
+                    refused = e.recipients
+                    pool.release(key, session)
+                except (smtplib.SMTPException, OSError):
+                    pool.release(key, session, broken=True)
+                else:
+                    pool.release(key, session, broken=not reuse_sessions)
+                timings['send'] = time.perf_counter() - mark
+            except (smtplib.SMTPException, OSError):
+                pass
+            finally:
+                message_file.close()
+            timings['total'] = time.perf_counter() - start
+            result.record(timings, size, ok, len(refused))
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.elapsed = time.perf_counter() - started
+    pool.close_all()
+    for attachment_path, _ in attachments:
+        os.remove(attachment_path)
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the PyBranch send path")
+    parser.add_argument("--host", help="target an external sink instead of starting one")
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--account", default="loadtest@example.com")
+    parser.add_argument("--password", default="secret")
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--recipients", type=int, default=1, help="recipients per message")
+    parser.add_argument("--attachment-size", type=int, default=0, help="bytes")
+    parser.add_argument("--no-reuse", action="store_true", help="new session per message")
+    parser.add_argument("--tls", action="store_true", help="STARTTLS with a self-signed cert")
+    parser.add_argument("--latency", type=float, default=0.0, help="in-process sink reply delay")
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--reject-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    sink = None
+    host, port = args.host, args.port
+    if host is None:
+        config = SinkConfig(latency=args.latency, throttle_rate=args.throttle_rate,
+                            reject_rate=args.reject_rate)
+        sink = SMTPSink(config=config, tls=args.tls).start()
+        host, port = "127.0.0.1", sink.port
+
+    # The sink's certificate is self-signed, so skip verification here only
+    ssl_context = ssl._create_unverified_context() if args.tls else None
+    result = run_load_test(host, port, args.account, args.password,
+                           messages=args.messages, concurrency=args.concurrency,
+                           recipients_per_message=args.recipients,
+                           attachment_size=args.attachment_size,
+                           reuse_sessions=not args.no_reuse, ssl_context=ssl_context)
+    print(result.report())
+    if sink:
+        sink.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+PyBranch - Modern SMTP Email Client
+Copyright (C) 2025 Nagusame CS
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+# Per-folder sync position: every UID up to highest_uid is in the cache,
+# highest_modseq is the server's HIGHESTMODSEQ at that point (0 without CONDSTORE)
+FolderState = namedtuple('FolderState', 'uidvalidity highest_uid highest_modseq')
+
+# List orders, each backed by an index on (folder, column)
+SORT_COLUMNS = {
+    'date': 'date',
+    'sender': 'sender COLLATE NOCASE',
+    'subject': 'subject COLLATE NOCASE',
+    'size': 'size',
+}
+LIST_COLUMNS = ('uid', 'flags', 'size', 'date', 'sender', 'subject')
+
+MESSAGE_COLUMNS = ('uid', 'flags', 'size', 'date', 'sender', 'recipients', 'subject',
+                   'message_id', 'structure')
+# Search hits ranked per query, newest first
+RANKED_HITS = 2000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS folders (
+    name TEXT PRIMARY KEY,
+    uidvalidity INTEGER NOT NULL,
+    highest_uid INTEGER NOT NULL DEFAULT 0,
+    highest_modseq INTEGER NOT NULL DEFAULT 0,
+    synced_at REAL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY,
+    folder TEXT NOT NULL,
+    uid INTEGER NOT NULL,
+    flags TEXT NOT NULL DEFAULT '',
+    size INTEGER NOT NULL DEFAULT 0,
+    date REAL NOT NULL DEFAULT 0,
+    sender TEXT NOT NULL DEFAULT '',
+    recipients TEXT NOT NULL DEFAULT '',
+    subject TEXT NOT NULL DEFAULT '',
+    message_id TEXT,
+    structure TEXT,
+    body_indexed INTEGER NOT NULL DEFAULT 0,
+    UNIQUE (folder, uid)
+);
+
+-- One index per SORT_COLUMNS order
+CREATE INDEX IF NOT EXISTS messages_by_date ON messages (folder, date);
+CREATE INDEX IF NOT EXISTS messages_by_sender ON messages (folder, sender COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS messages_by_subject ON messages (folder, subject COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS messages_by_size ON messages (folder, size);
+
+CREATE TABLE IF NOT EXISTS parts (
+    message INTEGER NOT NULL REFERENCES messages(id) ON DELETE CASCADE,
+    section TEXT NOT NULL,
+    data BLOB NOT NULL,
+    PRIMARY KEY (message, section)
+) WITHOUT ROWID;
+
+-- Full-text index, rowid = messages.id. Headers are kept in step by the
+-- triggers, the body column is filled once a message's text is downloaded.
+CREATE VIRTUAL TABLE IF NOT EXISTS message_text USING fts5(
+    subject, sender, recipients, body,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+
+INSERT INTO message_text (message_text, rank) VALUES ('rank', 'bm25(10.0, 5.0, 3.0, 1.0)');
+
+CREATE TRIGGER IF NOT EXISTS message_text_insert AFTER INSERT ON messages BEGIN
+    INSERT INTO message_text (rowid, subject, sender, recipients, body)
+    VALUES (new.id, new.subject, new.sender, new.recipients, '');
+END;
+
+CREATE TRIGGER IF NOT EXISTS message_text_update
+AFTER UPDATE OF subject, sender, recipients ON messages BEGIN
+    UPDATE message_text SET subject = new.subject, sender = new.sender,
+        recipients = new.recipients WHERE rowid = new.id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS message_text_delete AFTER DELETE ON messages BEGIN
+    DELETE FROM message_text WHERE rowid = old.id;
+END;
+"""
+
+
+def cache_path(account, directory="mail"):
+    """Cache file for one account, e.g. mail/me@example.com.db"""
+    name = re.sub(r'[^a-zA-Z0-9@._+-]', '_', account.strip().lower())
+    return os.path.join(directory, f"{name}.db")
+
+
+class MailCache:
+    """Local SQLite copy of message headers and flags, per folder
+
+    Messages are keyed by (folder, uid). The folders table remembers each
+    folder's UIDVALIDITY and how far it has been synced, which is all the
+    sync engine needs to ask the server for changes only. Only headers
+    and the BODYSTRUCTURE (as JSON) are stored up front, body parts land
+    in the parts table once a message is opened. Headers and downloaded
+    body text are searchable through an FTS5 index. Safe to share between
+    the Tk thread and sync threads.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA foreign_keys=ON")
+        self._db.executescript(_SCHEMA)
+        self._db.commit()
+        self._lock = threading.RLock()
+
+    def folder_state(self, folder):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT uidvalidity, highest_uid, highest_modseq FROM folders WHERE name = ?",
+                (folder,)).fetchone()
+        return FolderState(*row) if row else None
+
+    def reset_folder(self, folder, uidvalidity):
+        """Forget a folder's messages, e.g. after its UIDVALIDITY changed"""
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM messages WHERE folder = ?", (folder,))
+            self._db.execute(
+                "INSERT OR REPLACE INTO folders (name, uidvalidity) VALUES (?, ?)",
+                (folder, uidvalidity))
+        return FolderState(uidvalidity, 0, 0)
+
+    def set_folder_state(self, folder, highest_uid, highest_modseq):
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE folders SET highest_uid = ?, highest_modseq = ?, synced_at = ? "
+                "WHERE name = ?",
+                (highest_uid, highest_modseq, time.time(), folder))
+
+    def add_messages(self, folder, messages):
+        """Insert or refresh messages given as dicts with MESSAGE_COLUMNS keys"""
+        rows = [(folder,) + tuple(message.get(column) for column in MESSAGE_COLUMNS)
+                for message in messages]
+        if not rows:
+            return
+        columns = ", ".join(MESSAGE_COLUMNS)
+        updates = ", ".join(f"{column} = excluded.{column}" for column in MESSAGE_COLUMNS[1:])
+        with self._lock, self._db:
+            self._db.executemany(
+                f"INSERT INTO messages (folder, {columns}) "
+                f"VALUES (?{', ?' * len(MESSAGE_COLUMNS)}) "
+                f"ON CONFLICT(folder, uid) DO UPDATE SET {updates}",
+                rows)
+
+    def update_flags(self, folder, changes):
+        """Apply (uid, flags) pairs to cached messages, returns how many changed"""
+        with self._lock, self._db:
+            return self._db.executemany(
+                "UPDATE messages SET flags = ? WHERE folder = ? AND uid = ? AND flags != ?",
+                [(flags, folder, uid, flags) for uid, flags in changes]).rowcount
+
+    def remove_messages(self, folder, uids):
+        with self._lock, self._db:
+            self._db.executemany(
+                "DELETE FROM messages WHERE folder = ? AND uid = ?",
+                [(folder, uid) for uid in uids])
+
+    def message(self, folder, uid):
+        """Cached columns of one message as a dict, None if unknown"""
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT id, {', '.join(MESSAGE_COLUMNS)} FROM messages "
+                "WHERE folder = ? AND uid = ?", (folder, uid)).fetchone()
+        return dict(zip(('id',) + MESSAGE_COLUMNS, row)) if row else None
+
+    def part(self, folder, uid, section):
+        """Downloaded body part (bytes) or None"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data FROM parts JOIN messages ON parts.message = messages.id "
+                "WHERE folder = ? AND uid = ? AND section = ?", (folder, uid, section)).fetchone()
+        return row[0] if row else None
+
+    def save_part(self, folder, uid, section, data):
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO parts (message, section, data) "
+                "SELECT id, ?, ? FROM messages WHERE folder = ? AND uid = ?",
+                (section, data, folder, uid))
+
+    def page(self, folder, offset, limit, order='date', descending=True):
+        """LIMIT/OFFSET window of the message list as LIST_COLUMNS tuples
+
+        Rows come straight off the sort index (the rowid breaks ties), so
+        no list of the whole folder is ever built.
+        """
+        direction = "DESC" if descending else "ASC"
+        with self._lock:
+            return self._db.execute(
+                f"SELECT {', '.join(LIST_COLUMNS)} FROM messages WHERE folder = ? "
+                f"ORDER BY {SORT_COLUMNS[order]} {direction}, id {direction} "
+                "LIMIT ? OFFSET ?", (folder, limit, offset)).fetchall()
+
+    def index_body(self, folder, uid, text):
+        """Make a message's downloaded text searchable"""
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT id FROM messages WHERE folder = ? AND uid = ?", (folder, uid)).fetchone()
+            if row:
+                self._db.execute("UPDATE message_text SET body = ? WHERE rowid = ?", (text, row[0]))
+                self._db.execute("UPDATE messages SET body_indexed = 1 WHERE id = ?", (row[0],))
+
+    def search(self, folder, match, limit=200):
+        """Best matches in a folder for an FTS5 MATCH expression, as LIST_COLUMNS tuples
+
+        Ranking has to score every hit, so only the newest RANKED_HITS
+        hits are ranked: a broad term like a two letter prefix stays
+        fast and still shows recent mail first.
+        """
+        columns = ", ".join(f"m.{column}" for column in LIST_COLUMNS)
+        with self._lock:
+            oldest = self._db.execute(
+                "SELECT t.rowid FROM message_text AS t JOIN messages AS m ON m.id = t.rowid "
+                "WHERE message_text MATCH ? AND m.folder = ? ORDER BY t.rowid DESC LIMIT 1 OFFSET ?",
+                (match, folder, RANKED_HITS - 1)).fetchone()
+            return self._db.execute(
+                f"SELECT {columns} FROM (SELECT rowid, rank FROM message_text "
+                "WHERE message_text MATCH ? AND rowid >= ?) AS hit "
+                "JOIN messages AS m ON m.id = hit.rowid WHERE m.folder = ? "
+                "ORDER BY hit.rank LIMIT ?",
+                (match, oldest[0] if oldest else 0, folder, limit)).fetchall()
+
+    def without_body(self, folder, uids):
+        """The given UIDs whose body text isn't in the search index yet"""
+        found = []
+        uids = list(uids)
+        with self._lock:
+            for start in range(0, len(uids), 500):
+                chunk = uids[start:start + 500]
+                found.extend(uid for uid, in self._db.execute(
+                    f"SELECT uid FROM messages WHERE folder = ? AND body_indexed = 0 "
+                    f"AND uid IN ({','.join('?' * len(chunk))})", [folder] + chunk))
+        return found
+
+    def rows(self, folder, uids):
+        """LIST_COLUMNS tuples for the given UIDs, newest first"""
+        rows = []
+        uids = list(uids)
+        with self._lock:
+            for start in range(0, len(uids), 500):
+                chunk = uids[start:start + 500]
+                rows.extend(self._db.execute(
+                    f"SELECT {', '.join(LIST_COLUMNS)} FROM messages WHERE folder = ? "
+                    f"AND uid IN ({','.join('?' * len(chunk))})", [folder] + chunk))
+        rows.sort(key=lambda row: row[3], reverse=True)
+        return rows
+
+    def count(self, folder):
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM messages WHERE folder = ?", (folder,)).fetchone()[0]
+
+    def uids(self, folder):
+        """Every cached UID of a folder, ascending"""
+        with self._lock:
+            return [uid for uid, in self._db.execute(
+                "SELECT uid FROM messages WHERE folder = ? ORDER BY uid", (folder,))]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
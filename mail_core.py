@@ -0,0 +1,222 @@
+"""
+PyBranch - Modern SMTP Email Client
+Copyright (C) 2025 Nagusame CS
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Message building and sending without any GUI imports, shared by the
+# Tk client (main.py) and the headless batch mode (batch_send.py)
+
+import re
+import threading
+
+from message_builder import (build_message_file, envelope_recipients, inline_content_id,
+                             unique_attachments)
+from delivery import deliver
+from envelope_planner import max_recipients_for
+
+EMAIL_PATTERN = re.compile(r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$')
+TOKEN_PATTERN = re.compile(r'[^,]+')
+DESIGNATION_PATTERN = re.compile(r'\{(cc|bcc)\}\{(.*?)\}', re.IGNORECASE)
+# Every kind of body markup in one pattern, alternatives in the order the
+# separate passes used to run so overlapping markup resolves the same way
+MARKUP_PATTERN = re.compile(
+    r'\{link\}\{(?P<text>.*?)\}\{(?P<href>.*?)\}'
+    r'|\{link\}\{(?P<link>.*?)\}'
+    r'|\{img\}\{(?P<img>.*?)\}'
+    r'|\{embed\}\{(?P<embed>.*?)\}'
+    r'|\{attach\}\{(?P<attach>.*?)\}'
+)
+URL_PATTERN = re.compile(r'(https?://\S+)')
+# Compiled bodies kept by process_message_body()
+BODY_CACHE_SIZE = 64
+
+
+def is_valid_email(email):
+    """Simple regex-based email validation"""
+    return EMAIL_PATTERN.match(email) is not None
+
+
+def classify_recipient(part):
+    """(field, address) for one comma-separated part of the To field"""
+    # One search finds either designation, plain addresses skip the regex
+    match = DESIGNATION_PATTERN.search(part) if '{' in part else None
+    if match:
+        return match.group(1).lower(), match.group(2).strip()
+    return 'to', part
+
+
+class RecipientTokenizer:
+    """Parses the To field, remembering every part it has seen
+
+    Parts are looked up by their raw text, so after an edit only the parts
+    that actually changed are classified and validated again. Meant to be
+    reused for the same field across keystrokes.
+    """
+
+    def __init__(self):
+        self._tokens = {}    # raw part -> (field, address, valid)
+
+    def tokenize(self, recipient_string):
+        """List of (field, address, valid) for every non-empty part"""
+        tokens = []
+        cache = self._tokens
+        for match in TOKEN_PATTERN.finditer(recipient_string):
+            raw = match.group()
+            token = cache.get(raw)
+            if token is None:
+                part = raw.strip()
+                if not part:
+                    continue
+                field, address = classify_recipient(part)
+                token = cache[raw] = (field, address, is_valid_email(address))
+            tokens.append(token)
+        # Forget parts that were edited away once the cache gets large
+        if len(cache) > 2 * len(tokens) + 1024:
+            self._tokens = {raw: cache[raw] for raw in
+                            (m.group() for m in TOKEN_PATTERN.finditer(recipient_string))
+                            if raw in cache}
+        return tokens
+
+    def parse(self, recipient_string):
+        recipients = {'to': [], 'cc': [], 'bcc': []}
+        for field, address, _ in self.tokenize(recipient_string):
+            recipients[field].append(address)
+        return recipients
+
+    def invalid(self, recipient_string):
+        """Addresses that fail validation, in field order"""
+        return [address for _, address, valid in self.tokenize(recipient_string) if not valid]
+
+
+def parse_recipients(recipient_string):
+    """Parse recipient string into to, cc, and bcc lists"""
+    return RecipientTokenizer().parse(recipient_string)
+
+
+def convert_links(text):
+    """Convert URLs in text to clickable links"""
+    return URL_PATTERN.sub(r'<a href="\1">\1</a>', text)
+
+
+def embed_image(img_path, attachments):
+    """Register img_path as an inline part and return its <img> tag"""
+    try:
+        # Same contents always map to the same Content-ID, so repeated
+        # {img} references collapse into a single inline part
+        content_id = inline_content_id(img_path)
+    except OSError:
+        return f'[Image: {img_path}]'
+    if (img_path, content_id) not in attachments:
+        attachments.append((img_path, content_id))
+    return f'<img src="cid:{content_id}" alt="{img_path.split("/")[-1]}">'
+
+
+class CompiledBody:
+    """Message body markup parsed once into static HTML and image slots
+
+    parts holds ready-made HTML strings, with one (path,) tuple wherever an
+    {img} needs its Content-ID looked up and registered at render time.
+    Bare URLs are only linked in plain text, never inside {link} markup,
+    so a {link} to a URL isn't wrapped twice.
+    """
+
+    def __init__(self, text):
+        parts = []
+        static = []
+        position = 0
+        for match in MARKUP_PATTERN.finditer(text):
+            static.append(convert_links(text[position:match.start()]))
+            position = match.end()
+            kind = match.lastgroup
+            value = match.group(kind)
+            if kind == 'href':
+                static.append(f'<a href="{value}">{match.group("text")}</a>')
+            elif kind == 'link':
+                static.append(f'<a href="{value}">{value}</a>')
+            elif kind == 'embed':
+                static.append(f'[Embedded Attachment: {value}]')
+            elif kind == 'attach':
+                static.append(f'[Attachment: {value}]')
+            else:
+                parts.append(''.join(static))
+                parts.append((value,))
+                static = []
+        static.append(convert_links(text[position:]))
+        parts.append(''.join(static))
+        self.parts = [part for part in parts if part]
+
+    def render(self, attachments):
+        """HTML for the body, inline images are appended to attachments"""
+        images = {}     # each image file is looked up once per render
+        out = []
+        for part in self.parts:
+            if isinstance(part, str):
+                out.append(part)
+            else:
+                tag = images.get(part[0])
+                if tag is None:
+                    tag = images[part[0]] = embed_image(part[0], attachments)
+                out.append(tag)
+        return ''.join(out)
+
+
+_body_cache = {}
+_body_cache_lock = threading.Lock()
+
+
+def compile_body(text):
+    """CompiledBody for text, cached by the source text's hash"""
+    with _body_cache_lock:
+        compiled = _body_cache.pop(text, None)
+        if compiled is None:
+            compiled = CompiledBody(text)
+            if len(_body_cache) >= BODY_CACHE_SIZE:
+                del _body_cache[next(iter(_body_cache))]
+        # Re-inserted last, the dict doubles as an LRU list
+        _body_cache[text] = compiled
+    return compiled
+
+
+def process_message_body(text, attachments):
+    """Process the message body to handle links, images, and attachments"""
+    return compile_body(text).render(attachments)
+
+
+def send_message(pool, server, port, account, password, recipients, subject, html,
+                 attachments=(), report=None, envelope=None, image_optimizer=None,
+                 max_recipients=None):
+    """Build the message once and deliver it through pool, returns a DeliveryReport
+
+    envelope limits delivery to the given addresses (e.g. recipients still
+    deferred from an earlier attempt), by default everyone in recipients
+    gets it. image_optimizer, when given, shrinks inline images first.
+    """
+    attachments = unique_attachments(attachments)
+    if image_optimizer:
+        attachments = image_optimizer.optimize_attachments(attachments)
+
+    # Attachments are encoded in chunks into a spooled file, not in memory
+    message_file, size = build_message_file(account, recipients, subject, html, attachments)
+    port = int(port)
+
+    def send_attempt(addresses):
+        return pool.send_file(server, port, account, password, message_file, size,
+                              from_addr=account, to_addrs=addresses)
+
+    with message_file:
+        return deliver(send_attempt,
+                       envelope if envelope is not None else envelope_recipients(recipients),
+                       report, max_recipients=max_recipients or max_recipients_for(server))
@@ -0,0 +1,300 @@
+"""
+PyBranch - Modern SMTP Email Client
+Copyright (C) 2025 Nagusame CS
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import csv
+import functools
+import html
+import json
+import queue
+import re
+import smtplib
+import threading
+import time
+
+from message_builder import build_message_file, envelope_recipients
+from delivery import deliver
+from envelope_planner import max_recipients_for
+
+# Merge fields use double braces so they never clash with {link}/{img} markup
+FIELD_PATTERN = re.compile(r'\{\{\s*([\w.-]+)\s*\}\}')
+DESIGNATION_PATTERN = re.compile(r'^\{(cc|bcc)\}\{(.*?)\}$', re.IGNORECASE)
+EMAIL_COLUMNS = ('email', 'e-mail', 'address', 'recipient')
+
+_CHUNK_SIZE = 64 * 1024
+_JSON_SPACE = ' \t\r\n'
+_DONE = object()
+
+
+@functools.lru_cache(maxsize=64)
+def compile_fields(template):
+    """Split a template once into (static texts, field names) around {{field}}s"""
+    pieces = FIELD_PATTERN.split(template)
+    return tuple(pieces[0::2]), tuple(pieces[1::2])
+
+
+def render(template, row, escape=False):
+    """Fill {{field}} placeholders from row, unknown fields render empty"""
+    static, fields = compile_fields(template)
+    out = [static[0]]
+    for name, text in zip(fields, static[1:]):
+        value = str(row.get(name, ''))
+        out.append(html.escape(value) if escape else value)
+        out.append(text)
+    return ''.join(out)
+
+
+def _row_from_entry(entry):
+    """Normalize a JSON entry (plain string or object) into a row dict"""
+    if isinstance(entry, dict):
+        return {str(k).strip().lower(): v for k, v in entry.items()}
+    return {'email': str(entry)}
+
+
+def _iter_json_array(file):
+    """Yield items of a recipient array in file without loading it whole
+
+    The file holds a bare [ ... ] or a {"recipients": [ ... ]} table, the
+    other members of the table are decoded and dropped on the way.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    eof = False
+
+    def fill():
+        nonlocal buffer, eof
+        chunk = file.read(_CHUNK_SIZE)
+        if not chunk:
+            eof = True
+        buffer += chunk
+
+    def skip(chars):
+        """Drop leading chars, returns the next character or '' at the end"""
+        nonlocal buffer
+        while True:
+            buffer = buffer.lstrip(chars)
+            if buffer or eof:
+                return buffer[:1]
+            fill()
+
+    def decode():
+        """Decode the value at the start of buffer and move past it"""
+        nonlocal buffer
+        skip(_JSON_SPACE)
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer)
+            except ValueError:
+                if eof:
+                    raise
+                fill()
+                continue
+            # A number cut off by the chunk boundary decodes too short
+            if end == len(buffer) and not eof:
+                fill()
+                continue
+            buffer = buffer[end:]
+            return value
+
+    first = skip(_JSON_SPACE)
+    if first == '{':
+        buffer = buffer[1:]
+        while True:
+            if skip(_JSON_SPACE + ',') in ('}', ''):
+                return
+            key = decode()
+            if skip(_JSON_SPACE) != ':':
+                raise ValueError(f"expected ':' after {key!r}")
+            buffer = buffer[1:]
+            if key == 'recipients' and skip(_JSON_SPACE) == '[':
+                break
+            decode()
+    elif first != '[':
+        return
+    buffer = buffer[1:]
+
+    while skip(_JSON_SPACE + ',') not in (']', ''):
+        yield decode()
+
+
+def iter_recipient_rows(file_path):
+    """Stream recipient rows from a CSV, JSON or JSON-lines table"""
+    lower = file_path.lower()
+    with open(file_path, 'r', newline='', encoding='utf-8') as file:
+        if lower.endswith('.csv'):
+            reader = csv.reader(file)
+            header = next(reader, None)
+            if header is None:
+                return
+            columns = [c.strip().lower() for c in header]
+            if not any(c in EMAIL_COLUMNS for c in columns):
+                # Header-less CSV, first column is the address
+                yield {'email': header[0].strip()}
+                columns = ['email'] + columns[1:]
+            for values in reader:
+                if values:
+                    yield dict(zip(columns, (v.strip() for v in values)))
+        elif lower.endswith('.jsonl'):
+            for line in file:
+                if line.strip():
+                    yield _row_from_entry(json.loads(line))
+        elif lower.endswith('.json'):
+            for entry in _iter_json_array(file):
+                yield _row_from_entry(entry)
+        else:
+            for line in file:
+                for address in line.split(','):
+                    if address.strip():
+                        yield {'email': address.strip()}
+
+
+def row_recipients(row):
+    """Build a to/cc/bcc dict for one row, honouring {cc}/{bcc} designations"""
+    address = next((str(row[c]).strip() for c in EMAIL_COLUMNS if row.get(c)), '')
+    recipients = {'to': [], 'cc': [], 'bcc': []}
+    match = DESIGNATION_PATTERN.match(address)
+    if match:
+        recipients[match.group(1).lower()].append(match.group(2).strip())
+    elif address:
+        recipients['to'].append(address)
+    for field in ('cc', 'bcc'):
+        if row.get(field):
+            recipients[field].extend(a.strip() for a in str(row[field]).split(';') if a.strip())
+    return recipients
+
+
+class MergeStats:
+    """Running totals for a campaign, safe to read from another thread"""
+    def __init__(self):
+        self.sent = 0
+        self.failed = 0
+        self.rejected = 0
+        self.deferred = 0
+        self.errors = []
+        self.started = time.monotonic()
+        self.finished = None
+        self._lock = threading.Lock()
+
+    def record(self, ok, error=None, report=None):
+        with self._lock:
+            if report is not None:
+                self.rejected += len(report.rejected)
+                self.deferred += len(report.deferred)
+            if ok:
+                self.sent += 1
+            else:
+                self.failed += 1
+                if len(self.errors) < 100:  # keep memory flat on big failures
+                    self.errors.append(error)
+
+    @property
+    def elapsed(self):
+        return (self.finished or time.monotonic()) - self.started
+
+    @property
+    def messages_per_second(self):
+        elapsed = self.elapsed
+        return self.sent / elapsed if elapsed > 0 else 0.0
+
+    def summary(self):
+        return (f"Sent {self.sent}, failed {self.failed} in {self.elapsed:.1f}s "
+                f"({self.messages_per_second:.1f} msg/s), "
+                f"{self.rejected} recipients rejected, {self.deferred} deferred")
+
+
+class MailMerge:
+    """Sends one personalized message per recipient row over pooled sessions"""
+
+    def __init__(self, pool, server, port, account, password,
+                 subject_template, body_template, attachments=(), sessions=2):
+        self.pool = pool
+        self.server = server
+        self.port = int(port)
+        self.account = account
+        self.password = password
+        self.subject_template = subject_template
+        self.body_template = body_template      # already processed HTML
+        self.attachments = list(attachments)
+        self.sessions = max(1, sessions)
+        self._cancel = threading.Event()
+
+    def build(self, row):
+        """Render one row, returns (message_file, size, envelope recipients)"""
+        recipients = row_recipients(row)
+        message_file, size = build_message_file(
+            self.account,
+            recipients,
+            render(self.subject_template, row),
+            render(self.body_template, row, escape=True),
+            self.attachments
+        )
+        return message_file, size, envelope_recipients(recipients)
+
+    def cancel(self):
+        self._cancel.set()
+
+    def run(self, rows, progress=None):
+        """Send every row, calling progress(stats) after each message"""
+        stats = MergeStats()
+        # Bounded so a huge table is never materialized in memory
+        jobs = queue.Queue(maxsize=self.sessions * 4)
+        workers = [
+            threading.Thread(target=self._worker, args=(jobs, stats, progress), daemon=True)
+            for _ in range(self.sessions)
+        ]
+        for worker in workers:
+            worker.start()
+        try:
+            for row in rows:
+                if self._cancel.is_set():
+                    break
+                jobs.put(row)
+        finally:
+            for _ in workers:
+                jobs.put(_DONE)
+            for worker in workers:
+                worker.join()
+            stats.finished = time.monotonic()
+        return stats
+
+    def _worker(self, jobs, stats, progress):
+        while True:
+            row = jobs.get()
+            if row is _DONE:
+                return
+            if self._cancel.is_set():
+                continue
+            try:
+                message_file, size, to_addrs = self.build(row)
+                with message_file:
+                    if not to_addrs:
+                        raise ValueError(f"No address in row {row}")
+
+                    def send_attempt(addresses):
+                        return self.pool.send_file(self.server, self.port, self.account,
+                                                   self.password, message_file, size,
+                                                   from_addr=self.account, to_addrs=addresses)
+
+                    report = deliver(send_attempt, to_addrs,
+                                     max_recipients=max_recipients_for(self.server))
+                stats.record(bool(report.delivered),
+                             error=None if report.ok else f"{to_addrs[0]}: {report.summary()}",
+                             report=report)
+            except (smtplib.SMTPException, OSError, ValueError) as e:
+                stats.record(False, error=f"{row.get('email', '?')}: {e}")
+            if progress:
+                progress(stats)
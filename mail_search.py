@@ -0,0 +1,116 @@
+"""
+PyBranch - Modern SMTP Email Client
+Copyright (C) 2025 Nagusame CS
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Search over a MailCache: queries like  from:alice subject:"q3 report" budget
+# run against the local FTS5 index, terms that may be in a body that hasn't
+# been downloaded yet are also sent to the server as IMAP SEARCH
+
+import re
+
+# Field filters and the index column they search
+FIELDS = {
+    'from': 'sender',
+    'to': 'recipients',
+    'cc': 'recipients',
+    'subject': 'subject',
+    'body': 'body',
+}
+# IMAP SEARCH keys for the same columns, plain terms use TEXT
+SERVER_KEYS = {
+    'sender': 'FROM',
+    'recipients': 'TO',
+    'subject': 'SUBJECT',
+    'body': 'BODY',
+    None: 'TEXT',
+}
+# Matches shown per search
+SEARCH_LIMIT = 200
+
+TERM_PATTERN = re.compile(r'(?:([A-Za-z]+):)?(?:"([^"]*)"?|(\S+))')
+
+
+def parse_query(query):
+    """(column or None, text, quoted) for every term of a search query"""
+    terms = []
+    for match in TERM_PATTERN.finditer(query):
+        field, quoted, word = match.groups()
+        column = FIELDS.get(field.lower()) if field else None
+        text = quoted if quoted is not None else word
+        if field and column is None:
+            text = f"{field}:{text}"    # not a filter, e.g. a time like 10:30
+        if re.search(r'\w', text):
+            terms.append((column, text, quoted is not None))
+    return terms
+
+
+def fts_query(terms, prefix_last=True):
+    """FTS5 MATCH expression, the last bare word also matches as a prefix
+
+    Single characters aren't used as prefixes, the index only keeps two
+    and three character ones.
+    """
+    parts = []
+    for index, (column, text, quoted) in enumerate(terms):
+        phrase = '"' + text.replace('"', '""') + '"'
+        if prefix_last and not quoted and index == len(terms) - 1 and len(text) > 1:
+            phrase += ' *'
+        parts.append(f"{column} : {phrase}" if column else phrase)
+    return " AND ".join(parts)
+
+
+def _imap_string(text):
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def server_criteria(terms):
+    """IMAP SEARCH criteria for terms, None if the server can't help
+
+    Only plain and body: terms can match text the local index hasn't seen.
+    Non-ASCII terms are left to the local index, imaplib sends commands
+    as ASCII.
+    """
+    if not any(column in (None, 'body') for column, _, _ in terms):
+        return None
+    criteria = []
+    for column, text, _ in terms:
+        if not text.isascii():
+            return None
+        criteria += [SERVER_KEYS[column], _imap_string(text)]
+    return criteria
+
+
+def search_local(cache, folder, query, limit=SEARCH_LIMIT):
+    """Ranked matches from the local index as MailCache.LIST_COLUMNS rows"""
+    terms = parse_query(query)
+    if not terms:
+        return []
+    return cache.search(folder, fts_query(terms), limit)
+
+
+def search_server(sync, cache, folder, query, limit=SEARCH_LIMIT):
+    """Rows of server SEARCH matches whose body text isn't indexed locally
+
+    Messages with a downloaded body were already judged by the local index,
+    so only the rest are taken from the server's answer, newest first.
+    Runs a network round trip, call from a worker thread.
+    """
+    criteria = server_criteria(parse_query(query))
+    if criteria is None:
+        return []
+    uids = cache.without_body(folder, sync.search(folder, criteria))
+    return cache.rows(folder, sorted(uids)[-limit:])
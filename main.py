@@ -18,24 +18,32 @@ along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 import tkinter as tk
 from tkinter import ttk, messagebox
-import json
-import smtplib
 import os  # Add missing import
-from credentials_manager import CredentialsManager
+from account_store import open_account_store
 from smtp_presets import SMTP_SERVERS
+from smtp_pool import SMTPConnectionPool
+from mail_merge import MailMerge, iter_recipient_rows
+from recipient_import import RecipientTable, import_recipients
+from address_book import AddressBook
+from mail_cache import MailCache, cache_path
+import imap_sync
+from outbox import Outbox
+from message_builder import unique_attachments
+from image_optimizer import ImageOptimizer
+import mail_core
+import threading
+import queue
 from styles import COLORS, PADDING, FONTS, STYLES, INFO_ICON, TOOLTIPS, TOOLTIP_STYLE
 import math
 from datetime import datetime
 from splash_screen import SplashScreen
+from ui.syntax_highlighter import SyntaxHighlighter
+from ui.preview_window import PreviewWindow
+from ui.inbox_frame import InboxFrame
 import re
-from email.mime.text import MIMEText
-from email.mime.multipart import MIMEMultipart
 from tkinter import filedialog
-from email.mime.base import MIMEBase
-from email import encoders
 from tkinterdnd2 import TkinterDnD, DND_FILES
 from PIL import Image, ImageTk
-import base64
 import imaplib
 import email
 from email.header import decode_header
@@ -130,6 +138,12 @@ class EmailClient(TkinterDnD.Tk):
         self.bind('<Escape>', lambda e: self.iconify())
         
         self.valid_email_icon = tk.StringVar(value="X")
+        self.recipient_tokenizer = mail_core.RecipientTokenizer()
+        self._validate_after_id = None
+        # Imported recipient lists live here, not in the To entry
+        self.recipient_table = RecipientTable()
+        self.import_status = tk.StringVar(value="")
+        self._import_cancel = None
         self.attachments = []
         self.link_tooltip_text = (
             "To create a hyperlink, use the format:\n"
@@ -144,11 +158,31 @@ class EmailClient(TkinterDnD.Tk):
             "{attach}{relevant info}"
         )
         self.attachment_menu = None
+        self.smtp_pool = SMTPConnectionPool()  # Shared by login() and send_email()
+        self.image_optimizer = ImageOptimizer()
+        self.optimize_images = tk.BooleanVar(value=False)  # opt-in, it recompresses images
+        # Contacts for To field completion, loaded off the Tk thread
+        self.address_book = AddressBook()
+        self.autocomplete_popup = None
+        self._autocomplete_after_id = None
+        threading.Thread(target=self._load_address_book, daemon=True).start()
         self.protocol("WM_DELETE_WINDOW", self.on_closing)  # Add proper cleanup on exit
 
     def _finish_loading(self):
         # Initialize the rest of the application
-        self.creds_manager = CredentialsManager()
+        # One encrypted record per account, the old credentials.enc is imported once
+        self.creds_manager = open_account_store()
+        # Sending happens on the outbox worker, results come back through a queue
+        self.outbox_results = queue.Queue()
+        self.delivery_reports = {}  # job id -> latest DeliveryReport
+        self.outbox = Outbox(
+            self.smtp_pool,
+            self.creds_manager,
+            on_result=lambda job_id, report: self.outbox_results.put((job_id, report)),
+            image_optimizer=self.image_optimizer
+        )
+        self.outbox.start()
+        self.after(200, self._poll_outbox_results)
         self.setup_styles()
         self.setup_ui()
         self.load_config()
@@ -369,6 +403,10 @@ class EmailClient(TkinterDnD.Tk):
         # Compose tab
         self.compose_frame = ttk.Frame(self.notebook, padding=PADDING['medium'])
         self.notebook.add(self.compose_frame, text='Compose')
+
+        # Inbox tab, filled once logged in
+        self.inbox_frame = InboxFrame(self.notebook, padding=PADDING['medium'])
+        self.notebook.add(self.inbox_frame, text='Inbox')
         
         self.setup_login_ui()
         self.setup_compose_ui()
@@ -493,14 +531,21 @@ class EmailClient(TkinterDnD.Tk):
 
     def login(self):
         try:
-            # SMTP login
-            smtp_server = smtplib.SMTP(self.server_entry.get(), int(self.port_entry.get()))
-            smtp_server.starttls()
-            smtp_server.login(self.email_entry.get(), self.password_entry.get())
-            smtp_server.quit()
+            # SMTP login, the authenticated session stays warm in the pool
+            self.smtp_pool.verify(
+                self.server_entry.get(),
+                int(self.port_entry.get()),
+                self.email_entry.get(),
+                self.password_entry.get()
+            )
             
             # Save credentials
             self.save_credentials_to_keyring()
+
+            # Send anything that was queued while logged out
+            self.outbox.resume()
+
+            self.start_inbox()
             
             # Switch to compose tab
             self.notebook.select(1)  # Select the compose tab
@@ -508,6 +553,17 @@ class EmailClient(TkinterDnD.Tk):
         except Exception as e:
             messagebox.showerror("Error", f"Login failed: {str(e)}")
 
+    def start_inbox(self):
+        """Show the cached inbox for this account and sync it in the background"""
+        account = self.email_entry.get()
+        password = self.password_entry.get()
+        server, port = imap_sync.imap_settings_for(self.server_entry.get())
+        # The inbox closes the previous account's cache itself
+        self.inbox_frame.attach(
+            MailCache(cache_path(account)),
+            lambda: imap_sync.connect(server, port, account, password)
+        )
+
     def setup_compose_ui(self):
         # Main compose container
         compose_container = ttk.Frame(self.compose_frame, style='App.TFrame')
@@ -557,6 +613,29 @@ class EmailClient(TkinterDnD.Tk):
             command=self.preview_email
         ).grid(row=0, column=4)
 
+        # Mail merge sends one personalized copy per row of a recipient table
+        ttk.Button(
+            recipient_frame,
+            text="Merge",
+            style='Primary.TButton',
+            command=self.send_mail_merge
+        ).grid(row=0, column=5, padx=(PADDING['small'], 0))
+
+        # Counts and a sample of recipients imported from a dropped list
+        ttk.Label(
+            recipient_frame,
+            textvariable=self.import_status,
+            style='Info.TLabel'
+        ).grid(row=1, column=1, sticky='w', pady=(PADDING['small'], 0))
+        self.clear_import_button = ttk.Button(
+            recipient_frame,
+            text="Clear list",
+            command=self.clear_imported_recipients
+        )
+        self.clear_import_button.grid(row=1, column=2, columnspan=2,
+                                      pady=(PADDING['small'], 0))
+        self.clear_import_button.grid_remove()
+
         # Subject line
         subject_frame = ttk.Frame(compose_container, style='App.TFrame')
         subject_frame.pack(fill='x', pady=(0, PADDING['medium']))
@@ -614,7 +693,13 @@ class EmailClient(TkinterDnD.Tk):
                 widget.bind('<Button-1>', on_button_click)
 
         # Bind validation check to recipient entry
-        self.to_entry.bind('<KeyRelease>', self.validate_recipients)
+        self.to_entry.bind('<KeyRelease>', self.on_recipients_key)
+        self.to_entry.bind('<Down>', lambda e: self._move_autocomplete(1))
+        self.to_entry.bind('<Up>', lambda e: self._move_autocomplete(-1))
+        self.to_entry.bind('<Tab>', self._accept_autocomplete)
+        self.to_entry.bind('<Return>', self._accept_autocomplete)
+        self.to_entry.bind('<Escape>', self._dismiss_autocomplete)
+        self.to_entry.bind('<FocusOut>', lambda e: self.after(150, self._hide_autocomplete))
 
         # Enable drag and drop for attachments
         self.message_editor.drop_target_register(DND_FILES)
@@ -701,6 +786,14 @@ class EmailClient(TkinterDnD.Tk):
             command=self.remove_selected_attachment
         ).pack(side='left', padx=PADDING['small'])
 
+        # Downscale and recompress inline images before sending
+        ttk.Checkbutton(
+            attachments_buttons_frame,
+            text="Optimize images",
+            style='Switch.TCheckbutton',
+            variable=self.optimize_images
+        ).pack(side='right', padx=PADDING['small'])
+
         # Enable drag and drop for attachments listbox
         self.attachments_listbox.drop_target_register(DND_FILES)
         self.attachments_listbox.dnd_bind('<<Drop>>', self.add_attachment)
@@ -712,9 +805,9 @@ class EmailClient(TkinterDnD.Tk):
             self.attachments.append((file_path, None))
             self.attachments_listbox.insert(tk.END, file_path.split('/')[-1])
             if file_path.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
-                self.message_editor.insert(tk.END, f"\n{{img}}{{{file_path}}}\n")
+                self.append_to_message(f"\n{{img}}{{{file_path}}}\n")
             else:
-                self.message_editor.insert(tk.END, f"\n[Attachment: {file_path.split('/')[-1]}]\n")
+                self.append_to_message(f"\n[Attachment: {file_path.split('/')[-1]}]\n")
 
     def create_labeled_entry(self, parent, label_text, tooltip_key, show=None, row=0):
         """Helper method to create a label-entry pair with tooltip"""
@@ -783,436 +876,185 @@ class EmailClient(TkinterDnD.Tk):
             self.attachments.append((file_path, None))
             self.attachments_listbox.insert(tk.END, file_path.split('/')[-1])
             if file_path.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
-                self.message_editor.insert(tk.END, f"\n{{img}}{{{file_path}}}\n")
+                self.append_to_message(f"\n{{img}}{{{file_path}}}\n")
             else:
-                self.message_editor.insert(tk.END, f"\n[Attachment: {file_path.split('/')[-1]}]\n")
+                self.append_to_message(f"\n[Attachment: {file_path.split('/')[-1]}]\n")
 
     def add_syntax_highlighting(self):
         """Add syntax highlighting to the message editor"""
-        self.message_editor.tag_configure(
-            "keyword", 
-            foreground=STYLES['syntax_highlighting']['keyword']
-        )
-        self.message_editor.tag_configure(
-            "link", 
-            foreground=STYLES['syntax_highlighting']['link'], 
-            underline=True
-        )
-        self.message_editor.tag_configure(
-            "image", 
-            foreground=STYLES['syntax_highlighting']['image']
-        )
-        self.message_editor.tag_configure(
-            "attachment", 
-            foreground=STYLES['syntax_highlighting']['attachment']
-        )
+        # Edited lines are re-highlighted shortly after typing stops
+        self.syntax_highlighter = SyntaxHighlighter(self.message_editor)
 
-        def highlight_syntax(event=None):
-            self.message_editor.tag_remove("keyword", "1.0", tk.END)
-            self.message_editor.tag_remove("link", "1.0", tk.END)
-            self.message_editor.tag_remove("image", "1.0", tk.END)
-            self.message_editor.tag_remove("attachment", "1.0", tk.END)
-
-            text = self.message_editor.get("1.0", tk.END)
-            for keyword in ["{link}", "{img}", "{embed}", "{attach}"]:
-                start = "1.0"
-                while True:
-                    start = self.message_editor.search(keyword, start, stopindex=tk.END)
-                    if not start:
-                        break
-                    end = f"{start}+{len(keyword)}c"
-                    self.message_editor.tag_add("keyword", start, end)
-                    start = end
-
-            link_pattern = r'\{link\}\{(.*?)\}\{(.*?)\}'
-            for match in re.finditer(link_pattern, text):
-                start = f"1.0+{match.start()}c"
-                end = f"1.0+{match.end()}c"
-                self.message_editor.tag_add("link", start, end)
-
-            img_pattern = r'\{img\}\{(.*?)\}'
-            for match in re.finditer(img_pattern, text):
-                start = f"1.0+{match.start()}c"
-                end = f"1.0+{match.end()}c"
-                self.message_editor.tag_add("image", start, end)
-
-            attach_pattern = r'\{attach\}\{(.*?)\}'
-            for match in re.finditer(attach_pattern, text):
-                start = f"1.0+{match.start()}c"
-                end = f"1.0+{match.end()}c"
-                self.message_editor.tag_add("attachment", start, end)
-
-        self.message_editor.bind("<KeyRelease>", highlight_syntax)
-        highlight_syntax()
-
-    def validate_recipients(self, event=None):
-        recipient_string = self.to_entry.get().strip()
-        recipients = self.parse_recipients(recipient_string)
-        all_emails = recipients['to'] + recipients['cc'] + recipients['bcc']
-        
-        if all(self.is_valid_email(email) for email in all_emails):
-            self.valid_email_icon.set("✔")
-        else:
-            self.valid_email_icon.set("X")
+    def append_to_message(self, text):
+        """Insert text at the end of the message editor"""
+        lines = text.count("\n")
+        self.message_editor.insert(tk.END, text)
+        self.syntax_highlighter.mark_dirty(f"end-1c -{lines} lines", tk.END)
 
     def is_valid_email(self, email):
         """Simple regex-based email validation"""
-        pattern = r'^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$'
-        return re.match(pattern, email) is not None
+        return mail_core.is_valid_email(email)
 
     def parse_recipients(self, recipient_string):
         """Parse recipient string into to, cc, and bcc lists"""
-        # Split by commas and clean whitespace
-        parts = [p.strip() for p in recipient_string.split(',') if p.strip()]
-        
-        to_addresses = []
-        cc_addresses = []
-        bcc_addresses = []
-        
-        # Regex patterns for special designations
-        cc_pattern = r'\{cc\}\{(.*?)\}'
-        bcc_pattern = r'\{bcc\}\{(.*?)\}'
-        
-        for part in parts:
-            if re.search(cc_pattern, part, re.IGNORECASE):
-                # Extract CC address
-                address = re.search(cc_pattern, part, re.IGNORECASE).group(1)
-                cc_addresses.append(address.strip())
-            elif re.search(bcc_pattern, part, re.IGNORECASE):
-                # Extract BCC address
-                address = re.search(bcc_pattern, part, re.IGNORECASE).group(1)
-                bcc_addresses.append(address.strip())
-            else:
-                # Regular recipient
-                to_addresses.append(part.strip())
-        
-        return {
-            'to': to_addresses,
-            'cc': cc_addresses,
-            'bcc': bcc_addresses
-        }
+        return self.recipient_tokenizer.parse(recipient_string)
 
-    def preview_email(self):
-        # Get subject and message
-        subject = self.subject_entry.get().strip()
-        # Get recipient string and message
-        recipient_string = self.to_entry.get().strip()
-        message_text = self.message_editor.get("1.0", tk.END).strip()
-        
-        # Validate inputs
-        if not recipient_string:
+    def send_email(self, recipients, message_text):
+        """Queue the message on the outbox, the worker thread does the sending"""
+        try:
+            # Links and embedded images are processed here, MIME is built by the worker
+            self.outbox.enqueue(
+                recipients,
+                self.subject_entry.get().strip(),
+                self.process_message_body(message_text),
+                self.attachments,
+                optimize_images=self.optimize_images.get()
+            )
+
+            # Clear fields
+            self.to_entry.delete(0, tk.END)
+            self.message_editor.delete("1.0", tk.END)
+            self.attachments.clear()
+            self.attachments_listbox.delete(0, tk.END)
+            self.clear_imported_recipients()
+            # Clear subject field after sending
+            self.subject_entry.delete(0, tk.END)
+
+        except Exception as e:
             dialog = CustomDialog(
                 self,
                 "Error",
-                "Please enter at least one recipient email address.",
+                f"Failed to queue email: {str(e)}",
                 "error"
             )
             self.wait_window(dialog)
-            return
-        
-        if not message_text:
+
+    def _poll_outbox_results(self):
+        """Show a dialog for every message the outbox worker has finished"""
+        try:
+            while True:
+                job_id, report = self.outbox_results.get_nowait()
+                # A retried job reports everyone delivered so far, count each once
+                previous = self.delivery_reports.get(job_id)
+                already = set(previous.delivered) if previous else set()
+                threading.Thread(
+                    target=self._record_sent,
+                    args=([a for a in report.delivered if a not in already],),
+                    daemon=True
+                ).start()
+                self.delivery_reports[job_id] = report
+                if report.ok:
+                    dialog = CustomDialog(
+                        self,
+                        "Success",
+                        report.summary(),
+                        "info"
+                    )
+                else:
+                    dialog = CustomDialog(
+                        self,
+                        "Error" if report.error or not report.delivered else "Partially Sent",
+                        report.summary(),
+                        "error"
+                    )
+                self.wait_window(dialog)
+        except queue.Empty:
+            pass
+        finally:
+            self.after(200, self._poll_outbox_results)
+
+    def _record_sent(self, addresses):
+        try:
+            self.address_book.record_sent(addresses)
+        except Exception as e:
+            print(f"Error updating address book: {e}")
+
+    def send_mail_merge(self):
+        """Send the message once per row of a CSV/JSON recipient table"""
+        # Sent right away rather than queued, so the account must be there now
+        account = {key: self.creds_manager.get_credential("smtp_client", key)
+                   for key in ("server", "port", "email", "password")}
+        if not all(account.values()):
             dialog = CustomDialog(
                 self,
                 "Error",
-                "Please enter a message to send.",
+                "Please log in before sending a mail merge.",
                 "error"
             )
             self.wait_window(dialog)
             return
 
-        # Parse recipients
-        recipients = self.parse_recipients(recipient_string)
-        
-        if not any([recipients['to'], recipients['cc'], recipients['bcc']]):
+        file_path = filedialog.askopenfilename(
+            title="Select recipient table",
+            filetypes=[("Recipient tables", "*.csv *.json *.jsonl *.txt")]
+        )
+        if not file_path:
+            return
+
+        message_text = self.message_editor.get("1.0", tk.END).strip()
+        if not message_text:
             dialog = CustomDialog(
                 self,
                 "Error",
-                "No valid email addresses found.",
+                "Please enter a message to send.",
                 "error"
             )
             self.wait_window(dialog)
             return
 
-        # Show recipient summary in confirmation
-        summary = []
-        if recipients['to']: 
-            summary.append(f"To: {', '.join(recipients['to'])}")
-        if recipients['cc']: 
-            summary.append(f"CC: {', '.join(recipients['cc'])}")
-        if recipients['bcc']: 
-            summary.append(f"BCC: {', '.join(recipients['bcc'])}")
-
-        # Generate email preview
-        preview_html = self.process_message_body(message_text)
-        preview_html += "<br><br><strong>Attachments:</strong><br>"
-        for file_path, _ in self.attachments:
-            if not file_path.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
-                preview_html += f"{file_path.split('/')[-1]}<br>"
-
-        # Create preview window with better dimensions
-        preview_window = tk.Toplevel(self)
-        preview_window.title("Email Preview")
-        preview_window.configure(bg=COLORS['background'])
-        
-        # Make preview window relative to main window size
-        window_width = int(self.winfo_width() * 0.8)
-        window_height = int(self.winfo_height() * 0.8)
-        
-        # Center on parent window
-        x = self.winfo_x() + (self.winfo_width() - window_width) // 2
-        y = self.winfo_y() + (self.winfo_height() - window_height) // 2
-        preview_window.geometry(f"{window_width}x{window_height}+{x}+{y}")
-        
-        # Main container with padding
-        main_frame = ttk.Frame(preview_window, style='App.TFrame', padding=PADDING['medium'])
-        main_frame.pack(fill='both', expand=True)
-        
-        # Content frame with scrolling
-        preview_frame = ttk.Frame(main_frame, style='App.TFrame')
-        preview_frame.pack(fill='both', expand=True, padx=PADDING['medium'])
-        
-        # Add recipients with proper styling
-        recipient_frame = ttk.Frame(preview_frame, style='App.TFrame')
-        recipient_frame.pack(fill='x', pady=(0, PADDING['medium']))
-        
-        if recipients['to']:
-            ttk.Label(recipient_frame, 
-                     text=f"To: {', '.join(recipients['to'])}", 
-                     style='Normal.TLabel',
-                     wraplength=window_width-100).pack(anchor='w')
-        if recipients['cc']:
-            ttk.Label(recipient_frame, 
-                     text=f"CC: {', '.join(recipients['cc'])}", 
-                     style='Normal.TLabel',
-                     wraplength=window_width-100).pack(anchor='w')
-        if recipients['bcc']:
-            ttk.Label(recipient_frame, 
-                     text=f"BCC: {', '.join(recipients['bcc'])}", 
-                     style='Normal.TLabel',
-                     wraplength=window_width-100).pack(anchor='w')
-
-        # Subject
-        ttk.Label(preview_frame, 
-                 text=f"Subject: {subject}", 
-                 style='Header.TLabel',
-                 wraplength=window_width-100).pack(anchor='w', pady=PADDING['medium'])
-
-        # Add separator
-        ttk.Separator(preview_frame, orient='horizontal').pack(fill='x', pady=PADDING['medium'])
-
-        # Message content in scrollable frame
-        message_frame = ttk.Frame(preview_frame, style='App.TFrame')
-        message_frame.pack(fill='both', expand=True)
-        
-        # Add canvas for scrolling
-        canvas = tk.Canvas(message_frame, 
-                         bg=COLORS['background'],
-                         highlightthickness=0)
-        scrollbar = ttk.Scrollbar(message_frame, orient='vertical', command=canvas.yview)
-        content_frame = ttk.Frame(canvas, style='App.TFrame')
-        
-        canvas.configure(yscrollcommand=scrollbar.set)
-        
-        # Pack scrolling components
-        scrollbar.pack(side='right', fill='y')
-        canvas.pack(side='left', fill='both', expand=True)
-        
-        # Create window in canvas for content
-        canvas_frame = canvas.create_window((0, 0), window=content_frame, anchor='nw')
-        
-        # Message body
-        message_label = ttk.Label(
-            content_frame,
-            text=message_text,
-            style='Normal.TLabel',
-            wraplength=window_width-100)
-        message_label.pack(fill='both', expand=True, pady=PADDING['medium'])
-        
-        # Attachments section
-        if self.attachments:
-            ttk.Separator(content_frame, orient='horizontal').pack(fill='x', pady=PADDING['medium'])
-            ttk.Label(content_frame, 
-                     text="Attachments:", 
-                     style='Subheader.TLabel').pack(anchor='w', pady=(PADDING['medium'], PADDING['small']))
-            
-            for file_path, _ in self.attachments:
-                ttk.Label(content_frame, 
-                         text=f"• {file_path.split('/')[-1]}", 
-                         style='Normal.TLabel').pack(anchor='w')
-
-        # Update scroll region
-        def configure_scroll_region(event):
-            canvas.configure(scrollregion=canvas.bbox('all'))
-        content_frame.bind('<Configure>', configure_scroll_region)
-        
-        # Adjust canvas size
-        def configure_canvas(event):
-            canvas.itemconfig(canvas_frame, width=event.width)
-        canvas.bind('<Configure>', configure_canvas)
-
-        # Button frame at bottom
-        button_frame = ttk.Frame(main_frame, style='App.TFrame')
-        button_frame.pack(fill='x', pady=PADDING['medium'])
-
-        # Add cancel button
-        ttk.Button(
-            button_frame,
-            text="Cancel",
-            style='Primary.TButton',
-            command=preview_window.destroy
-        ).pack(side='right', padx=(PADDING['small'], 0))
-
-        # Add send button
-        ttk.Button(
-            button_frame,
-            text="Send",
-            style='Primary.TButton',
-            command=lambda: [self.send_email(recipients, message_text), 
-                           preview_window.destroy()]
-        ).pack(side='right')
-
-        # Make sure preview window gets focus
-        preview_window.transient(self)
-        preview_window.grab_set()
-        preview_window.focus_set()
-
-    def send_email(self, recipients, message_text):
-        try:
-            # Get stored credentials
-            server_address = self.creds_manager.get_credential("smtp_client", "server")
-            port = self.creds_manager.get_credential("smtp_client", "port")
-            sender_email = self.creds_manager.get_credential("smtp_client", "email")
-            password = self.creds_manager.get_credential("smtp_client", "password")
-
-            # Create message
-            msg = MIMEMultipart()
-            msg['From'] = sender_email
-            msg['To'] = ', '.join(recipients['to'])
-            if recipients['cc']:
-                msg['Cc'] = ', '.join(recipients['cc'])
-            
-            # Add subject
-            msg['Subject'] = self.subject_entry.get().strip()
-
-            # Add message body with clickable links and embedded images
-            msg.attach(MIMEText(self.process_message_body(message_text), 'html'))
-
-            # Attach files
-            for file_path, content_id in self.attachments:
-                if not file_path.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
-                    with open(file_path, 'rb') as attachment:
-                        part = MIMEBase('application', 'octet-stream')
-                        part.set_payload(attachment.read())
-                        encoders.encode_base64(part)
-                        part.add_header(
-                            'Content-Disposition',
-                            f'attachment; filename={file_path.split("/")[-1]}',
-                        )
-                        msg.attach(part)
-                else:
-                    with open(file_path, 'rb') as img_file:
-                        part = MIMEBase('application', 'octet-stream')
-                        part.set_payload(img_file.read())
-                        encoders.encode_base64(part)
-                        part.add_header('Content-ID', f'<{content_id}>')
-                        part.add_header('Content-Disposition', 'inline', filename=file_path.split('/')[-1])
-                        msg.attach(part)
-
-            # Create full recipient list
-            all_recipients = (recipients['to'] + 
-                            recipients['cc'] + 
-                            recipients['bcc'])
-
-            # Send email
-            server = smtplib.SMTP(server_address, int(port))
-            server.starttls()
-            server.login(sender_email, password)
-            server.send_message(msg, from_addr=sender_email, to_addrs=all_recipients)
-            server.quit()
-
-            # Show success
+        # Markup is processed once, {{field}} placeholders are filled per row
+        body_html = self.process_message_body(message_text)
+        optimize_images = self.optimize_images.get()
+        merge = MailMerge(
+            self.smtp_pool,
+            account["server"],
+            account["port"],
+            account["email"],
+            account["password"],
+            self.subject_entry.get().strip(),
+            body_html,
+            list(self.attachments)
+        )
+        result = {}
+
+        def run_merge():
+            try:
+                if optimize_images:
+                    merge.attachments = self.image_optimizer.optimize_attachments(
+                        unique_attachments(merge.attachments))
+                result['stats'] = merge.run(iter_recipient_rows(file_path))
+            except Exception as e:
+                result['error'] = e
+
+        thread = threading.Thread(target=run_merge, daemon=True)
+        thread.start()
+        self._poll_mail_merge(thread, result)
+
+    def _poll_mail_merge(self, thread, result):
+        """Wait for the merge thread without blocking the Tk main loop"""
+        if thread.is_alive():
+            self.after(200, self._poll_mail_merge, thread, result)
+            return
+        if 'error' in result:
             dialog = CustomDialog(
                 self,
-                "Success",
-                "Email sent successfully!",
-                "info"
+                "Error",
+                f"Mail merge failed: {str(result['error'])}",
+                "error"
             )
-            self.wait_window(dialog)
-            
-            # Clear fields
-            self.to_entry.delete(0, tk.END)
-            self.message_editor.delete("1.0", tk.END)
-            self.attachments.clear()
-            # Clear subject field after sending
-            self.subject_entry.delete(0, tk.END)
-            
-        except Exception as e:
+        else:
             dialog = CustomDialog(
                 self,
-                "Error",
-                f"Failed to send email: {str(e)}",
-                "error"
+                "Mail Merge",
+                result['stats'].summary(),
+                "info"
             )
-            self.wait_window(dialog)
+        self.wait_window(dialog)
 
     def process_message_body(self, text):
         """Process the message body to handle links, images, and attachments"""
-        # Convert URLs to clickable links
-        text = self.convert_links(text)
-
-        # Process custom formats
-        text = self.process_custom_formats(text)
-
-        return text
-
-    def convert_links(self, text):
-        """Convert URLs in text to clickable links"""
-        url_pattern = r'(https?://\S+)'
-        return re.sub(url_pattern, r'<a href="\1">\1</a>', text)
-
-    def process_custom_formats(self, text):
-        """Process custom formats for links, images, and attachments"""
-        # Process links
-        link_pattern = r'\{link\}\{(.*?)\}\{(.*?)\}'
-        text = re.sub(link_pattern, r'<a href="\2">\1</a>', text)
-
-        # Process simple links
-        simple_link_pattern = r'\{link\}\{(.*?)\}'
-        text = re.sub(simple_link_pattern, r'<a href="\1">\1</a>', text)
-
-        # Process images
-        img_pattern = r'\{img\}\{(.*?)\}'
-        text = re.sub(img_pattern, self.embed_image, text)
-
-        # Process embedded attachments
-        embed_pattern = r'\{embed\}\{(.*?)\}'
-        text = re.sub(embed_pattern, self.embed_attachment, text)
-
-        # Process regular attachments
-        attach_pattern = r'\{attach\}\{(.*?)\}'
-        text = re.sub(attach_pattern, self.attach_file, text)
-
-        return text
-
-    def embed_image(self, match):
-        """Embed an image in the email body"""
-        img_path = match.group(1)
-        content_id = f"{img_path.split('/')[-1]}@pybranch"
-        with open(img_path, 'rb') as img_file:
-            img_data = base64.b64encode(img_file.read()).decode()
-            self.attachments.append((img_path, content_id))
-            return f'<img src="cid:{content_id}" alt="{img_path.split("/")[-1]}">'
-        return f'[Image: {img_path}]'
-
-    def embed_attachment(self, match):
-        """Embed an attachment in the email body"""
-        attachment_info = match.group(1)
-        return f'[Embedded Attachment: {attachment_info}]'
-
-    def attach_file(self, match):
-        """Attach a file to the email"""
-        attachment_info = match.group(1)
-        return f'[Attachment: {attachment_info}]'
+        # Inline images found in the body are added to self.attachments
+        return mail_core.process_message_body(text, self.attachments)
 
     def select_provider(self, provider):
         self.selected_provider.set(provider)
@@ -1260,10 +1102,13 @@ class EmailClient(TkinterDnD.Tk):
             if not self.email_entry.get() or not self.password_entry.get():
                 return False
                 
-            self.creds_manager.save_credential("smtp_client", "email", self.email_entry.get())
-            self.creds_manager.save_credential("smtp_client", "password", self.password_entry.get())
-            self.creds_manager.save_credential("smtp_client", "server", self.server_entry.get())
-            self.creds_manager.save_credential("smtp_client", "port", self.port_entry.get())
+            # One encrypt-and-write for the whole login
+            self.creds_manager.save_many("smtp_client", {
+                "email": self.email_entry.get(),
+                "password": self.password_entry.get(),
+                "server": self.server_entry.get(),
+                "port": self.port_entry.get(),
+            })
             return True
         except Exception as e:
             print(f"Error saving credentials: {e}")
@@ -1273,38 +1118,197 @@ class EmailClient(TkinterDnD.Tk):
         self.mainloop()
 
     def load_recipients_from_file(self, event):
+        """Import a dropped TXT/CSV/JSON list on a worker thread"""
+        file_path = event.data.strip('{}')
+        if not file_path or not os.path.exists(file_path):
+            return
+        if self._import_cancel:
+            self._import_cancel.set()
+        cancel = threading.Event()
+        self._import_cancel = cancel
+        updates = queue.Queue()
+
+        def run_import():
+            try:
+                # Only counts cross threads while the import runs
+                table = import_recipients(
+                    file_path,
+                    progress=lambda t: updates.put(('progress', (t.rows, len(t)))),
+                    cancel=cancel
+                )
+                if not cancel.is_set():
+                    # Imported addresses become completion candidates too
+                    self.address_book.add_contacts(
+                        a for addresses in table.fields.values() for a in addresses)
+                updates.put(('done', table))
+            except Exception as e:
+                updates.put(('error', e))
+
+        self.import_status.set("Importing recipients…")
+        threading.Thread(target=run_import, daemon=True).start()
+        self._poll_recipient_import(updates, cancel)
+
+    def _poll_recipient_import(self, updates, cancel):
+        """Apply import progress from the worker without blocking Tk"""
+        if cancel.is_set():
+            return
         try:
-            file_path = event.data.strip('{}')
-            if not file_path or not os.path.exists(file_path):
-                return
-                
-            if file_path.lower().endswith('.txt'):
-                with open(file_path, 'r') as file:
-                    recipients = file.read().strip()
-                    self.to_entry.insert(tk.END, recipients)
-            elif file_path.lower().endswith('.json'):
-                with open(file_path, 'r') as file:
-                    data = json.load(file)
-                    recipients = ', '.join(data.get('recipients', []))
-                    self.to_entry.insert(tk.END, recipients)
-            elif file_path.lower().endswith('.csv'):
-                with open(file_path, 'r') as file:
-                    lines = file.readlines()
-                    for line in lines:
-                        recipients = ', '.join(line.strip().split(','))
-                        self.to_entry.insert(tk.END, recipients + '\n')
+            while True:
+                kind, value = updates.get_nowait()
+                if kind == 'progress':
+                    rows, unique = value
+                    self.import_status.set(
+                        f"Importing recipients… {rows:,} rows read, {unique:,} unique")
+                elif kind == 'done':
+                    self.recipient_table = value
+                    self.import_status.set(value.summary() or "No recipients found in file")
+                    if len(value):
+                        self.clear_import_button.grid()
+                    self._import_cancel = None
+                    return
+                else:
+                    self.import_status.set(f"Error loading recipients: {value}")
+                    self._import_cancel = None
+                    return
+        except queue.Empty:
+            pass
+        self.after(100, self._poll_recipient_import, updates, cancel)
+
+    def clear_imported_recipients(self):
+        if self._import_cancel:
+            self._import_cancel.set()
+            self._import_cancel = None
+        self.recipient_table = RecipientTable()
+        self.import_status.set("")
+        self.clear_import_button.grid_remove()
+
+    def collect_recipients(self, recipient_string):
+        """Recipients typed in the To field plus the imported list"""
+        recipients = self.parse_recipients(recipient_string)
+        for field, addresses in self.recipient_table.fields.items():
+            recipients[field].extend(addresses)
+        return recipients
+
+    def format_recipients(self, addresses, limit=20):
+        """Comma-separated addresses, long lists are cut short with a count"""
+        if len(addresses) <= limit:
+            return ', '.join(addresses)
+        return f"{', '.join(addresses[:limit])} and {len(addresses) - limit:,} more"
+
+    def on_recipients_key(self, event=None):
+        if event is not None and event.keysym in ('Up', 'Down', 'Return', 'Tab', 'Escape'):
+            return
+        self.validate_recipients(event)
+        if self._autocomplete_after_id is None:
+            self._autocomplete_after_id = self.after_idle(self._update_autocomplete)
+
+    def _load_address_book(self):
+        try:
+            self.address_book.load()
+            self.address_book.warm()
         except Exception as e:
-            print(f"Error loading recipients: {e}")
+            print(f"Error loading address book: {e}")
+
+    def _current_recipient_token(self):
+        """(start, end, designation, prefix) of the address being typed"""
+        text = self.to_entry.get()
+        end = self.to_entry.index(tk.INSERT)
+        start = text.rfind(',', 0, end) + 1
+        token = text[start:end].lstrip()
+        start = end - len(token)
+        match = re.match(r'\{(cc|bcc)\}\{', token, re.IGNORECASE)
+        if match:
+            return start, end, match.group(0), token[match.end():]
+        return start, end, '', token
+
+    def _update_autocomplete(self):
+        self._autocomplete_after_id = None
+        _, _, _, prefix = self._current_recipient_token()
+        matches = self.address_book.complete(prefix) if prefix.strip() else []
+        if not matches or matches == [prefix.strip()]:
+            self._hide_autocomplete()
+            return
+
+        if self.autocomplete_popup is None:
+            self.autocomplete_popup = tk.Toplevel(self)
+            self.autocomplete_popup.wm_overrideredirect(True)
+            self.autocomplete_list = tk.Listbox(
+                self.autocomplete_popup,
+                font=FONTS['normal'],
+                bg=COLORS['secondary'],
+                fg=COLORS['text'],
+                selectbackground=COLORS['primary'],
+                relief='flat',
+                activestyle='none'
+            )
+            self.autocomplete_list.pack(fill='both', expand=True)
+            self.autocomplete_list.bind(
+                '<ButtonRelease-1>', lambda e: self._accept_autocomplete())
+        self.autocomplete_list.delete(0, tk.END)
+        for address in matches:
+            self.autocomplete_list.insert(tk.END, address)
+        self.autocomplete_list.configure(height=len(matches))
+        self.autocomplete_list.selection_set(0)
+        x = self.to_entry.winfo_rootx()
+        y = self.to_entry.winfo_rooty() + self.to_entry.winfo_height()
+        self.autocomplete_popup.wm_geometry(f"{self.to_entry.winfo_width()}x"
+                                            f"{self.autocomplete_list.winfo_reqheight()}+{x}+{y}")
+        self.autocomplete_popup.deiconify()
+        self.autocomplete_popup.lift()
+
+    def _hide_autocomplete(self):
+        if self.autocomplete_popup is not None:
+            self.autocomplete_popup.withdraw()
+
+    def _dismiss_autocomplete(self, event=None):
+        # Escape closes the suggestions first, the window only after that
+        if not self._autocomplete_visible():
+            return None
+        self._hide_autocomplete()
+        return "break"
+
+    def _autocomplete_visible(self):
+        return (self.autocomplete_popup is not None
+                and self.autocomplete_popup.winfo_viewable())
+
+    def _move_autocomplete(self, step):
+        if not self._autocomplete_visible():
+            return None
+        selection = self.autocomplete_list.curselection()
+        index = (selection[0] if selection else -1) + step
+        index = max(0, min(self.autocomplete_list.size() - 1, index))
+        self.autocomplete_list.selection_clear(0, tk.END)
+        self.autocomplete_list.selection_set(index)
+        self.autocomplete_list.see(index)
+        return "break"
+
+    def _accept_autocomplete(self, event=None):
+        """Replace the address being typed with the selected suggestion"""
+        if not self._autocomplete_visible():
+            return None
+        selection = self.autocomplete_list.curselection()
+        if not selection:
+            return None
+        address = self.autocomplete_list.get(selection[0])
+        start, end, designation, _ = self._current_recipient_token()
+        completed = f"{designation}{address}{'}' if designation else ''}, "
+        self.to_entry.delete(start, end)
+        self.to_entry.insert(start, completed)
+        self.to_entry.icursor(start + len(completed))
+        self._hide_autocomplete()
+        self.validate_recipients()
+        return "break"
 
     def validate_recipients(self, event=None):
-        recipient_string = self.to_entry.get().strip()
-        recipients = self.parse_recipients(recipient_string)
-        all_emails = recipients['to'] + recipients['cc'] + recipients['bcc']
-        
-        if all(self.is_valid_email(email) for email in all_emails):
-            self.valid_email_icon.set("✔")
-        else:
-            self.valid_email_icon.set("X")
+        """Coalesce a burst of keystrokes into one validation pass"""
+        if self._validate_after_id is None:
+            self._validate_after_id = self.after_idle(self._validate_recipients_now)
+
+    def _validate_recipients_now(self):
+        self._validate_after_id = None
+        # Only parts edited since the last pass are validated again
+        invalid = self.recipient_tokenizer.invalid(self.to_entry.get())
+        self.valid_email_icon.set("X" if invalid else "✔")
 
     def show_attachment_menu(self, event):
         """Show context menu at mouse position"""
@@ -1334,10 +1338,7 @@ class EmailClient(TkinterDnD.Tk):
         """Clear all saved user data and credentials"""
         try:
             # Clear credentials
-            self.creds_manager.delete_credential("smtp_client", "email")
-            self.creds_manager.delete_credential("smtp_client", "password")
-            self.creds_manager.delete_credential("smtp_client", "server")
-            self.creds_manager.delete_credential("smtp_client", "port")
+            self.creds_manager.clear_all_credentials("smtp_client")
             
             # Clear UI fields
             if hasattr(self, 'email_entry'):
@@ -1361,6 +1362,20 @@ class EmailClient(TkinterDnD.Tk):
         try:
             # Clear any sensitive data
             self.clear_user_data()
+
+            # Stop the outbox worker, unsent mail stays queued on disk
+            if hasattr(self, 'outbox'):
+                self.outbox.stop()
+
+            # Close pooled SMTP sessions and image workers
+            self.smtp_pool.close_all()
+            self.image_optimizer.shutdown()
+
+            # Drop decrypted credentials held in memory
+            self.creds_manager.close()
+            self.address_book.close()
+            if hasattr(self, 'inbox_frame'):
+                self.inbox_frame.close()
             
             # Destroy all tooltips
             if hasattr(self, 'active_tooltip') and self.active_tooltip:
@@ -1372,7 +1387,6 @@ class EmailClient(TkinterDnD.Tk):
             print(f"Error during cleanup: {e}")
             self.destroy()
 
-    # Fix potential memory leak in preview window
     def preview_email(self):
         # Get subject and message
         subject = self.subject_entry.get().strip()
@@ -1381,7 +1395,7 @@ class EmailClient(TkinterDnD.Tk):
         message_text = self.message_editor.get("1.0", tk.END).strip()
         
         # Validate inputs
-        if not recipient_string:
+        if not recipient_string and not len(self.recipient_table):
             dialog = CustomDialog(
                 self,
                 "Error",
@@ -1401,8 +1415,8 @@ class EmailClient(TkinterDnD.Tk):
             self.wait_window(dialog)
             return
 
-        # Parse recipients
-        recipients = self.parse_recipients(recipient_string)
+        # Parse recipients, imported lists are added to the typed ones
+        recipients = self.collect_recipients(recipient_string)
         
         if not any([recipients['to'], recipients['cc'], recipients['bcc']]):
             dialog = CustomDialog(
@@ -1416,146 +1430,22 @@ class EmailClient(TkinterDnD.Tk):
 
         # Show recipient summary in confirmation
         summary = []
-        if recipients['to']: 
-            summary.append(f"To: {', '.join(recipients['to'])}")
-        if recipients['cc']: 
-            summary.append(f"CC: {', '.join(recipients['cc'])}")
-        if recipients['bcc']: 
-            summary.append(f"BCC: {', '.join(recipients['bcc'])}")
-
-        # Generate email preview
-        preview_html = self.process_message_body(message_text)
-        preview_html += "<br><br><strong>Attachments:</strong><br>"
-        for file_path, _ in self.attachments:
-            if not file_path.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
-                preview_html += f"{file_path.split('/')[-1]}<br>"
-
-        # Create preview window with better dimensions
-        preview_window = tk.Toplevel(self)
-        preview_window.title("Email Preview")
-        preview_window.configure(bg=COLORS['background'])
-        
-        # Make preview window relative to main window size
-        window_width = int(self.winfo_width() * 0.8)
-        window_height = int(self.winfo_height() * 0.8)
-        
-        # Center on parent window
-        x = self.winfo_x() + (self.winfo_width() - window_width) // 2
-        y = self.winfo_y() + (self.winfo_height() - window_height) // 2
-        preview_window.geometry(f"{window_width}x{window_height}+{x}+{y}")
-        
-        # Main container with padding
-        main_frame = ttk.Frame(preview_window, style='App.TFrame', padding=PADDING['medium'])
-        main_frame.pack(fill='both', expand=True)
-        
-        # Content frame with scrolling
-        preview_frame = ttk.Frame(main_frame, style='App.TFrame')
-        preview_frame.pack(fill='both', expand=True, padx=PADDING['medium'])
-        
-        # Add recipients with proper styling
-        recipient_frame = ttk.Frame(preview_frame, style='App.TFrame')
-        recipient_frame.pack(fill='x', pady=(0, PADDING['medium']))
-        
         if recipients['to']:
-            ttk.Label(recipient_frame, 
-                     text=f"To: {', '.join(recipients['to'])}", 
-                     style='Normal.TLabel',
-                     wraplength=window_width-100).pack(anchor='w')
+            summary.append(f"To: {self.format_recipients(recipients['to'])}")
         if recipients['cc']:
-            ttk.Label(recipient_frame, 
-                     text=f"CC: {', '.join(recipients['cc'])}", 
-                     style='Normal.TLabel',
-                     wraplength=window_width-100).pack(anchor='w')
+            summary.append(f"CC: {self.format_recipients(recipients['cc'])}")
         if recipients['bcc']:
-            ttk.Label(recipient_frame, 
-                     text=f"BCC: {', '.join(recipients['bcc'])}", 
-                     style='Normal.TLabel',
-                     wraplength=window_width-100).pack(anchor='w')
-
-        # Subject
-        ttk.Label(preview_frame, 
-                 text=f"Subject: {subject}", 
-                 style='Header.TLabel',
-                 wraplength=window_width-100).pack(anchor='w', pady=PADDING['medium'])
-
-        # Add separator
-        ttk.Separator(preview_frame, orient='horizontal').pack(fill='x', pady=PADDING['medium'])
-
-        # Message content in scrollable frame
-        message_frame = ttk.Frame(preview_frame, style='App.TFrame')
-        message_frame.pack(fill='both', expand=True)
-        
-        # Add canvas for scrolling
-        canvas = tk.Canvas(message_frame, 
-                         bg=COLORS['background'],
-                         highlightthickness=0)
-        scrollbar = ttk.Scrollbar(message_frame, orient='vertical', command=canvas.yview)
-        content_frame = ttk.Frame(canvas, style='App.TFrame')
-        
-        canvas.configure(yscrollcommand=scrollbar.set)
-        
-        # Pack scrolling components
-        scrollbar.pack(side='right', fill='y')
-        canvas.pack(side='left', fill='both', expand=True)
-        
-        # Create window in canvas for content
-        canvas_frame = canvas.create_window((0, 0), window=content_frame, anchor='nw')
-        
-        # Message body
-        message_label = ttk.Label(
-            content_frame,
-            text=message_text,
-            style='Normal.TLabel',
-            wraplength=window_width-100)
-        message_label.pack(fill='both', expand=True, pady=PADDING['medium'])
-        
-        # Attachments section
-        if self.attachments:
-            ttk.Separator(content_frame, orient='horizontal').pack(fill='x', pady=PADDING['medium'])
-            ttk.Label(content_frame, 
-                     text="Attachments:", 
-                     style='Subheader.TLabel').pack(anchor='w', pady=(PADDING['medium'], PADDING['small']))
-            
-            for file_path, _ in self.attachments:
-                ttk.Label(content_frame, 
-                         text=f"• {file_path.split('/')[-1]}", 
-                         style='Normal.TLabel').pack(anchor='w')
-
-        # Update scroll region
-        def configure_scroll_region(event):
-            canvas.configure(scrollregion=canvas.bbox('all'))
-        content_frame.bind('<Configure>', configure_scroll_region)
-        
-        # Adjust canvas size
-        def configure_canvas(event):
-            canvas.itemconfig(canvas_frame, width=event.width)
-        canvas.bind('<Configure>', configure_canvas)
-
-        # Button frame at bottom
-        button_frame = ttk.Frame(main_frame, style='App.TFrame')
-        button_frame.pack(fill='x', pady=PADDING['medium'])
-
-        # Add cancel button
-        ttk.Button(
-            button_frame,
-            text="Cancel",
-            style='Primary.TButton',
-            command=preview_window.destroy
-        ).pack(side='right', padx=(PADDING['small'], 0))
-
-        # Add send button
-        ttk.Button(
-            button_frame,
-            text="Send",
-            style='Primary.TButton',
-            command=lambda: [self.send_email(recipients, message_text), 
-                           preview_window.destroy()]
-        ).pack(side='right')
-
-        # Make sure preview window gets focus
-        preview_window.transient(self)
-        preview_window.grab_set()
-        preview_window.focus_set()
+            summary.append(f"BCC: {self.format_recipients(recipients['bcc'])}")
+
+        # Body pages, the attachment list and thumbnails are filled in lazily
+        PreviewWindow(
+            self,
+            summary,
+            subject,
+            message_text,
+            self.attachments,
+            on_send=lambda: self.send_email(recipients, message_text)
+        )
 
     def _cleanup_preview(self, window):
         """Clean up preview window resources"""
@@ -0,0 +1,155 @@
+"""
+PyBranch - Modern SMTP Email Client
+Copyright (C) 2025 Nagusame CS
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import tempfile
+import uuid
+from email.mime.text import MIMEText
+from email.mime.base import MIMEBase
+from email.message import Message
+from email.policy import SMTP
+
+from part_cache import PART_CACHE, encode_base64_lines
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif')
+
+# Multiple of 57 bytes so every encoded chunk ends on a full 76-char line
+ENCODE_CHUNK_SIZE = 57 * 1024
+# Messages larger than this roll over from memory to a temp file on disk
+SPOOL_SIZE = 1024 * 1024
+
+
+def is_image(file_path):
+    return file_path.lower().endswith(IMAGE_EXTENSIONS)
+
+
+def inline_content_id(file_path, cache=PART_CACHE):
+    """Content-ID derived from the file contents, identical images share one"""
+    return f"{cache.digest(file_path)[:16]}@pybranch"
+
+
+def unique_attachments(attachments, cache=PART_CACHE):
+    """Collapse attachments with identical contents into a single part
+
+    Images are keyed by content alone and keep whichever entry carries a
+    Content-ID, other files are keyed by content and file name.
+    """
+    unique = {}
+    for file_path, content_id in attachments:
+        digest = cache.digest(file_path)
+        key = digest if is_image(file_path) else (digest, file_path.split('/')[-1])
+        if key not in unique or (content_id and not unique[key][1]):
+            unique[key] = (file_path, content_id)
+    return list(unique.values())
+
+
+def envelope_recipients(recipients):
+    """Full RCPT list for a parsed to/cc/bcc dict"""
+    return recipients['to'] + recipients.get('cc', []) + recipients.get('bcc', [])
+
+
+class StreamingMessage:
+    """Writes a multipart message straight to a spooled temp file
+
+    Attachments are read and base64-encoded one chunk at a time, so peak
+    memory stays around ENCODE_CHUNK_SIZE no matter how large the files are.
+    The finished file is already in SMTP wire format (CRLF line endings).
+    """
+
+    def __init__(self, sender, recipients, subject, spool_size=SPOOL_SIZE, cache=PART_CACHE):
+        self.cache = cache
+        self.file = tempfile.SpooledTemporaryFile(max_size=spool_size)
+        self.boundary = f"===============pybranch{uuid.uuid4().hex}=="
+        self.size = 0
+        self._tail = b''
+
+        headers = Message(policy=SMTP)
+        headers['From'] = sender
+        headers['To'] = ', '.join(recipients['to'])
+        if recipients.get('cc'):
+            headers['Cc'] = ', '.join(recipients['cc'])
+        headers['Subject'] = subject
+        headers['MIME-Version'] = '1.0'
+        headers['Content-Type'] = f'multipart/mixed; boundary="{self.boundary}"'
+        self._write_headers(headers)
+
+    def _write(self, data):
+        if data:
+            self.file.write(data)
+            self.size += len(data)
+            self._tail = (self._tail + data)[-2:]
+
+    def _write_headers(self, headers):
+        for name, value in headers.items():
+            self._write(SMTP.fold_binary(name, value))
+        self._write(b'\r\n')
+
+    def _begin_part(self):
+        if self._tail != b'\r\n':
+            self._write(b'\r\n')
+        self._write(f'--{self.boundary}\r\n'.encode('ascii'))
+
+    def add_html(self, html):
+        self._begin_part()
+        self._write(MIMEText(html, 'html').as_bytes(policy=SMTP))
+
+    def add_file(self, file_path, content_id=None):
+        """Append a base64 part, images go inline by Content-ID"""
+        file_name = file_path.split('/')[-1]
+        part = MIMEBase('application', 'octet-stream', policy=SMTP)
+        del part['MIME-Version']
+        part['Content-Transfer-Encoding'] = 'base64'
+        if not is_image(file_path):
+            part.add_header('Content-Disposition', 'attachment', filename=file_name)
+        else:
+            part.add_header('Content-ID', f'<{content_id}>')
+            part.add_header('Content-Disposition', 'inline', filename=file_name)
+        self._begin_part()
+        self._write_headers(part)
+
+        encoded = self.cache.encoded(file_path) if self.cache else None
+        if encoded is not None:
+            self._write(encoded)
+            return
+        # Too large to cache, encode chunk by chunk straight from disk
+        with open(file_path, 'rb') as attachment:
+            while True:
+                chunk = attachment.read(ENCODE_CHUNK_SIZE)
+                if not chunk:
+                    break
+                self._write(encode_base64_lines(chunk))
+
+    def finish(self):
+        """Close the multipart body and rewind, returns (file, size)"""
+        if self._tail != b'\r\n':
+            self._write(b'\r\n')
+        self._write(f'--{self.boundary}--\r\n'.encode('ascii'))
+        self.file.seek(0)
+        return self.file, self.size
+
+
+def build_message_file(sender, recipients, subject, html, attachments=()):
+    """Build the outgoing message as a spooled file, returns (file, size)
+
+    Attachments are (file_path, content_id) pairs and bcc addresses stay
+    off the headers.
+    """
+    message = StreamingMessage(sender, recipients, subject)
+    message.add_html(html)
+    for file_path, content_id in unique_attachments(attachments):
+        message.add_file(file_path, content_id)
+    return message.finish()
@@ -0,0 +1,271 @@
+"""
+PyBranch - Modern SMTP Email Client
+Copyright (C) 2025 Nagusame CS
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+from message_builder import envelope_recipients
+from delivery import DeliveryReport
+from mail_core import send_message
+
+_STOP = object()
+
+
+class CredentialsUnavailable(Exception):
+    """Raised when no account is stored yet, the job stays queued"""
+
+
+class Outbox:
+    """Persistent on-disk queue of outgoing messages drained by a worker thread
+
+    Each message is one JSON file in the outbox directory, so anything still
+    queued when the app exits is picked up again on the next start. Only the
+    credential service name is stored, never the password. Recipients that
+    are still deferred after the in-line retries stay in the job's envelope
+    and are retried after retry_delay seconds, or on the next start, until
+    the job is max_age seconds old. Then they count as rejected, like an MTA
+    bouncing mail it couldn't deliver for days. A job that failed is
+    reported once and then removed.
+    """
+
+    def __init__(self, pool, creds_manager, directory="outbox", on_result=None,
+                 image_optimizer=None, retry_delay=300, max_recipients=None,
+                 max_age=3 * 86400):
+        self.pool = pool
+        self.creds_manager = creds_manager
+        self.image_optimizer = image_optimizer
+        self.directory = directory
+        self.on_result = on_result      # on_result(job_id, report), called from the worker thread
+        self.retry_delay = retry_delay
+        self.max_age = max_age
+        self.max_recipients = max_recipients    # RCPT limit override, else per provider
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._active = set()    # ids queued, being sent or waiting for a retry
+        self._timers = {}       # job id -> Timer of a scheduled retry
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _job_path(self, job_id):
+        return os.path.join(self.directory, f"{job_id}.json")
+
+    def _write_job(self, job):
+        """Write a job file atomically so a crash never leaves half a message"""
+        path = self._job_path(job['id'])
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(job, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _remove_job(self, job_id):
+        try:
+            os.remove(self._job_path(job_id))
+        except OSError as e:
+            print(f"Error removing outbox job {job_id}: {e}")
+
+    @staticmethod
+    def _age(job_id):
+        """Seconds since the job was queued, from the time stamp in its id"""
+        try:
+            return time.time() - int(job_id.split("-", 1)[0]) / 1e9
+        except ValueError:
+            return 0
+
+    def _read_job(self, job_id):
+        with open(self._job_path(job_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def enqueue(self, recipients, subject, html, attachments=(), service="smtp_client",
+                optimize_images=False):
+        """Persist a message and hand it to the worker, returns the job id"""
+        # Time-ordered ids keep resume order the same as submission order
+        job_id = f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}"
+        job = {
+            'id': job_id,
+            'service': service,
+            'recipients': recipients,
+            'subject': subject,
+            'html': html,
+            'attachments': [list(a) for a in attachments],
+            'optimize_images': optimize_images,
+            'envelope': envelope_recipients(recipients),   # recipients still to deliver
+            'report': DeliveryReport().to_dict(),
+            'status': 'pending',
+        }
+        self._write_job(job)
+        self._queue_job(job_id)
+        return job_id
+
+    def _queue_job(self, job_id):
+        """Hand a job to the worker unless it's already queued or scheduled"""
+        with self._lock:
+            if job_id in self._active:
+                return
+            self._active.add(job_id)
+        self._queue.put(job_id)
+
+    def _retry(self, job_id):
+        with self._lock:
+            self._timers.pop(job_id, None)
+        self._queue.put(job_id)     # still in _active since it was deferred
+
+    def _finish(self, job_id):
+        with self._lock:
+            self._active.discard(job_id)
+
+    def pending(self):
+        """Ids of jobs still waiting or deferred on disk, oldest first"""
+        job_ids = []
+        for name in sorted(os.listdir(self.directory)):
+            if not name.endswith(".json"):
+                continue
+            job_id = name[:-len(".json")]
+            try:
+                status = self._read_job(job_id).get('status')
+                if status in ('pending', 'deferred'):
+                    job_ids.append(job_id)
+                elif status == 'failed':
+                    # Left by older versions, the failure was reported back then
+                    self._remove_job(job_id)
+            except (OSError, ValueError) as e:
+                print(f"Error reading outbox job {name}: {e}")
+        return job_ids
+
+    def report(self, job_id):
+        """Delivery report of a job still on disk, None once it was fully sent"""
+        try:
+            return DeliveryReport.from_dict(self._read_job(job_id).get('report') or {})
+        except (OSError, ValueError):
+            return None
+
+    def start(self):
+        """Resume jobs left over from a previous run and start the worker"""
+        if self._thread and self._thread.is_alive():
+            return
+        self.resume()
+        self._thread = threading.Thread(target=self._run, name="outbox-worker", daemon=True)
+        self._thread.start()
+
+    def resume(self):
+        """Re-queue pending jobs, e.g. after credentials become available
+
+        Jobs already queued or waiting for their retry_delay are left alone.
+        """
+        for job_id in self.pending():
+            self._queue_job(job_id)
+
+    def stop(self, timeout=2):
+        """Stop the worker, unsent jobs stay on disk for the next start"""
+        with self._lock:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+        if self._thread and self._thread.is_alive():
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+        with self._lock:
+            self._active.clear()
+
+    def _run(self):
+        while True:
+            job_id = self._queue.get()
+            if job_id is _STOP:
+                return
+            try:
+                job = self._read_job(job_id)
+            except (OSError, ValueError):
+                self._finish(job_id)
+                continue  # already sent or removed
+            if job.get('status') not in ('pending', 'deferred'):
+                self._finish(job_id)
+                continue
+            report = DeliveryReport.from_dict(job.get('report') or {})
+            first_attempt = report.attempts == 0
+            try:
+                self._send(job, report)
+            except CredentialsUnavailable:
+                self._finish(job_id)
+                continue  # picked up again by resume() after login
+            except Exception as e:
+                report.error = str(e)
+                job['status'] = 'failed'
+            else:
+                job['envelope'] = list(report.deferred)
+                job['status'] = 'deferred' if report.deferred else 'sent'
+                if job['status'] == 'deferred' and self._age(job_id) > self.max_age:
+                    # Out of time, the last transient reply becomes final
+                    report.rejected.update(report.deferred)
+                    report.deferred.clear()
+                    job['status'] = 'failed'
+            job['report'] = report.to_dict()
+            if job['status'] == 'deferred':
+                try:
+                    self._write_job(job)
+                except OSError as e:
+                    print(f"Error saving outbox job {job_id}: {e}")
+                timer = threading.Timer(self.retry_delay, self._retry, (job_id,))
+                timer.daemon = True
+                with self._lock:
+                    self._timers[job_id] = timer
+                timer.start()
+            elif job['status'] == 'sent':
+                self._remove_job(job_id)
+                self._finish(job_id)
+            # Background retries of deferred recipients only report the final outcome
+            if first_attempt or job['status'] != 'deferred':
+                self._notify(job_id, report)
+            if job['status'] == 'failed':
+                # Reported, and there is nothing left to retry
+                self._remove_job(job_id)
+                self._finish(job_id)
+
+    def _send(self, job, report):
+        service = job['service']
+        sender = self.creds_manager.get_credential(service, "email")
+        password = self.creds_manager.get_credential(service, "password")
+        if not sender or not password:
+            raise CredentialsUnavailable(service)
+        # Only recipients not yet delivered are put on the envelope
+        send_message(
+            self.pool,
+            self.creds_manager.get_credential(service, "server"),
+            self.creds_manager.get_credential(service, "port"),
+            sender,
+            password,
+            job['recipients'],
+            job['subject'],
+            job['html'],
+            [tuple(a) for a in job['attachments']],
+            report=report,
+            envelope=job.get('envelope'),
+            image_optimizer=self.image_optimizer if job.get('optimize_images') else None,
+            max_recipients=self.max_recipients
+        )
+
+    def _notify(self, job_id, report):
+        if self.on_result:
+            try:
+                self.on_result(job_id, report)
+            except Exception as e:
+                print(f"Error in outbox callback: {e}")
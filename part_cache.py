@@ -0,0 +1,128 @@
+"""
+PyBranch - Modern SMTP Email Client
+Copyright (C) 2025 Nagusame CS
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import base64
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def encode_base64_lines(data):
+    """Base64 with 76-char CRLF lines, the form used on the wire"""
+    return base64.encodebytes(data).replace(b'\n', b'\r\n')
+
+
+class PartCache:
+    """Content-addressed LRU cache of base64-encoded attachment bodies
+
+    Files are identified by the SHA-256 of their contents, so the same image
+    picked from two places or referenced twice is encoded once. A small stat
+    index (path, size, mtime) avoids re-hashing unchanged files on re-sends.
+    Files larger than max_entry_bytes are hashed but not cached, the message
+    builder streams those from disk instead.
+    """
+
+    def __init__(self, max_bytes=64 * 1024 * 1024, max_entry_bytes=8 * 1024 * 1024,
+                 max_index_entries=4096):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self.max_index_entries = max_index_entries
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._parts = OrderedDict()     # digest -> encoded bytes
+        self._index = OrderedDict()     # (path, size, mtime_ns) -> digest
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _stat_key(file_path):
+        st = os.stat(file_path)
+        return (os.path.realpath(file_path), st.st_size, st.st_mtime_ns)
+
+    def digest(self, file_path):
+        """SHA-256 hex digest of the file, small files get encoded on the way"""
+        stat_key = self._stat_key(file_path)
+        with self._lock:
+            digest = self._index.get(stat_key)
+            if digest is not None:
+                self._index.move_to_end(stat_key)
+                return digest
+
+        if stat_key[1] <= self.max_entry_bytes:
+            # One read gives both the hash and the encoded part
+            with open(file_path, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()
+            self._store(digest, data)
+        else:
+            sha = hashlib.sha256()
+            with open(file_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                    sha.update(chunk)
+            digest = sha.hexdigest()
+
+        with self._lock:
+            self._index[stat_key] = digest
+            while len(self._index) > self.max_index_entries:
+                self._index.popitem(last=False)
+        return digest
+
+    def _store(self, digest, data):
+        with self._lock:
+            if digest in self._parts:
+                return
+        encoded = encode_base64_lines(data)
+        with self._lock:
+            if digest in self._parts or len(encoded) > self.max_bytes:
+                return
+            self._parts[digest] = encoded
+            self.current_bytes += len(encoded)
+            while self.current_bytes > self.max_bytes:
+                _, evicted = self._parts.popitem(last=False)
+                self.current_bytes -= len(evicted)
+
+    def encoded(self, file_path):
+        """Encoded body for file_path, or None if it is too large to cache"""
+        digest = self.digest(file_path)
+        with self._lock:
+            encoded = self._parts.get(digest)
+            if encoded is not None:
+                self._parts.move_to_end(digest)
+                self.hits += 1
+                return encoded
+            self.misses += 1
+        if os.path.getsize(file_path) > self.max_entry_bytes:
+            return None
+        # Evicted since it was hashed, encode it again
+        with open(file_path, 'rb') as f:
+            self._store(digest, f.read())
+        with self._lock:
+            return self._parts.get(digest)
+
+    def clear(self):
+        with self._lock:
+            self._parts.clear()
+            self._index.clear()
+            self.current_bytes = 0
+
+
+# Shared by the compose window, the outbox worker and mail merge
+PART_CACHE = PartCache()
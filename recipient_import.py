@@ -0,0 +1,156 @@
+"""
+PyBranch - Modern SMTP Email Client
+Copyright (C) 2025 Nagusame CS
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import csv
+import itertools
+from email.utils import parseaddr
+
+from mail_core import EMAIL_PATTERN
+from mail_merge import EMAIL_COLUMNS, iter_recipient_rows, row_recipients
+
+# Rows normalized and validated per batch before progress is reported
+IMPORT_BATCH_SIZE = 5000
+# Invalid entries kept to show the user, the rest are only counted
+INVALID_SAMPLE_SIZE = 20
+
+
+def normalize_address(raw):
+    """Bare address from 'Name <addr>' or '<addr>', with the domain lowercased"""
+    address = parseaddr(raw)[1] if '<' in raw else raw
+    address = address.strip().strip('"\'')
+    local, at, domain = address.rpartition('@')
+    if not at:
+        return address
+    return f"{local}@{domain.lower()}"
+
+
+class RecipientTable:
+    """Deduplicated recipient lists held outside the Tk widgets
+
+    Addresses are kept once per table, compared case-insensitively, in the
+    to/cc/bcc list they were first seen in. Counters describe the import
+    so the UI can show a summary instead of the addresses themselves.
+    """
+
+    def __init__(self):
+        self.fields = {'to': [], 'cc': [], 'bcc': []}
+        self._seen = set()
+        self.rows = 0
+        self.duplicates = 0
+        self.invalid = 0
+        self.invalid_sample = []
+
+    def __len__(self):
+        return len(self._seen)
+
+    def add_batch(self, entries):
+        """Validate and add (field, raw address) pairs, returns how many were new"""
+        added = 0
+        match = EMAIL_PATTERN.match
+        for field, raw in entries:
+            address = normalize_address(raw)
+            if not match(address):
+                self.invalid += 1
+                if len(self.invalid_sample) < INVALID_SAMPLE_SIZE:
+                    self.invalid_sample.append(raw)
+                continue
+            key = address.lower()
+            if key in self._seen:
+                self.duplicates += 1
+                continue
+            self._seen.add(key)
+            self.fields[field].append(address)
+            added += 1
+        return added
+
+    def recipients(self):
+        """to/cc/bcc dict in the shape parse_recipients() returns"""
+        return {field: list(addresses) for field, addresses in self.fields.items()}
+
+    def sample(self, count=3):
+        sample = []
+        for addresses in self.fields.values():
+            sample.extend(addresses[:count - len(sample)])
+        return sample
+
+    def summary(self):
+        if not self.rows:
+            return ""
+        text = f"{len(self):,} recipients"
+        extras = []
+        if self.duplicates:
+            extras.append(f"{self.duplicates:,} duplicates")
+        if self.invalid:
+            extras.append(f"{self.invalid:,} invalid")
+        if extras:
+            text += f" ({', '.join(extras)} skipped)"
+        sample = self.sample()
+        if sample:
+            text += ": " + ", ".join(sample) + ("…" if len(self) > len(sample) else "")
+        return text
+
+
+def iter_import_rows(file_path):
+    """to/cc/bcc dict per row of a recipient list
+
+    Unlike a merge table, a CSV without an address column header is a
+    plain list: every cell that looks like an address is a recipient.
+    """
+    if file_path.lower().endswith('.csv'):
+        with open(file_path, 'r', newline='', encoding='utf-8') as file:
+            reader = csv.reader(file)
+            first = next(reader, None)
+            if first is None:
+                return
+            if not any(cell.strip().lower() in EMAIL_COLUMNS for cell in first):
+                for values in itertools.chain([first], reader):
+                    recipients = {'to': [], 'cc': [], 'bcc': []}
+                    for cell in values:
+                        if '@' in cell:
+                            for field, addresses in row_recipients({'email': cell}).items():
+                                recipients[field].extend(addresses)
+                    yield recipients
+                return
+    for row in iter_recipient_rows(file_path):
+        yield row_recipients(row)
+
+
+def import_recipients(file_path, progress=None, cancel=None, batch_size=IMPORT_BATCH_SIZE):
+    """Stream a TXT/CSV/JSON/JSON-lines list into a new RecipientTable
+
+    Runs on a worker thread: rows are parsed incrementally, then normalized,
+    validated and deduplicated one batch at a time. progress(table) is
+    called after every batch, cancel is an optional threading.Event.
+    """
+    table = RecipientTable()
+    batch = []
+    for recipients in iter_import_rows(file_path):
+        table.rows += 1
+        for field, addresses in recipients.items():
+            batch.extend((field, address) for address in addresses)
+        if len(batch) >= batch_size:
+            table.add_batch(batch)
+            batch = []
+            if progress:
+                progress(table)
+            if cancel is not None and cancel.is_set():
+                return table
+    table.add_batch(batch)
+    if progress:
+        progress(table)
+    return table
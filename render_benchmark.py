@@ -0,0 +1,141 @@
+"""
+PyBranch - Modern SMTP Email Client
+Copyright (C) 2025 Nagusame CS
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+# Compares the compiled body renderer (mail_core.compile_body) and the
+# compiled {{field}} templates (mail_merge.render) with the sequential
+# re.sub passes they replaced, checking the output first.
+
+import argparse
+import html
+import os
+import re
+import tempfile
+import time
+
+import mail_core
+import mail_merge
+
+
+def legacy_process_message_body(text, attachments):
+    """The old convert_links() + five re.sub passes, kept for comparison"""
+    text = re.sub(r'(https?://\S+)', r'<a href="\1">\1</a>', text)
+    text = re.sub(r'\{link\}\{(.*?)\}\{(.*?)\}', r'<a href="\2">\1</a>', text)
+    text = re.sub(r'\{link\}\{(.*?)\}', r'<a href="\1">\1</a>', text)
+    text = re.sub(r'\{img\}\{(.*?)\}',
+                  lambda m: mail_core.embed_image(m.group(1), attachments), text)
+    text = re.sub(r'\{embed\}\{(.*?)\}', lambda m: f'[Embedded Attachment: {m.group(1)}]', text)
+    text = re.sub(r'\{attach\}\{(.*?)\}', lambda m: f'[Attachment: {m.group(1)}]', text)
+    return text
+
+
+def legacy_render(template, row, escape=False):
+    def replace(match):
+        value = str(row.get(match.group(1), ''))
+        return html.escape(value) if escape else value
+    return mail_merge.FIELD_PATTERN.sub(replace, template)
+
+
+def sample_cases(image_path):
+    return [
+        "",
+        "plain text only",
+        "Visit https://example.com/page?x=1 today\nand http://foo.bar too",
+        "{link}{Our site}{mailto:team@example.com} and {link}{ftp-mirror}",
+        f"Logo: {{img}}{{{image_path}}} twice {{img}}{{{image_path}}}",
+        "{img}{/no/such/file.png}",
+        "{embed}{report.pdf} then {attach}{data.csv}",
+        "Hi {{name}}, your code is {{ code }} - {link}{docs}{/help}",
+        "{link}{a}{b}{c} {link}{x} trailing {",
+        "line one\n{attach}{a}\n{embed}{b}\nhttps://x.y/z",
+    ]
+
+
+# URLs inside {link} markup were wrapped twice by the old passes, the
+# compiled renderer links them once, so these are expected to differ
+FIXED_CASES = [
+    "{link}{Docs}{https://example.com/docs}",
+    "{link}{https://example.com}",
+]
+
+
+def timed(func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the message body renderer")
+    parser.add_argument("--paragraphs", type=int, default=200, help="size of the long body")
+    parser.add_argument("--rows", type=int, default=5000, help="mail merge variants")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    handle, image_path = tempfile.mkstemp(suffix=".png", prefix="pybranch-bench-")
+    with os.fdopen(handle, "wb") as f:
+        f.write(b"\x89PNG\r\n\x1a\n" + os.urandom(2048))
+
+    try:
+        mismatches = 0
+        for text in sample_cases(image_path):
+            old_attachments, new_attachments = [], []
+            old = legacy_process_message_body(text, old_attachments)
+            new = mail_core.process_message_body(text, new_attachments)
+            if old != new or old_attachments != new_attachments:
+                mismatches += 1
+                print(f"MISMATCH for {text!r}:\n  old: {old!r}\n  new: {new!r}")
+        print(f"output check: {len(sample_cases(image_path)) - mismatches} identical, "
+              f"{mismatches} different")
+        for text in FIXED_CASES:
+            print(f"fixed {text!r}:\n  old: {legacy_process_message_body(text, [])!r}"
+                  f"\n  new: {mail_core.process_message_body(text, [])!r}")
+
+        paragraph = ("Hello {{name}}, see https://example.com/offer and "
+                     "{link}{our terms}{/terms} or {attach}{terms.pdf}. "
+                     f"{{img}}{{{image_path}}}\n")
+        body = paragraph * args.paragraphs
+        print(f"\nlong body: {len(body):,} chars")
+        old = timed(lambda: legacy_process_message_body(body, []), args.repeat)
+        mail_core.compile_body(body)
+        new = timed(lambda: mail_core.process_message_body(body, []), args.repeat)
+        cold = timed(lambda: mail_core.CompiledBody(body).render([]), args.repeat)
+        print(f"process_message_body  old {old * 1000:8.2f} ms   "
+              f"new {new * 1000:8.2f} ms (cached)   {cold * 1000:8.2f} ms (uncached)")
+
+        html_body = mail_core.process_message_body(body, [])
+        rows = [{'name': f"Recipient {i} <&>", 'email': f"r{i}@example.com"}
+                for i in range(args.rows)]
+        assert all(legacy_render(html_body, row, True) == mail_merge.render(html_body, row, True)
+                   for row in rows[:50])
+        start = time.perf_counter()
+        for row in rows:
+            legacy_render(html_body, row, escape=True)
+        old = time.perf_counter() - start
+        start = time.perf_counter()
+        for row in rows:
+            mail_merge.render(html_body, row, escape=True)
+        new = time.perf_counter() - start
+        print(f"merge {args.rows} variants   old {old:8.3f} s    new {new:8.3f} s "
+              f"({old / new if new else 0:.1f}x)")
+    finally:
+        os.remove(image_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+"""
+PyBranch - Modern SMTP Email Client
+Copyright (C) 2025 Nagusame CS
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import smtplib
+import threading
+import time
+from contextlib import contextmanager
+
+from smtp_transport import send_message_file
+
+
+class _ReplyCounting:
+    """Counts server replies: until the first one of a borrowed use, no
+    transaction can have started and a retry can't send a message twice"""
+    replies = 0
+
+    def getreply(self):
+        reply = super().getreply()
+        self.replies += 1
+        return reply
+
+
+class _SMTP(_ReplyCounting, smtplib.SMTP):
+    pass
+
+
+class _SMTP_SSL(_ReplyCounting, smtplib.SMTP_SSL):
+    pass
+
+
+class _PooledSession:
+    """An authenticated SMTP session plus the bookkeeping the pool needs"""
+    def __init__(self, smtp, password):
+        self.smtp = smtp
+        self.password = password
+        self.created = time.monotonic()
+        self.last_used = self.created
+
+    def is_alive(self):
+        """Probe the socket with NOOP, returns False if the server is gone"""
+        try:
+            code, _ = self.smtp.noop()
+            return code == 250
+        except (smtplib.SMTPException, OSError):
+            return False
+
+    def close(self):
+        try:
+            self.smtp.quit()
+        except (smtplib.SMTPException, OSError):
+            try:
+                self.smtp.close()
+            except OSError:
+                pass
+
+
+class SMTPConnectionPool:
+    """Keeps authenticated SMTP sessions warm, keyed by (server, port, account)"""
+
+    def __init__(self, max_idle=2, keepalive_interval=60, idle_timeout=300,
+                 probe_after=15, timeout=30, ssl_context=None, require_tls=True):
+        self.max_idle = max_idle                    # idle sessions kept per key
+        self.keepalive_interval = keepalive_interval
+        self.idle_timeout = idle_timeout            # drop sessions unused this long
+        self.probe_after = probe_after              # NOOP before reuse after this idle time
+        self.timeout = timeout
+        self.ssl_context = ssl_context              # None uses smtplib's default
+        self.require_tls = require_tls              # refuse AUTH without STARTTLS
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._keepalive_thread = None
+
+    @staticmethod
+    def make_key(server, port, account):
+        return (server.strip().lower(), int(port), account.strip().lower())
+
+    def _connect(self, server, port, account, password):
+        """Open a new session and run the STARTTLS/AUTH handshake
+
+        Outside port 465 STARTTLS is required, a server that doesn't offer
+        it (or a network that strips it) would otherwise get the password
+        in cleartext.
+        """
+        port = int(port)
+        if port == 465:
+            smtp = _SMTP_SSL(server, port, timeout=self.timeout, context=self.ssl_context)
+        else:
+            smtp = _SMTP(server, port, timeout=self.timeout)
+        try:
+            if port != 465:
+                smtp.ehlo()
+                if smtp.has_extn('starttls'):
+                    smtp.starttls(context=self.ssl_context)
+                    smtp.ehlo()
+                elif self.require_tls:
+                    raise smtplib.SMTPNotSupportedError(
+                        f"{server} does not offer STARTTLS, not sending the password unencrypted")
+            smtp.login(account, password)
+        except Exception:
+            smtp.close()
+            raise
+        return _PooledSession(smtp, password)
+
+    def acquire(self, server, port, account, password):
+        """Borrow an authenticated session, reconnecting if the cached one died"""
+        key = self.make_key(server, port, account)
+        self._ensure_keepalive()
+        while True:
+            with self._lock:
+                sessions = self._idle.get(key)
+                session = sessions.pop() if sessions else None
+            if session is None:
+                return key, self._connect(server, port, account, password)
+            if session.password != password:
+                # Credentials changed since this session was authenticated
+                session.close()
+                continue
+            if time.monotonic() - session.last_used > self.probe_after and not session.is_alive():
+                session.close()
+                continue
+            return key, session
+
+    def release(self, key, session, broken=False):
+        """Return a session to the pool, or close it if it is broken or surplus"""
+        if broken or self._closed.is_set():
+            session.close()
+            return
+        session.last_used = time.monotonic()
+        with self._lock:
+            sessions = self._idle.setdefault(key, [])
+            if len(sessions) < self.max_idle:
+                sessions.append(session)
+                return
+        session.close()
+
+    @contextmanager
+    def session(self, server, port, account, password):
+        """Context manager yielding a live smtplib.SMTP borrowed from the pool"""
+        key, session = self.acquire(server, port, account, password)
+        try:
+            yield session.smtp
+        except smtplib.SMTPServerDisconnected:
+            self.release(key, session, broken=True)
+            raise
+        except smtplib.SMTPResponseException as e:
+            # 421 means the server is closing the channel, anything else
+            # (a refused sender, a failed DATA) leaves the session usable
+            self.release(key, session, broken=e.smtp_code == 421 or not self._try_rset(session))
+            raise
+        except smtplib.SMTPException:
+            # e.g. every recipient refused, the transaction is reset
+            self.release(key, session, broken=not self._try_rset(session))
+            raise
+        except OSError:
+            # SMTPException subclasses OSError, so only socket errors get here
+            self.release(key, session, broken=True)
+            raise
+        except BaseException:
+            self.release(key, session, broken=not self._try_rset(session))
+            raise
+        else:
+            self.release(key, session)
+
+    @staticmethod
+    def _try_rset(session):
+        """Reset any half-finished transaction so the session can be reused"""
+        try:
+            session.smtp.rset()
+        except (smtplib.SMTPException, OSError):
+            return False
+        return True
+
+    def run(self, server, port, account, password, func):
+        """Call func(smtp) on a pooled session, retrying once on a stale socket
+
+        Only a disconnect before the server answered anything func sent is
+        retried. After a reply the transaction may be under way, and once
+        DATA was accepted a retry would deliver the message twice.
+        """
+        answered = False
+        try:
+            with self.session(server, port, account, password) as smtp:
+                smtp.replies = 0
+                try:
+                    return func(smtp)
+                finally:
+                    answered = smtp.replies > 0
+        except smtplib.SMTPServerDisconnected:
+            if answered:
+                raise
+            with self.session(server, port, account, password) as smtp:
+                return func(smtp)
+
+    def verify(self, server, port, account, password):
+        """Authenticate once and keep the session warm for later sends"""
+        self.run(server, port, account, password, lambda smtp: None)
+
+    def send_message(self, server, port, account, password, msg, from_addr=None, to_addrs=None):
+        """Send msg over a pooled session, returns the refused-recipients dict"""
+        return self.run(server, port, account, password,
+                        lambda smtp: smtp.send_message(msg, from_addr=from_addr, to_addrs=to_addrs))
+
+    def send_file(self, server, port, account, password, message_file, size=None,
+                  from_addr=None, to_addrs=None):
+        """Stream a pre-built message file over a pooled session"""
+        def send(smtp):
+            message_file.seek(0)  # rewind in case of a retry
+            return send_message_file(smtp, from_addr or account, to_addrs, message_file, size)
+        return self.run(server, port, account, password, send)
+
+    def _ensure_keepalive(self):
+        if self._keepalive_thread is None or not self._keepalive_thread.is_alive():
+            self._closed.clear()
+            self._keepalive_thread = threading.Thread(
+                target=self._keepalive_loop, name="smtp-keepalive", daemon=True)
+            self._keepalive_thread.start()
+
+    def _keepalive_loop(self):
+        while not self._closed.wait(self.keepalive_interval):
+            self.keepalive()
+
+    def keepalive(self):
+        """NOOP every idle session, dropping dead or expired ones"""
+        now = time.monotonic()
+        with self._lock:
+            snapshot = {key: list(sessions) for key, sessions in self._idle.items()}
+            for sessions in self._idle.values():
+                sessions.clear()
+        for key, sessions in snapshot.items():
+            alive = []
+            for session in sessions:
+                if now - session.last_used > self.idle_timeout or not session.is_alive():
+                    session.close()
+                else:
+                    alive.append(session)
+            with self._lock:
+                self._idle.setdefault(key, []).extend(alive)
+
+    def close_all(self):
+        """Stop the keepalive thread and close every idle session"""
+        self._closed.set()
+        with self._lock:
+            sessions = [s for group in self._idle.values() for s in group]
+            self._idle.clear()
+        for session in sessions:
+            session.close()
@@ -16,6 +16,9 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <https://www.gnu.org/licenses/>.
 """
 
+# RCPT limit per message for custom servers not listed below
+DEFAULT_MAX_RECIPIENTS = 50
+
 SMTP_SERVERS = {
     "Gmail": {
         "display_name": "Gmail",
@@ -25,6 +28,7 @@ SMTP_SERVERS = {
         "port": 587,
         "imap_port": 993,
         "requires_app_password": True,
+        "max_recipients": 100,
         "help_url": "https://support.google.com/accounts/answer/185833"
     },
     "Outlook/Hotmail": {
@@ -35,6 +39,7 @@ SMTP_SERVERS = {
         "port": 587,
         "imap_port": 993,
         "requires_app_password": False,
+        "max_recipients": 100,
         "help_url": ""
     },
     "Yahoo Mail": {
@@ -45,6 +50,7 @@ SMTP_SERVERS = {
         "port": 587,
         "imap_port": 993,
         "requires_app_password": True,
+        "max_recipients": 100,
         "help_url": "https://help.yahoo.com/kb/generate-third-party-passwords-sln15241.html"
     }
 }
@@ -0,0 +1,372 @@
+"""
+PyBranch - Modern SMTP Email Client
+Copyright (C) 2025 Nagusame CS
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import argparse
+import base64
+import datetime
+import os
+import random
+import socket
+import socketserver
+import ssl
+import tempfile
+import threading
+import time
+
+
+def generate_self_signed_cert(directory, hostname="localhost"):
+    """Write a throwaway self-signed cert/key pair, returns (certfile, keyfile)"""
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+
+    key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, hostname)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(days=1))
+        .not_valid_after(now + datetime.timedelta(days=30))
+        .add_extension(x509.SubjectAlternativeName([x509.DNSName(hostname)]), critical=False)
+        .sign(key, hashes.SHA256())
+    )
+    certfile = os.path.join(directory, "sink-cert.pem")
+    keyfile = os.path.join(directory, "sink-key.pem")
+    with open(certfile, "wb") as f:
+        f.write(cert.public_bytes(serialization.Encoding.PEM))
+    with open(keyfile, "wb") as f:
+        f.write(key.private_bytes(
+            serialization.Encoding.PEM,
+            serialization.PrivateFormat.TraditionalOpenSSL,
+            serialization.NoEncryption(),
+        ))
+    return certfile, keyfile
+
+
+class SinkConfig:
+    """Behaviour knobs for SMTPSink, rates are probabilities between 0 and 1"""
+
+    def __init__(self, latency=0.0, data_latency=0.0, throttle_rate=0.0,
+                 disconnect_rate=0.0, reject_rate=0.0, reject_domains=(),
+                 users=None, require_auth=False, keep_messages=False,
+                 pipelining=True, chunking=True, max_recipients=None):
+        self.latency = latency                  # delay before every reply
+        self.data_latency = data_latency        # extra delay before accepting a body
+        self.throttle_rate = throttle_rate      # 451 on RCPT
+        self.disconnect_rate = disconnect_rate  # 421 on MAIL, then hang up
+        self.reject_rate = reject_rate          # 550 on RCPT
+        self.reject_domains = {d.lower() for d in reject_domains}
+        self.users = users or {}                # account -> password, empty accepts any
+        self.require_auth = require_auth
+        self.keep_messages = keep_messages
+        self.pipelining = pipelining
+        self.chunking = chunking
+        self.max_recipients = max_recipients    # 452 past this many RCPTs
+
+
+class SinkStats:
+    def __init__(self):
+        self.connections = 0
+        self.messages = 0
+        self.bytes = 0
+        self.recipients = 0
+        self.throttled = 0
+        self.rejected = 0
+        self.disconnects = 0
+        self.stored = []
+        self._lock = threading.Lock()
+
+    def add(self, **counts):
+        with self._lock:
+            for name, value in counts.items():
+                setattr(self, name, getattr(self, name) + value)
+
+
+class _SinkHandler(socketserver.StreamRequestHandler):
+    """One SMTP conversation, reads through rfile so pipelined input just works"""
+
+    def setup(self):
+        # Replies are small writes, don't let Nagle hold them back
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        super().setup()
+        self.config = self.server.config
+        self.stats = self.server.stats
+        self.tls = False
+        self.authenticated = False
+        self._reset()
+
+    def _reset(self):
+        self.mail_from = None
+        self.rcpt_to = []
+        self.chunks = []
+
+    def reply(self, line):
+        if self.config.latency:
+            time.sleep(self.config.latency)
+        self.wfile.write(line.encode('utf-8') + b"\r\n")
+        self.wfile.flush()
+
+    def handle(self):
+        self.stats.add(connections=1)
+        self.reply("220 pybranch-sink ESMTP ready")
+        while True:
+            line = self.rfile.readline(65536)
+            if not line:
+                return
+            command, _, argument = line.decode('utf-8', 'replace').strip().partition(' ')
+            handler = getattr(self, f"do_{command.upper()}", None)
+            if handler is None:
+                self.reply("502 5.5.2 Command not recognized")
+            elif handler(argument) is False:
+                return
+
+    def do_EHLO(self, argument):
+        extensions = ["pybranch-sink", "SIZE 0", "8BITMIME"]
+        if self.config.pipelining:
+            extensions.append("PIPELINING")
+        if self.config.chunking:
+            extensions.append("CHUNKING")
+        if self.server.ssl_context and not self.tls:
+            extensions.append("STARTTLS")
+        extensions.append("AUTH PLAIN LOGIN")
+        for extension in extensions[:-1]:
+            self.wfile.write(f"250-{extension}\r\n".encode('ascii'))
+        self.reply(f"250 {extensions[-1]}")
+
+    def do_HELO(self, argument):
+        self.reply("250 pybranch-sink")
+
+    def do_STARTTLS(self, argument):
+        if not self.server.ssl_context or self.tls:
+            self.reply("454 4.7.0 TLS not available")
+            return
+        self.reply("220 2.0.0 Ready to start TLS")
+        self.request = self.server.ssl_context.wrap_socket(self.request, server_side=True)
+        self.connection = self.request
+        self.rfile = self.request.makefile('rb')
+        self.wfile = self.request.makefile('wb')
+        self.tls = True
+        self.authenticated = False
+        self._reset()
+
+    def _check_user(self, account, password):
+        users = self.config.users
+        return not users or users.get(account) == password
+
+    def do_AUTH(self, argument):
+        mechanism, _, initial = argument.partition(' ')
+        try:
+            if mechanism.upper() == 'PLAIN':
+                if not initial:
+                    self.reply("334 ")
+                    initial = self.rfile.readline().strip().decode('ascii')
+                _, account, password = base64.b64decode(initial).decode('utf-8').split('\0')
+            elif mechanism.upper() == 'LOGIN':
+                self.reply("334 VXNlcm5hbWU6")
+                account = base64.b64decode(self.rfile.readline().strip()).decode('utf-8')
+                self.reply("334 UGFzc3dvcmQ6")
+                password = base64.b64decode(self.rfile.readline().strip()).decode('utf-8')
+            else:
+                self.reply("504 5.5.4 Unrecognized authentication type")
+                return
+        except ValueError:
+            self.reply("501 5.5.2 Cannot decode response")
+            return
+        if self._check_user(account, password):
+            self.authenticated = True
+            self.reply("235 2.7.0 Authentication successful")
+        else:
+            self.reply("535 5.7.8 Authentication credentials invalid")
+
+    def do_MAIL(self, argument):
+        if self.config.require_auth and not self.authenticated:
+            self.reply("530 5.7.0 Authentication required")
+            return
+        if random.random() < self.config.disconnect_rate:
+            self.stats.add(disconnects=1)
+            self.reply("421 4.7.0 Too many connections, closing")
+            return False
+        self._reset()
+        self.mail_from = argument
+        self.reply("250 2.1.0 OK")
+
+    def do_RCPT(self, argument):
+        if self.mail_from is None:
+            self.reply("503 5.5.1 Need MAIL first")
+            return
+        address = argument.partition(':')[2].split(' ')[0].strip('<>')
+        if self.config.max_recipients and len(self.rcpt_to) >= self.config.max_recipients:
+            self.reply("452 4.5.3 Too many recipients")
+            return
+        if random.random() < self.config.throttle_rate:
+            self.stats.add(throttled=1)
+            self.reply("451 4.7.1 Try again later")
+            return
+        domain = address.rpartition('@')[2].lower()
+        if domain in self.config.reject_domains or random.random() < self.config.reject_rate:
+            self.stats.add(rejected=1)
+            self.reply("550 5.1.1 Mailbox unavailable")
+            return
+        self.rcpt_to.append(address)
+        self.reply("250 2.1.5 OK")
+
+    def do_DATA(self, argument):
+        if not self.rcpt_to:
+            self.reply("554 5.5.1 No valid recipients")
+            return
+        self.reply("354 End data with <CR><LF>.<CR><LF>")
+        size = 0
+        body = [] if self.config.keep_messages else None
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return False
+            if line == b".\r\n":
+                break
+            if line.startswith(b".."):
+                line = line[1:]
+            size += len(line)
+            if body is not None:
+                body.append(line)
+        self._accept(size, b"".join(body) if body is not None else None)
+
+    def do_BDAT(self, argument):
+        parts = argument.split()
+        size = int(parts[0])
+        data = self.rfile.read(size)
+        if not self.rcpt_to:
+            self.reply("554 5.5.1 No valid recipients")
+            return
+        self.chunks.append(data if self.config.keep_messages else len(data))
+        if len(parts) > 1 and parts[1].upper() == 'LAST':
+            if self.config.keep_messages:
+                self._accept(sum(len(c) for c in self.chunks), b"".join(self.chunks))
+            else:
+                self._accept(sum(self.chunks), None)
+        else:
+            self.reply(f"250 2.0.0 {size} octets received")
+
+    def _accept(self, size, body):
+        if self.config.data_latency:
+            time.sleep(self.config.data_latency)
+        self.stats.add(messages=1, bytes=size, recipients=len(self.rcpt_to))
+        if body is not None:
+            with self.stats._lock:
+                self.stats.stored.append((self.mail_from, list(self.rcpt_to), body))
+        self._reset()
+        self.reply("250 2.0.0 Message accepted")
+
+    def do_RSET(self, argument):
+        self._reset()
+        self.reply("250 2.0.0 OK")
+
+    def do_NOOP(self, argument):
+        self.reply("250 2.0.0 OK")
+
+    def do_QUIT(self, argument):
+        self.reply("221 2.0.0 Bye")
+        return False
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Local stand-in SMTP server for benchmarks and tests
+
+    Accepts everything by default and only counts it. STARTTLS is offered
+    when a certificate is given (or tls=True generates a self-signed one),
+    and SinkConfig injects latency, throttling and rejections.
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0, config=None, tls=False,
+                 certfile=None, keyfile=None):
+        super().__init__((host, port), _SinkHandler)
+        self.config = config or SinkConfig()
+        self.stats = SinkStats()
+        self.ssl_context = None
+        self._thread = None
+        if tls or certfile:
+            if not certfile:
+                certfile, keyfile = generate_self_signed_cert(tempfile.mkdtemp(prefix="pybranch-sink-"))
+            self.ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+            self.ssl_context.load_cert_chain(certfile, keyfile)
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def start(self):
+        """Serve on a background thread, returns self for chaining"""
+        self._thread = threading.Thread(target=self.serve_forever, name="smtp-sink", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local SMTP sink for PyBranch load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=2525)
+    parser.add_argument("--tls", action="store_true", help="offer STARTTLS with a self-signed cert")
+    parser.add_argument("--certfile")
+    parser.add_argument("--keyfile")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--data-latency", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--disconnect-rate", type=float, default=0.0)
+    parser.add_argument("--reject-rate", type=float, default=0.0)
+    parser.add_argument("--reject-domain", action="append", default=[])
+    parser.add_argument("--max-recipients", type=int)
+    parser.add_argument("--require-auth", action="store_true")
+    args = parser.parse_args()
+
+    config = SinkConfig(
+        latency=args.latency,
+        data_latency=args.data_latency,
+        throttle_rate=args.throttle_rate,
+        disconnect_rate=args.disconnect_rate,
+        reject_rate=args.reject_rate,
+        reject_domains=args.reject_domain,
+        require_auth=args.require_auth,
+        max_recipients=args.max_recipients,
+    )
+    sink = SMTPSink(args.host, args.port, config, tls=args.tls,
+                    certfile=args.certfile, keyfile=args.keyfile)
+    print(f"SMTP sink listening on {args.host}:{sink.port}", flush=True)
+    try:
+        sink.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        s = sink.stats
+        print(f"{s.messages} messages, {s.bytes} bytes, {s.recipients} recipients, "
+              f"{s.throttled} throttled, {s.rejected} rejected, {s.disconnects} disconnects")
+        sink.server_close()
+
+
+if __name__ == "__main__":
+    main()
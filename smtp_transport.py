@@ -0,0 +1,186 @@
+"""
+PyBranch - Modern SMTP Email Client
+Copyright (C) 2025 Nagusame CS
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 3 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <https://www.gnu.org/licenses/>.
+"""
+
+import smtplib
+
+# Bytes handed to the socket per send() call while streaming DATA
+SEND_BUFFER_SIZE = 64 * 1024
+# Size of each BDAT chunk when the server advertises CHUNKING (RFC 3030)
+BDAT_CHUNK_SIZE = 1024 * 1024
+
+
+def _mail_options(smtp, size):
+    options = []
+    if size is not None and smtp.does_esmtp and smtp.has_extn('size'):
+        options.append(f"size={size}")
+    return options
+
+
+def _check_mail_reply(smtp, code, resp, from_addr):
+    if code != 250:
+        if code == 421:
+            smtp.close()
+        else:
+            smtp._rset()
+        raise smtplib.SMTPSenderRefused(code, resp, from_addr)
+
+
+def _check_rcpt_replies(smtp, to_addrs, replies):
+    """Build the refused dict from RCPT replies, raise if nobody was accepted"""
+    refused = {}
+    for address, (code, resp) in zip(to_addrs, replies):
+        if code not in (250, 251):
+            refused[address] = (code, resp)
+        if code == 421:
+            smtp.close()
+            raise smtplib.SMTPRecipientsRefused(refused)
+    if len(refused) == len(to_addrs):
+        smtp._rset()
+        raise smtplib.SMTPRecipientsRefused(refused)
+    return refused
+
+
+def _start_transaction(smtp, from_addr, to_addrs, size=None):
+    """MAIL FROM plus one RCPT TO per address, one round trip each"""
+    code, resp = smtp.mail(from_addr, _mail_options(smtp, size))
+    _check_mail_reply(smtp, code, resp, from_addr)
+    replies = [smtp.rcpt(address) for address in to_addrs]
+    return _check_rcpt_replies(smtp, to_addrs, replies)
+
+
+def _start_pipelined(smtp, from_addr, to_addrs, size=None, with_data=False):
+    """Send MAIL, every RCPT (and optionally DATA) in one write (RFC 2920)
+
+    Replies are then read back in order, so the whole envelope costs a
+    single round trip instead of one per recipient.
+    """
+    options = _mail_options(smtp, size)
+    commands = [f"MAIL FROM:{smtplib.quoteaddr(from_addr)}"
+                + (" " + " ".join(options) if options else "")]
+    commands += [f"RCPT TO:{smtplib.quoteaddr(address)}" for address in to_addrs]
+    if with_data:
+        commands.append("DATA")
+    smtp.send("".join(f"{command}\r\n" for command in commands))
+
+    mail_reply = smtp.getreply()
+    rcpt_replies = [smtp.getreply() for _ in to_addrs]
+    data_reply = smtp.getreply() if with_data else None
+
+    if mail_reply[0] != 250 or all(code not in (250, 251) for code, _ in rcpt_replies):
+        if data_reply and data_reply[0] == 354:
+            # Server accepted DATA anyway, close it with an empty body
+            smtp.send(b".\r\n")
+            smtp.getreply()
+    _check_mail_reply(smtp, mail_reply[0], mail_reply[1], from_addr)
+    refused = _check_rcpt_replies(smtp, to_addrs, rcpt_replies)
+    return refused, data_reply
+
+
+def _stream_body(smtp, message_file):
+    """Send the dot-stuffed body and terminator once DATA got its 354"""
+    buffer = bytearray()
+    last_line = b''
+    for line in message_file:
+        if line.startswith(b'.'):
+            buffer += b'.'
+        buffer += line
+        last_line = line
+        if len(buffer) >= SEND_BUFFER_SIZE:
+            smtp.send(bytes(buffer))
+            buffer.clear()
+    if not last_line.endswith(b'\r\n'):
+        buffer += b'\r\n'
+    buffer += b'.\r\n'
+    smtp.send(bytes(buffer))
+    _check_final_reply(smtp, *smtp.getreply())
+
+
+def _check_final_reply(smtp, code, resp):
+    if code != 250:
+        if code == 421:
+            smtp.close()
+        else:
+            smtp._rset()
+        raise smtplib.SMTPDataError(code, resp)
+
+
+def _check_data_reply(code, resp):
+    if code != 354:
+        raise smtplib.SMTPDataError(code, resp)
+
+
+def _send_bdat(smtp, message_file, pipelining):
+    """Send the raw message as BDAT chunks, no dot-stuffing needed (RFC 3030)
+
+    With PIPELINING the next chunk goes out before the previous reply is
+    read, keeping at most one chunk in flight.
+    """
+    pending = 0
+    failure = None
+    chunk = message_file.read(BDAT_CHUNK_SIZE)
+    while True:
+        next_chunk = message_file.read(BDAT_CHUNK_SIZE)
+        last = not next_chunk
+        smtp.send(f"BDAT {len(chunk)}{' LAST' if last else ''}\r\n".encode('ascii') + chunk)
+        pending += 1
+        # Read replies down to one in flight, or all of them at the end
+        keep = 1 if pipelining and not last else 0
+        while pending > keep:
+            reply = smtp.getreply()
+            pending -= 1
+            if reply[0] != 250 and failure is None:
+                failure = reply
+        if failure is not None:
+            while pending:
+                smtp.getreply()
+                pending -= 1
+            _check_final_reply(smtp, *failure)
+        if last:
+            return
+        chunk = next_chunk
+
+
+def send_message_file(smtp, from_addr, to_addrs, message_file, size=None):
+    """Like SMTP.sendmail() but streams the message from a file object
+
+    The message is never held in memory as a whole, it is read from
+    message_file (see message_builder.build_message_file). PIPELINING and
+    CHUNKING are used when the server's EHLO advertises them, otherwise this
+    behaves like plain smtplib. Returns the refused-recipients dict the same
+    way sendmail() does.
+    """
+    smtp.ehlo_or_helo_if_needed()
+    pipelining = smtp.does_esmtp and smtp.has_extn('pipelining')
+    chunking = smtp.does_esmtp and smtp.has_extn('chunking')
+
+    if pipelining:
+        refused, data_reply = _start_pipelined(smtp, from_addr, to_addrs, size,
+                                               with_data=not chunking)
+    else:
+        refused, data_reply = _start_transaction(smtp, from_addr, to_addrs, size), None
+
+    if chunking:
+        _send_bdat(smtp, message_file, pipelining)
+        return refused
+
+    if data_reply is None:
+        smtp.putcmd("data")
+        data_reply = smtp.getreply()
+    _check_data_reply(*data_reply)
+    _stream_body(smtp, message_file)
+    return refused
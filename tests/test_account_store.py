@@ -0,0 +1,58 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from account_store import INDEX_FIELDS, open_account_store
+from credentials_manager import CredentialsManager
+
+
+class OpenAccountStoreTest(unittest.TestCase):
+    def setUp(self):
+        # CredentialsManager keeps its files in the working directory
+        self.cwd = os.getcwd()
+        self.directory = tempfile.mkdtemp()
+        os.chdir(self.directory)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.directory)
+
+    def test_legacy_store_round_trips(self):
+        accounts = {
+            'smtp_client': {'email': 'me@example.com', 'server': 'smtp.example.com',
+                            'port': '587', 'password': 'secret'},
+            'work': {'email': 'me@work.example', 'password': 'other'},
+        }
+        legacy = CredentialsManager()
+        for service, values in accounts.items():
+            legacy.save_many(service, values)
+        legacy.close()
+
+        store = open_account_store()
+        for service, values in accounts.items():
+            account = store.get_account(service)
+            self.assertEqual({k: v for k, v in account.items() if v is not None}, values)
+            self.assertEqual(store.get_credential(service, 'password'), values['password'])
+        # Only the index fields are readable without the key
+        with open(store.index_file, encoding='utf-8') as f:
+            index = f.read()
+        self.assertNotIn('secret', index)
+        self.assertIn('smtp.example.com', index)
+        self.assertEqual(set(store.accounts()['work']), set(INDEX_FIELDS))
+
+        self.assertFalse(os.path.exists('credentials.enc'))
+        self.assertTrue(os.path.exists('credentials.enc.bak'))
+
+    def test_existing_index_is_not_reimported(self):
+        store = open_account_store()
+        legacy = CredentialsManager()
+        legacy.save_many('late', {'email': 'late@example.com', 'password': 'x'})
+        legacy.close()
+        store = open_account_store()
+        self.assertIsNone(store.get_account('late'))
+        self.assertTrue(os.path.exists('credentials.enc'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from recipient_import import import_recipients
+
+
+class ImportRecipientsTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, text):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8', newline='') as f:
+            f.write(text)
+        return path
+
+    def test_headerless_csv_takes_every_address_cell(self):
+        path = self.write("list.csv", "a@x.com,b@x.com,c@x.com\nd@x.com,e@x.com\n")
+        table = import_recipients(path)
+        self.assertEqual(table.fields['to'], ['a@x.com', 'b@x.com', 'c@x.com', 'd@x.com', 'e@x.com'])
+        self.assertEqual(table.rows, 2)
+
+    def test_headerless_csv_skips_names_and_duplicates(self):
+        path = self.write("list.csv", "Ann,ann@x.com\nBob,BOB@x.com,ann@X.com\n")
+        table = import_recipients(path)
+        self.assertEqual(table.fields['to'], ['ann@x.com', 'BOB@x.com'])
+        self.assertEqual(table.duplicates, 1)
+
+    def test_csv_with_header_uses_the_email_column(self):
+        path = self.write("list.csv", "name,email,cc\nAnn,ann@x.com,c@x.com\n")
+        table = import_recipients(path)
+        self.assertEqual(table.fields['to'], ['ann@x.com'])
+        self.assertEqual(table.fields['cc'], ['c@x.com'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import smtplib
+import unittest
+from email.message import EmailMessage
+
+from smtp_pool import SMTPConnectionPool
+from smtp_sink import SinkConfig, SMTPSink
+
+
+def _message(to):
+    msg = EmailMessage()
+    msg['From'] = "me@example.com"
+    msg['To'] = to
+    msg['Subject'] = "Pool test"
+    msg.set_content("Hello")
+    return msg
+
+
+class SessionReuseTest(unittest.TestCase):
+    def setUp(self):
+        self.sink = SMTPSink(config=SinkConfig(reject_domains=["refused.example"])).start()
+        # The local sink offers no STARTTLS
+        self.pool = SMTPConnectionPool(require_tls=False)
+
+    def tearDown(self):
+        self.pool.close_all()
+        self.sink.stop()
+
+    def send(self, to):
+        return self.pool.send_message("127.0.0.1", self.sink.port, "me@example.com", "secret",
+                                      _message(to), to_addrs=[to])
+
+    def test_refused_recipient_keeps_the_session(self):
+        self.send("a@ok.example")
+        for _ in range(3):
+            with self.assertRaises(smtplib.SMTPRecipientsRefused):
+                self.send("b@refused.example")
+        self.send("c@ok.example")
+        self.assertEqual(self.sink.stats.connections, 1)
+        self.assertEqual(self.sink.stats.messages, 2)
+
+    def test_plain_auth_needs_starttls(self):
+        pool = SMTPConnectionPool()
+        with self.assertRaises(smtplib.SMTPNotSupportedError):
+            pool.verify("127.0.0.1", self.sink.port, "me@example.com", "secret")
+        pool.close_all()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,417 @@
+import os
+import queue
+import socket
+import threading
+import tkinter as tk
+from tkinter import ttk, filedialog
+from datetime import datetime
+from styles import COLORS, PADDING, FONTS
+from ui.virtual_list import VirtualList
+from imap_sync import ImapSync
+from imap_idle import IdleListener
+from mail_search import search_local, search_server, server_criteria, parse_query
+
+# Message list rows read from the cache per query
+PAGE_ROWS = 200
+# Pages of rows kept in memory
+CACHED_PAGES = 8
+# Milliseconds of typing pause before a search runs
+SEARCH_DELAY = 300
+
+SORT_CHOICES = {
+    'Newest first': ('date', True),
+    'Oldest first': ('date', False),
+    'Sender': ('sender', False),
+    'Subject': ('subject', False),
+    'Largest first': ('size', True),
+}
+
+
+def format_size(size):
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{size:.0f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+
+class InboxFrame(ttk.Frame):
+    """Message list, preview and actions for one folder of a MailCache
+
+    The list is a VirtualList: only the rows in view are formatted, read
+    from the cache a page at a time in the chosen sort order, which the
+    cache's indexes provide. While searching the list shows the ranked
+    local matches instead, followed by any the server finds in bodies
+    that haven't been downloaded. All IMAP work (syncing, opening messages,
+    saving attachments) runs on one worker thread, results come back to
+    the Tk thread through a queue. An IdleListener on a second connection
+    asks the worker for a sync as soon as the server reports changes.
+    """
+
+    def __init__(self, parent, folder="INBOX", **kwargs):
+        super().__init__(parent, style='App.TFrame', **kwargs)
+        self.folder = folder
+        self.cache = None
+        self._connected = False
+        self._pages = {}            # page number -> rows, in insertion order
+        self._order = SORT_CHOICES['Newest first']
+        self._opened = None         # (uid, attachments) of the previewed message
+        self._opening = None        # uid the preview is waiting for
+        self._query = ""
+        self._matches = None        # search result rows, None shows the folder
+        self._search_id = None
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._worker = None
+        self._connections = []      # the worker's IMAP connections, so close() can cut them
+        self._listener = None
+        self._sync_queued = threading.Event()
+        self._poll_id = None
+
+        # Actions
+        actions = ttk.Frame(self, style='App.TFrame')
+        actions.pack(fill='x', pady=(0, PADDING['small']))
+        self.refresh_button = ttk.Button(
+            actions,
+            text="Refresh",
+            style='Primary.TButton',
+            command=self.refresh
+        )
+        self.refresh_button.pack(side='left')
+        self.sort_choice = tk.StringVar(value='Newest first')
+        sort_box = ttk.Combobox(
+            actions,
+            textvariable=self.sort_choice,
+            values=list(SORT_CHOICES),
+            state='readonly',
+            width=14
+        )
+        sort_box.pack(side='left', padx=PADDING['small'])
+        sort_box.bind('<<ComboboxSelected>>', self._on_sort)
+        self.search_text = tk.StringVar()
+        self.search_text.trace_add('write', self._on_search_text)
+        search_entry = ttk.Entry(
+            actions,
+            textvariable=self.search_text,
+            style='App.TEntry',
+            width=24
+        )
+        search_entry.pack(side='left', padx=(0, PADDING['small']))
+        search_entry.bind('<Escape>', lambda e: self.search_text.set(""))
+        self.save_button = ttk.Button(
+            actions,
+            text="Save attachments",
+            style='Primary.TButton',
+            command=self.save_attachments,
+            state='disabled'
+        )
+        self.save_button.pack(side='left')
+        self.status = tk.StringVar(value="Log in to load your inbox.")
+        ttk.Label(actions, textvariable=self.status, style='Normal.TLabel').pack(side='right')
+
+        panes = ttk.PanedWindow(self, orient='vertical')
+        panes.pack(fill='both', expand=True)
+
+        # Message list
+        self.message_list = VirtualList(
+            panes,
+            self._row_text,
+            height=12,
+            on_select=self._on_select
+        )
+        self.message_list.listbox.configure(font=('Courier', FONTS['normal'][1]))
+        panes.add(self.message_list, weight=2)
+
+        # Preview
+        preview_frame = ttk.Frame(panes, style='App.TFrame')
+        self.preview = tk.Text(
+            preview_frame,
+            wrap='word',
+            font=FONTS['normal'],
+            foreground=COLORS['text'],
+            background=COLORS['secondary'],
+            relief='flat',
+            height=10,
+            padx=PADDING['small'],
+            pady=PADDING['small'],
+            state='disabled'
+        )
+        preview_scrollbar = ttk.Scrollbar(preview_frame, orient='vertical', command=self.preview.yview)
+        self.preview.configure(yscrollcommand=preview_scrollbar.set)
+        preview_scrollbar.pack(side='right', fill='y')
+        self.preview.pack(side='left', fill='both', expand=True)
+        self.preview.tag_configure("header", font=FONTS['subheader'])
+        panes.add(preview_frame, weight=3)
+
+    def attach(self, cache, connect):
+        """Show cache and start syncing with connections from connect()"""
+        self.close()
+        self.cache = cache
+        self._connected = True
+        self._reload()
+        # Every worker gets its own queues, so a stopping one can't take new
+        # jobs or report into the next account's inbox
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._connections = []
+        self._sync_queued.clear()
+        self._worker = threading.Thread(
+            target=self._run,
+            args=(self._jobs, self._results, self._connections, cache, connect),
+            daemon=True)
+        self._worker.start()
+        self._poll_id = self.after(100, self._poll)
+        self.refresh()
+        # New mail is pushed, the listener also syncs after every reconnect
+        self._listener = IdleListener(connect, self.folder, lambda folder: self._queue_sync())
+        self._listener.start()
+
+    # Message list
+
+    def _reload(self):
+        """Forget cached pages, e.g. after a sync or a new sort order"""
+        self._pages.clear()
+        if self._matches is not None:
+            self.message_list.set_count(len(self._matches))
+        else:
+            self.message_list.set_count(self.cache.count(self.folder) if self.cache else 0)
+
+    def _page(self, number):
+        rows = self._pages.pop(number, None)
+        if rows is None:
+            order, descending = self._order
+            rows = self.cache.page(self.folder, number * PAGE_ROWS, PAGE_ROWS, order, descending)
+            if len(self._pages) >= CACHED_PAGES:
+                del self._pages[next(iter(self._pages))]
+        self._pages[number] = rows
+        return rows
+
+    def _row(self, index):
+        if self._matches is not None:
+            return self._matches[index] if index < len(self._matches) else None
+        rows = self._page(index // PAGE_ROWS)
+        offset = index % PAGE_ROWS
+        return rows[offset] if offset < len(rows) else None
+
+    def _row_text(self, index):
+        row = self._row(index)
+        if row is None:
+            return ""
+        uid, flags, size, date, sender, subject = row
+        unread = ' ' if '\\Seen' in flags else '•'
+        when = datetime.fromtimestamp(date).strftime('%Y-%m-%d %H:%M') if date else ' ' * 16
+        return f"{unread} {when}  {sender[:28]:<28}  {format_size(size):>8}  {subject}"
+
+    def _on_sort(self, event=None):
+        self._order = SORT_CHOICES[self.sort_choice.get()]
+        self.message_list.selected = None
+        self.message_list.first = 0
+        self._reload()
+
+    # Search
+
+    def _on_search_text(self, *args):
+        if self._search_id is not None:
+            self.after_cancel(self._search_id)
+        self._search_id = self.after(SEARCH_DELAY, self.search)
+
+    def search(self):
+        """Show matches for the search box, or the whole folder when it's empty"""
+        self._search_id = None
+        self._query = self.search_text.get().strip()
+        self.message_list.selected = None
+        self.message_list.first = 0
+        if not self._query or self.cache is None:
+            self._matches = None
+            self._reload()
+            return
+        try:
+            self._matches = search_local(self.cache, self.folder, self._query)
+        except Exception as e:
+            # e.g. an FTS5 syntax error for odd input
+            print(f"Search error: {e}")
+            self._matches = []
+        self._reload()
+        self.status.set(f"{len(self._matches):,} matches")
+        if self._connected and server_criteria(parse_query(self._query)):
+            self.status.set(f"{len(self._matches):,} matches, searching the server…")
+            self._jobs.put(('search', self._query))
+
+    def _add_matches(self, query, rows):
+        if query != self._query or self._matches is None:
+            return  # the search has changed since
+        shown = {row[0] for row in self._matches}
+        self._matches.extend(row for row in rows if row[0] not in shown)
+        self._reload()
+        self.status.set(f"{len(self._matches):,} matches")
+
+    def _on_select(self, index):
+        row = self._row(index)
+        if row is not None:
+            self._show_text("Loading message…")
+            self._opening = row[0]
+            self._jobs.put(('open', row[0]))
+
+    # Worker thread
+
+    def refresh(self):
+        if self._connected:
+            self.status.set("Checking for new mail…")
+            self._queue_sync()
+
+    def _queue_sync(self):
+        """Ask the worker for a sync unless one is already waiting, from any thread"""
+        if not self._sync_queued.is_set():
+            self._sync_queued.set()
+            self._jobs.put(('sync',))
+
+    def _run(self, jobs, results, connections, cache, connect):
+        sync = None
+        while True:
+            job = jobs.get()
+            if job is None:
+                break
+            try:
+                if sync is None:
+                    sync = ImapSync(connect(), cache)
+                    connections.append(sync.conn)
+                if job[0] == 'sync':
+                    self._sync_queued.clear()
+                    result = sync.sync_folder(
+                        self.folder,
+                        progress=lambda done, total: results.put(('progress', done, total)))
+                    results.put(('synced', result))
+                elif job[0] == 'open':
+                    # Skip messages the user has already moved past
+                    if job[1] != self._opening:
+                        continue
+                    results.put(('opened',) + sync.open_message(self.folder, job[1]))
+                elif job[0] == 'search':
+                    if job[1] != self._query:
+                        continue
+                    rows = search_server(sync, cache, self.folder, job[1])
+                    results.put(('searched', job[1], rows))
+                elif job[0] == 'save':
+                    _, uid, attachments, directory = job
+                    for section, info in attachments:
+                        data = sync.fetch_attachment(self.folder, uid, section, info['encoding'])
+                        name = os.path.basename(info['filename'] or f"part-{section}")
+                        with open(os.path.join(directory, name), 'wb') as f:
+                            f.write(data)
+                    results.put(('saved', len(attachments), directory))
+            except Exception as e:
+                print(f"Inbox error: {e}")
+                results.put(('error', str(e)))
+                # Reconnect on the next job, the connection may be gone
+                sync = self._logout(sync)
+        self._logout(sync)
+        cache.close()
+
+    @staticmethod
+    def _logout(sync):
+        if sync is not None:
+            try:
+                sync.conn.logout()
+            except Exception:
+                pass
+        return None
+
+    def _poll(self):
+        """Apply worker results on the Tk thread"""
+        self._poll_id = None
+        reload = False
+        while True:
+            try:
+                result = self._results.get_nowait()
+            except queue.Empty:
+                break
+            kind = result[0]
+            if kind == 'progress':
+                self.status.set(f"Downloading headers… {result[1]:,} of {result[2]:,}")
+                reload = True
+            elif kind == 'synced':
+                sync = result[1]
+                self.status.set(f"{self.cache.count(self.folder):,} messages"
+                                + (f", {sync.new:,} new" if sync.new else ""))
+                reload = reload or bool(sync.new or sync.changed or sync.removed)
+            elif kind == 'searched':
+                self._add_matches(result[1], result[2])
+            elif kind == 'opened':
+                self._show_message(*result[1:])
+            elif kind == 'saved':
+                self.status.set(f"Saved {result[1]} attachment(s) to {result[2]}")
+            elif kind == 'error':
+                self.status.set(f"Error: {result[1]}")
+        if reload and self._matches is None:
+            # Search results stay as they are until the search changes
+            self._reload()
+        if self._worker is not None:
+            self._poll_id = self.after(100, self._poll)
+
+    # Preview and actions
+
+    def _show_text(self, text, header=None):
+        self.preview.configure(state='normal')
+        self.preview.delete('1.0', tk.END)
+        if header:
+            self.preview.insert(tk.END, header + "\n\n", "header")
+        self.preview.insert(tk.END, text)
+        self.preview.configure(state='disabled')
+
+    def _show_message(self, row, text, attachments):
+        if row['uid'] != self._opening:
+            return  # the selection moved on while this was loading
+        header = f"{row['subject']}\nFrom: {row['sender']}"
+        if row['recipients']:
+            header += f"\nTo: {row['recipients']}"
+        if attachments:
+            names = ", ".join(info['filename'] or f"part {section}" for section, info in attachments)
+            header += f"\nAttachments: {names}"
+        self._show_text(text, header)
+        self._opened = (row['uid'], attachments)
+        self.save_button.configure(state='normal' if attachments else 'disabled')
+
+    def save_attachments(self):
+        if not self._opened or not self._opened[1]:
+            return
+        directory = filedialog.askdirectory(title="Save attachments to")
+        if directory:
+            self._jobs.put(('save', self._opened[0], self._opened[1], directory))
+
+    def close(self):
+        """Stop the worker and log out without waiting for it
+
+        The worker owns the cache from attach() on and closes it once it
+        has finished its current job, cutting its connection makes that
+        quick. Without a worker the cache is closed here.
+        """
+        self._connected = False
+        if self._search_id is not None:
+            self.after_cancel(self._search_id)
+            self._search_id = None
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        if self._worker is not None:
+            # Drop waiting jobs, the worker only has to finish the current one
+            while True:
+                try:
+                    self._jobs.get_nowait()
+                except queue.Empty:
+                    break
+            self._jobs.put(None)
+            for conn in list(self._connections):
+                try:
+                    conn.sock.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+            self._worker = None
+        elif self.cache is not None:
+            self.cache.close()
+        if self.cache is not None:
+            self.cache = None
+            self._pages.clear()
+            self.message_list.set_count(0)
+        if self._poll_id is not None:
+            self.after_cancel(self._poll_id)
+            self._poll_id = None
@@ -0,0 +1,258 @@
+import queue
+import re
+import threading
+import tkinter as tk
+from tkinter import ttk
+from PIL import Image, ImageTk
+from styles import COLORS, PADDING, FONTS, STYLES
+from ui.virtual_list import VirtualList
+import mail_core
+
+# Body characters put into the Text widget per page
+PAGE_CHARS = 20000
+# Next page is added once the view gets this close to the bottom
+PAGE_AHEAD = 0.9
+# Longest side of inline image thumbnails, in pixels
+THUMBNAIL_SIZE = 160
+
+ANCHOR_PATTERN = re.compile(r'<a href="(.*?)">(.*?)</a>')
+
+
+def display_segments(compiled):
+    """(text, tag) pieces of a CompiledBody as the recipient will see it
+
+    Links keep only their text and get the "link" tag, every {img} slot
+    becomes (path, "image").
+    """
+    for part in compiled.parts:
+        if not isinstance(part, str):
+            yield part[0], "image"
+            continue
+        position = 0
+        for match in ANCHOR_PATTERN.finditer(part):
+            if match.start() > position:
+                yield part[position:match.start()], None
+            yield match.group(2), "link"
+            position = match.end()
+        if position < len(part):
+            yield part[position:], None
+
+
+class PreviewWindow(tk.Toplevel):
+    """Send preview that opens in the same time for any message size
+
+    The body is compiled once (and shared with the send path through
+    mail_core.compile_body), then written into a read-only Text widget one
+    page at a time as the user scrolls. Attachments go into a VirtualList.
+    Inline images show a placeholder until a worker thread has decoded and
+    shrunk them, only images on pages that were shown are loaded.
+    """
+
+    def __init__(self, parent, recipient_lines, subject, message_text, attachments, on_send):
+        super().__init__(parent)
+        self.title("Email Preview")
+        self.configure(bg=COLORS['background'])
+        self.on_send = on_send
+        self.attachments = list(attachments)
+
+        # Make preview window relative to main window size
+        window_width = int(parent.winfo_width() * 0.8)
+        window_height = int(parent.winfo_height() * 0.8)
+        x = parent.winfo_x() + (parent.winfo_width() - window_width) // 2
+        y = parent.winfo_y() + (parent.winfo_height() - window_height) // 2
+        self.geometry(f"{window_width}x{window_height}+{x}+{y}")
+
+        main_frame = ttk.Frame(self, style='App.TFrame', padding=PADDING['medium'])
+        main_frame.pack(fill='both', expand=True)
+
+        # Buttons are packed first so they stay visible when space runs out
+        button_frame = ttk.Frame(main_frame, style='App.TFrame')
+        button_frame.pack(side='bottom', fill='x', pady=PADDING['medium'])
+        ttk.Button(
+            button_frame,
+            text="Cancel",
+            style='Primary.TButton',
+            command=self.close
+        ).pack(side='right', padx=(PADDING['small'], 0))
+        ttk.Button(
+            button_frame,
+            text="Send",
+            style='Primary.TButton',
+            command=self.send
+        ).pack(side='right')
+
+        preview_frame = ttk.Frame(main_frame, style='App.TFrame')
+        preview_frame.pack(fill='both', expand=True, padx=PADDING['medium'])
+
+        recipient_frame = ttk.Frame(preview_frame, style='App.TFrame')
+        recipient_frame.pack(fill='x', pady=(0, PADDING['medium']))
+        for line in recipient_lines:
+            ttk.Label(recipient_frame,
+                      text=line,
+                      style='Normal.TLabel',
+                      wraplength=window_width - 100).pack(anchor='w')
+
+        ttk.Label(preview_frame,
+                  text=f"Subject: {subject}",
+                  style='Header.TLabel',
+                  wraplength=window_width - 100).pack(anchor='w', pady=PADDING['medium'])
+        ttk.Separator(preview_frame, orient='horizontal').pack(fill='x', pady=PADDING['medium'])
+
+        if self.attachments:
+            attachments_frame = ttk.Frame(preview_frame, style='App.TFrame')
+            attachments_frame.pack(side='bottom', fill='x', pady=(PADDING['medium'], 0))
+            ttk.Label(attachments_frame,
+                      text=f"Attachments ({len(self.attachments):,}):",
+                      style='Subheader.TLabel').pack(anchor='w', pady=(0, PADDING['small']))
+            VirtualList(
+                attachments_frame,
+                lambda index: f"• {self.attachments[index][0].split('/')[-1]}",
+                count=len(self.attachments),
+                height=min(len(self.attachments), 5)
+            ).pack(fill='x')
+
+        # Message body, filled in page by page
+        body_frame = ttk.Frame(preview_frame, style='App.TFrame')
+        body_frame.pack(fill='both', expand=True)
+        self.body = tk.Text(
+            body_frame,
+            wrap='word',
+            font=FONTS['normal'],
+            foreground=COLORS['text'],
+            background=COLORS['background'],
+            relief='flat',
+            highlightthickness=0,
+            padx=PADDING['small'],
+            pady=PADDING['small']
+        )
+        self.body_scrollbar = ttk.Scrollbar(body_frame, orient='vertical', command=self.body.yview)
+        self.body.configure(yscrollcommand=self._on_body_scroll)
+        self.body_scrollbar.pack(side='right', fill='y')
+        self.body.pack(side='left', fill='both', expand=True)
+        self.body.tag_configure(
+            "link",
+            foreground=STYLES['syntax_highlighting']['link'],
+            underline=True
+        )
+        self.body.tag_configure("image", foreground=STYLES['syntax_highlighting']['image'])
+
+        self._segments = display_segments(mail_core.compile_body(message_text))
+        self._pending = None        # rest of a text segment cut at a page end
+        self._more = True
+        self._image_tags = {}       # path -> Text tag of its placeholders
+        self._thumbnails = {}       # path -> PhotoImage, kept alive here
+        self._requests = queue.Queue()
+        self._results = queue.Queue()
+        self._poll_id = None
+        self._page_id = None
+        self._loaded = 0           # thumbnails finished, including failed ones
+        threading.Thread(target=self._load_thumbnails, daemon=True).start()
+        self._add_page()
+
+        self.protocol("WM_DELETE_WINDOW", self.close)
+        self.transient(parent)
+        self.grab_set()
+        self.focus_set()
+
+    def _on_body_scroll(self, first, last):
+        self.body_scrollbar.set(first, last)
+        if self._more and self._page_id is None and float(last) >= PAGE_AHEAD:
+            # Scheduled, not inline: inserting text re-triggers this callback
+            self._page_id = self.after_idle(self._add_page)
+
+    def _add_page(self):
+        """Append up to PAGE_CHARS more characters of the body"""
+        self._page_id = None
+        if not self._more:
+            return
+        budget = PAGE_CHARS
+        self.body.configure(state='normal')
+        while budget > 0:
+            if self._pending is not None:
+                segment, self._pending = self._pending, None
+            else:
+                segment = next(self._segments, None)
+                if segment is None:
+                    self._more = False
+                    break
+            text, tag = segment
+            if tag == "image":
+                self._add_image_placeholder(text)
+                budget -= 1
+                continue
+            if len(text) > budget:
+                # Cut at a line break where possible so pages end cleanly
+                cut = text.rfind("\n", 0, budget) + 1 or budget
+                text, self._pending = text[:cut], (text[cut:], tag)
+            self.body.insert(tk.END, text, tag or ())
+            budget -= len(text)
+        self.body.configure(state='disabled')
+
+    def _add_image_placeholder(self, path):
+        tag = self._image_tags.get(path)
+        if tag is None:
+            tag = self._image_tags[path] = f"image{len(self._image_tags)}"
+            self._requests.put(path)
+            if self._poll_id is None:
+                self._poll_id = self.after(50, self._poll_thumbnails)
+        photo = self._thumbnails.get(path)
+        if photo is not None:
+            self.body.image_create(tk.END, image=photo)
+        else:
+            self.body.insert(tk.END, f"[Image: {path.split('/')[-1]}]", ("image", tag))
+
+    def _load_thumbnails(self):
+        """Worker thread: decode and shrink requested images"""
+        while True:
+            path = self._requests.get()
+            if path is None:
+                return
+            try:
+                with Image.open(path) as image:
+                    image.draft('RGB', (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+                    image.thumbnail((THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+                    image.load()
+                    thumbnail = image.copy()
+            except Exception as e:
+                print(f"Error loading preview image {path}: {e}")
+                thumbnail = None
+            self._results.put((path, thumbnail))
+
+    def _poll_thumbnails(self):
+        """Swap placeholders for thumbnails the worker has finished"""
+        self._poll_id = None
+        while True:
+            try:
+                path, thumbnail = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._loaded += 1
+            if thumbnail is None:
+                continue  # the placeholder text stays
+            # PhotoImage must be created on the Tk thread
+            photo = self._thumbnails[path] = ImageTk.PhotoImage(thumbnail)
+            tag = self._image_tags[path]
+            self.body.configure(state='normal')
+            ranges = self.body.tag_ranges(tag)
+            for index in range(len(ranges) - 2, -1, -2):
+                start, end = ranges[index], ranges[index + 1]
+                self.body.delete(start, end)
+                self.body.image_create(start, image=photo)
+            self.body.configure(state='disabled')
+        if self._loaded < len(self._image_tags):
+            self._poll_id = self.after(50, self._poll_thumbnails)
+
+    def send(self):
+        self.close()
+        self.on_send()
+
+    def close(self):
+        self._requests.put(None)
+        for after_id in (self._poll_id, self._page_id):
+            if after_id is not None:
+                self.after_cancel(after_id)
+        self._poll_id = self._page_id = None
+        try:
+            self.grab_release()
+        finally:
+            self.destroy()
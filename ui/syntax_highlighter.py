@@ -0,0 +1,112 @@
+import re
+from styles import STYLES
+
+# All markup is matched within a single line, so any line can be
+# re-tokenized on its own without looking at the rest of the message
+KEYWORD_PATTERN = re.compile(r'\{(?:link|img|embed|attach)\}')
+TAG_PATTERNS = (
+    ("link", re.compile(r'\{link\}\{(.*?)\}\{(.*?)\}')),
+    ("image", re.compile(r'\{img\}\{(.*?)\}')),
+    ("attachment", re.compile(r'\{attach\}\{(.*?)\}')),
+)
+TAGS = ("keyword",) + tuple(tag for tag, _ in TAG_PATTERNS)
+
+# Keystrokes within this many ms are highlighted together
+HIGHLIGHT_DELAY = 50
+
+
+class SyntaxHighlighter:
+    """Highlights {link}/{img}/{embed}/{attach} markup in a Text widget
+
+    Only the lines touched since the last pass are re-tokenized. Edits are
+    picked up from <<Modified>>: the changed lines run from where the cursor
+    was before the edit (a mark that collapses onto deleted selections) to
+    where it is now, widened by however many lines the text grew. The
+    pending range is kept as two marks, so it follows later edits until the
+    debounced pass runs. Changes made away from the cursor (e.g. text
+    inserted at the end by code) are reported with mark_dirty().
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self._after_id = None
+        self._line_count = self._lines()
+        highlight = STYLES['syntax_highlighting']
+        text.tag_configure("keyword", foreground=highlight['keyword'])
+        text.tag_configure("link", foreground=highlight['link'], underline=True)
+        text.tag_configure("image", foreground=highlight['image'])
+        text.tag_configure("attachment", foreground=highlight['attachment'])
+        text.bind("<<Modified>>", self._on_modified, add="+")
+        text.bind("<KeyRelease>", self._track_cursor, add="+")
+        text.bind("<ButtonRelease-1>", self._track_cursor, add="+")
+        self._track_cursor()
+        text.edit_modified(False)
+        self.mark_dirty("1.0", "end")
+
+    def _lines(self):
+        return int(self.text.index("end-1c").split(".")[0])
+
+    def _track_cursor(self, event=None):
+        self.text.mark_set("highlight_cursor", "insert")
+        self.text.mark_gravity("highlight_cursor", "left")
+
+    def _on_modified(self, event=None):
+        text = self.text
+        if not text.edit_modified():
+            return  # our own reset of the flag
+        grown = max(0, self._lines() - self._line_count)
+        text.edit_modified(False)
+        start = text.index(f"insert linestart -{grown} lines")
+        end = "insert"
+        if text.compare("highlight_cursor", "<", start):
+            start = "highlight_cursor"
+        elif text.compare("highlight_cursor", ">", end):
+            end = "highlight_cursor"
+        self.mark_dirty(start, end)
+        self._track_cursor()
+
+    def mark_dirty(self, start, end):
+        """Queue the lines from start to end for the next highlight pass"""
+        text = self.text
+        start = text.index(f"{start} linestart")
+        end = text.index(f"{end} lineend")
+        if "highlight_start" in text.mark_names():
+            if text.compare(text.index("highlight_start"), "<", start):
+                start = text.index("highlight_start")
+            if text.compare(text.index("highlight_end"), ">", end):
+                end = text.index("highlight_end")
+        text.mark_set("highlight_start", start)
+        text.mark_gravity("highlight_start", "left")
+        text.mark_set("highlight_end", end)
+        text.mark_gravity("highlight_end", "right")
+        self._line_count = self._lines()
+        if self._after_id is None:
+            self._after_id = text.after(HIGHLIGHT_DELAY, self.highlight)
+
+    def highlight(self):
+        """Re-tokenize the pending lines"""
+        self._after_id = None
+        text = self.text
+        if "highlight_start" not in text.mark_names():
+            return
+        start = text.index("highlight_start linestart")
+        end = text.index("highlight_end lineend")
+        text.mark_unset("highlight_start", "highlight_end")
+        for tag in TAGS:
+            text.tag_remove(tag, start, end)
+
+        first_line = int(start.split(".")[0])
+        for offset, line in enumerate(text.get(start, end).split("\n")):
+            if "{" not in line:
+                continue
+            number = first_line + offset
+            for match in KEYWORD_PATTERN.finditer(line):
+                text.tag_add("keyword", f"{number}.{match.start()}", f"{number}.{match.end()}")
+            for tag, pattern in TAG_PATTERNS:
+                for match in pattern.finditer(line):
+                    text.tag_add(tag, f"{number}.{match.start()}", f"{number}.{match.end()}")
+
+    def cancel(self):
+        if self._after_id is not None:
+            self.text.after_cancel(self._after_id)
+            self._after_id = None
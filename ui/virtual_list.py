@@ -0,0 +1,132 @@
+import tkinter as tk
+from tkinter import ttk
+import tkinter.font as tkfont
+from styles import COLORS, FONTS
+
+
+class VirtualList(ttk.Frame):
+    """Scrollable list that only puts the visible rows into its Listbox
+
+    Rows are fetched by index through row_text(index) whenever the view
+    moves, so a list of a million entries costs the same to show and
+    scroll as one of twenty. The scrollbar is driven by hand to cover
+    all count rows. Selection is kept as an absolute index.
+    """
+
+    def __init__(self, parent, row_text, count=0, height=8,
+                 on_select=None, on_activate=None, **kwargs):
+        super().__init__(parent, style='App.TFrame', **kwargs)
+        self.row_text = row_text
+        self.count = count
+        self.first = 0
+        self.rows = height
+        self.selected = None
+        self.on_select = on_select
+        self.on_activate = on_activate
+
+        self.listbox = tk.Listbox(
+            self,
+            height=height,
+            selectmode=tk.SINGLE,
+            font=FONTS['normal'],
+            bg=COLORS['secondary'],
+            fg=COLORS['text'],
+            selectbackground=COLORS['primary'],
+            relief='flat',
+            highlightthickness=0,
+            activestyle='none',
+            exportselection=False
+        )
+        self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self.yview)
+        self.scrollbar.pack(side='right', fill='y')
+        self.listbox.pack(side='left', fill='both', expand=True)
+
+        self._line_height = tkfont.Font(font=self.listbox.cget('font')).metrics('linespace') + 1
+        self.listbox.bind('<Configure>', self._on_resize)
+        self.listbox.bind('<MouseWheel>', self._on_wheel)
+        self.listbox.bind('<Button-4>', lambda e: self.scroll_to(self.first - 3))
+        self.listbox.bind('<Button-5>', lambda e: self.scroll_to(self.first + 3))
+        self.listbox.bind('<Up>', lambda e: self._step(-1))
+        self.listbox.bind('<Down>', lambda e: self._step(1))
+        self.listbox.bind('<Prior>', lambda e: self.scroll_to(self.first - self.rows))
+        self.listbox.bind('<Next>', lambda e: self.scroll_to(self.first + self.rows))
+        self.listbox.bind('<<ListboxSelect>>', self._on_listbox_select)
+        self.listbox.bind('<Double-Button-1>', self._on_double_click)
+        self.refresh()
+
+    def set_count(self, count):
+        """Change the number of rows, e.g. after the data grew"""
+        self.count = count
+        if self.selected is not None and self.selected >= count:
+            self.selected = None
+        self.refresh()
+
+    def _on_resize(self, event):
+        rows = max(1, event.height // self._line_height)
+        if rows != self.rows:
+            self.rows = rows
+            self.refresh()
+
+    def _on_wheel(self, event):
+        self.scroll_to(self.first - (3 if event.delta > 0 else -3))
+
+    def _step(self, delta):
+        if not self.count:
+            return 'break'
+        index = 0 if self.selected is None else min(max(self.selected + delta, 0), self.count - 1)
+        self.select(index)
+        return 'break'
+
+    def yview(self, *args):
+        """Scrollbar command: ('moveto', fraction) or ('scroll', n, 'units'|'pages')"""
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * self.count))
+        elif args[0] == 'scroll':
+            step = self.rows if args[2] == 'pages' else 1
+            self.scroll_to(self.first + int(args[1]) * step)
+
+    def scroll_to(self, first):
+        first = min(max(first, 0), max(self.count - self.rows, 0))
+        if first != self.first:
+            self.first = first
+            self.refresh()
+        return 'break'
+
+    def see(self, index):
+        if index < self.first:
+            self.scroll_to(index)
+        elif index >= self.first + self.rows:
+            self.scroll_to(index - self.rows + 1)
+
+    def refresh(self):
+        """Fetch and show the rows in view"""
+        last = min(self.count, self.first + self.rows)
+        texts = [self.row_text(index) for index in range(self.first, last)]
+        self.listbox.delete(0, tk.END)
+        if texts:
+            self.listbox.insert(0, *texts)
+        if self.selected is not None and self.first <= self.selected < last:
+            self.listbox.selection_set(self.selected - self.first)
+        if self.count:
+            self.scrollbar.set(self.first / self.count, last / self.count)
+        else:
+            self.scrollbar.set(0, 1)
+
+    def select(self, index):
+        self.selected = index
+        self.see(index)
+        self.refresh()
+        if self.on_select:
+            self.on_select(index)
+
+    def _on_listbox_select(self, event):
+        selection = self.listbox.curselection()
+        if selection:
+            self.selected = self.first + selection[0]
+            if self.on_select:
+                self.on_select(self.selected)
+
+    def _on_double_click(self, event):
+        index = self.listbox.nearest(event.y)
+        if self.on_activate and 0 <= self.first + index < self.count:
+            self.on_activate(self.first + index)